@@ -1,6 +1,9 @@
+import time
+
 import streamlit as st
-from pathlib import Path
-from main import run_company_analysis, DEBUG_LOG_FILE
+from main import stream_company_analysis
+from result_cache import AnalysisCache
+from run_log import tail_run_log
 
 st.set_page_config(page_title="Company Analyzer", layout="wide")
 st.title("📊 Company Analyzer")
@@ -59,18 +62,105 @@ def parse_sections(report: str) -> dict:
     # Sources: visa alltid separat i UI från käll-listan vi får tillbaka
     return out
 
+SECTION_ORDER = ["Executive Summary", "Key Research Insights", "Financial Analysis Highlights", "Recommendations"]
+
+
+def quarterly_frame(quarterly_data, report: str = ""):
+    """DataFrame för diagrammet: quarters-lista om finns, annars hela dicten (eller rapporttexten)."""
+    import chart_utils as cu
+
+    q_payload = None
+    if isinstance(quarterly_data, dict):
+        if quarterly_data.get("quarters"):
+            q_payload = {"quarters": quarterly_data["quarters"]}
+        else:
+            q_payload = quarterly_data
+    return cu.quarterly_df(q_payload if q_payload is not None else report)
+
+
+def render_sources(sources):
+    if sources:
+        for u in sources:
+            st.markdown(f"- [{u}]({u})")
+    else:
+        st.write("_No sources available._")
+
+
+@st.cache_resource
+def result_cache() -> AnalysisCache:
+    # en instans per process, delad mellan alla sessioner
+    return AnalysisCache()
+
+
+def stream_analysis(company_name: str, run_id: str):
+    """Kör pipelinen och visa varje del så fort den är klar. Returnerar (report, sources, quarterly_data)."""
+    live = st.empty()
+    result = (f"Error analyzing {company_name}: no result", [], None)
+    with live.container():
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            status = st.empty()
+            slots = {name: st.empty() for name in SECTION_ORDER}
+        with col2:
+            st.subheader("Sources")
+            sources_slot = st.empty()
+            st.subheader("Quarterly chart")
+            chart_slot = st.empty()
+
+        status.info("Researching… sections appear here as soon as they are ready.")
+        for event, payload in stream_company_analysis(company_name, run_id=run_id):
+            if event in slots:
+                with slots[event].container():
+                    st.subheader(event)
+                    st.markdown(payload)
+            elif event == "sources":
+                with sources_slot.container():
+                    render_sources(payload)
+                status.info("Writing Executive Summary and Recommendations…")
+            elif event == "quarterly_data":
+                # förhandsvisning utan widgets; hela diagrammet med metrikväljare ritas när rapporten är klar
+                try:
+                    import chart_utils as cu
+
+                    df = quarterly_frame(payload)
+                    metric = next((m for m in ("revenue", "net_income", "ebitda") if m in df.columns), None)
+                    if metric:
+                        chart_slot.altair_chart(
+                            cu.metric_chart(df.sort_values("quarter"), metric=metric, title=metric.replace("_", " ").title()),
+                            use_container_width=True,
+                        )
+                except Exception as e:
+                    chart_slot.warning(f"Kunde inte rita diagram: {e}")
+            elif event == "done":
+                result = payload
+    # strömmade delar ersätts av den färdiga layouten nedan
+    live.empty()
+    return result
+
+
 company = st.text_input("Company", value="Ericsson", help="Ex: Ericsson, Tesla, Apple")
-run = st.button("Generate report", type="primary")
+c_run, c_refresh = st.columns([1, 4])
+run = c_run.button("Generate report", type="primary")
+refresh = c_refresh.button("Refresh", help="Ignore today's cached report and run the analysis again")
 
-if run and company.strip():
-    with st.spinner("Analyzing…"):
-        report, sources, quarterly_data = run_company_analysis(company.strip())
+if (run or refresh) and company.strip():
+    cache = result_cache()
+    name = company.strip()
+    if cache.running(name):
+        # samma bolag körs redan i en annan session – vänta in den körningen
+        with st.spinner(f"An analysis of {name} is already running, waiting for it…"):
+            entry = cache.get_or_run(name, lambda run_id: stream_analysis(name, run_id), refresh=refresh)
+    else:
+        entry = cache.get_or_run(name, lambda run_id: stream_analysis(name, run_id), refresh=refresh)
+    report, sources, quarterly_data = entry.result
     # spara i sessionen så det överlever reruns
     st.session_state["analysis"] = {
-        "company": company.strip(),
+        "company": name,
         "report": report,
         "sources": sources,
         "quarterly_data": quarterly_data,
+        "run_id": entry.run_id,
+        "cached_at": entry.created_at if entry.source == "cache" else None,
     }
 
 data = st.session_state.get("analysis")
@@ -82,6 +172,12 @@ if data:
 
     sections = parse_sections(report)
 
+    if data.get("cached_at"):
+        st.caption(
+            f"Cached report from {time.strftime('%Y-%m-%d %H:%M', time.localtime(data['cached_at']))}"
+            " – press Refresh to run the analysis again."
+        )
+
     # ===== Layout =====
     col1, col2 = st.columns([2, 1])
 
@@ -111,11 +207,7 @@ if data:
 
     with col2:
         st.subheader("Sources")
-        if sources:
-            for u in sources:
-                st.markdown(f"- [{u}]({u})")
-        else:
-            st.write("_No sources available._")
+        render_sources(sources)
 
         # === Chart (metric selector + fallback) ===
         st.subheader("Quarterly chart")
@@ -133,14 +225,7 @@ if data:
             import chart_utils as cu
 
             # Välj bästa källa: quarters-lista om finns, annars hela dicten
-            q_payload = None
-            if isinstance(quarterly_data, dict):
-                if quarterly_data.get("quarters"):
-                    q_payload = {"quarters": quarterly_data["quarters"]}
-                else:
-                    q_payload = quarterly_data
-
-            df = cu.quarterly_df(q_payload if q_payload is not None else report)
+            df = quarterly_frame(quarterly_data, report)
 
             candidate_metrics = ["revenue", "net_income", "ebitda"]
             available = [m for m in candidate_metrics if m in df.columns]
@@ -171,10 +256,13 @@ if data:
             st.warning(f"Kunde inte rita diagram: {e}")
 
         # Debug log
-        with st.expander("Debug log (last ~5k chars)"):
+        with st.expander("Debug log (last ~5 KB of this run)"):
             try:
-                text = Path(DEBUG_LOG_FILE).read_text(encoding="utf-8")
-                st.code(text[-5000:] if len(text) > 5000 else text)
+                text = tail_run_log(data["run_id"], max_kb=5) if data.get("run_id") else ""
+                if text:
+                    st.code(text)
+                else:
+                    st.write("_No debug log available._")
             except Exception:
                 st.write("_No debug log available._")
 
@@ -0,0 +1,93 @@
+"""Throughput of run_company_analysis_async with a fake fixed-latency LLM.
+
+Crew.kickoff is replaced by a fake that "calls the LLM" once per task by
+sleeping LLM_LATENCY; agents, tasks and tools are lightweight stand-ins. What
+remains is the real pipeline orchestration in main.py, so the numbers show how
+throughput scales with the number of in-flight analyses.
+
+    OPENAI_API_KEY=dummy python -m benchmarks.bench_async_pipeline
+"""
+import asyncio
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+import main
+
+LLM_LATENCY = 0.05  # sekunder per LLM-anrop (ett per task)
+COMPANIES = 32
+
+FAKE_OUTPUT = (
+    "- Revenue Q2 2025 up 5% YoY to SEK 56,100 million (https://example.com/q2)\n"
+    "- Net income Q2 2025 rose to SEK 3,900 million\n"
+    "Executive Summary\nSolid quarter.\n\n--- End of Executive Summary ---\n"
+)
+
+
+class FakeCrew:
+    def __init__(self, agents=None, tasks=None, verbose=False):
+        self.tasks = tasks or []
+
+    def kickoff(self):
+        outs = []
+        for task in self.tasks:
+            time.sleep(LLM_LATENCY)  # "LLM-anropet"
+            task.output = SimpleNamespace(raw=FAKE_OUTPUT)
+            outs.append(task.output)
+        return SimpleNamespace(tasks_output=outs)
+
+
+def _fake_agent(role):
+    return lambda llm, tools=None: SimpleNamespace(role=role)
+
+
+def _fake_task(agent, company_name, dependencies=None, **_):
+    return SimpleNamespace(agent=agent, description=f"task for {company_name}", output=None)
+
+
+def _install_fakes():
+    main.Crew = FakeCrew
+    main.log_debug = lambda *a, **k: None
+    main.create_shared_resources = lambda: (object(), {"name": "web_search"}, lambda name: {"quarters": []})
+    main.create_web_search_agent = _fake_agent("web")
+    main.create_financial_research_agent = _fake_agent("research")
+    main.create_financial_analysis_agent = _fake_agent("analysis")
+    main.create_report_agent = _fake_agent("report")
+    main.create_web_search_task = _fake_task
+    main.create_financial_research_task = _fake_task
+    main.create_financial_analysis_task = _fake_task
+    main.create_chunked_reporting_tasks = lambda agent, company_name, **_: [
+        _fake_task(agent, company_name), _fake_task(agent, company_name)
+    ]
+
+
+async def _run_async(n: int, concurrency: int) -> float:
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            return await main.run_company_analysis_async(f"Company {i}")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n)))
+    return time.perf_counter() - t0
+
+
+def bench():
+    _install_fakes()
+    t0 = time.perf_counter()
+    for i in range(4):
+        main.run_company_analysis(f"Company {i}")
+    per_run = (time.perf_counter() - t0) / 4
+    print(f"sequential: {per_run:.3f}s per analysis ({1 / per_run:.1f} analyses/s)")
+    for concurrency in (1, 4, 16, 32):
+        elapsed = asyncio.run(_run_async(COMPANIES, concurrency))
+        print(f"async, {concurrency:>2} in flight: {COMPANIES} analyses in {elapsed:.2f}s ({COMPANIES / elapsed:.1f} analyses/s)")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,175 @@
+"""Prompt tokens CrewAI actually sends per task: raw upstream output vs compacted context.
+
+Runs the real agents, task factories and CrewAI crews with a stub LLM that
+answers with canned agent outputs (numbered web findings with source lines, a
+research summary plus QUARTERLY DATA JSON, analysis bullets plus the same JSON)
+and records every prompt it is sent.
+
+  before  the old layout: web search, research and analysis created up front in
+          one crew, so the compacted context is still empty and CrewAI appends
+          the raw output of every earlier task (Task.context not set); the
+          reporting crew likewise passes Executive Summary on to Recommendations
+  after   main's staging: each stage is its own crew, downstream tasks are
+          created once their inputs have run (tasks/context.py) and context=[]
+
+LLM latency scales with these prompt sizes; measure it on real runs with
+PIPELINE_METRICS_FILE.
+
+    OPENAI_API_KEY=dummy python -m benchmarks.bench_context_compaction
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+from crewai import Crew
+from crewai.events.event_bus import crewai_event_bus
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.constants import NOT_SPECIFIED
+
+import main
+from tasks import context as ctx
+
+COMPANY = "Meta"
+QUARTERS = [f"Q{q} {y}" for y in (2025, 2024, 2023) for q in (4, 3, 2, 1)][2:10]
+TASKS = ("financial_research", "financial_analysis", "Executive Summary", "Recommendations")
+
+
+def _payload():
+    rev = {q: 34_530_000_000 - i * 900_000_000 for i, q in enumerate(QUARTERS)}
+    ni = {q: 10_560_000_000 - i * 400_000_000 for i, q in enumerate(QUARTERS)}
+    ebitda = {q: 17_000_000_000 - i * 500_000_000 for i, q in enumerate(QUARTERS)}
+    return {
+        "quarterly_financials": {"Total Revenue": rev, "Net Income": ni, "EBITDA": ebitda},
+        "quarters": [{"quarter": q, "revenue": rev[q], "net_income": ni[q], "ebitda": ebitda[q]} for q in QUARTERS],
+        "sources": ["https://investor.fb.com/financials/default.aspx", "https://www.sec.gov/meta-10q"],
+    }
+
+
+def _outputs() -> dict[str, str]:
+    findings = []
+    for i in range(12):
+        findings.append(
+            f"{i + 1}. **Finding {i + 1}**: Meta Platforms reported a revenue of $34.53 billion for Q2 2025, "
+            f"reflecting a year-over-year increase of {10 + i}% driven by advertising and engagement in segment {i}. "
+            "Analysts noted the result came in ahead of consensus, and management reiterated guidance for the year.\n"
+            f"   Source: Meta Q2 2025 Earnings Report [CNBC](https://www.cnbc.com/2025/07/27/meta-q2-{i % 4}.html?utm_source=x) "
+            "(Published on July 27, 2025)\n"
+        )
+    block = "=== QUARTERLY DATA (returned) ===\n" + json.dumps(_payload(), indent=2) + "\n=== END ==="
+    return {
+        "web_search": "\n".join(findings),
+        "financial_research": (
+            "A) HUMAN SUMMARY\n"
+            "- Meta Platforms reported a revenue of $34.53 billion for Q2 2025, reflecting a year-over-year increase of 15%.\n"
+            "- Net income for Q2 2025 reached $10.56 billion, a 20% increase compared to the same quarter last year.\n"
+            "- Daily active users reached 3.1 billion, up 5% year-over-year.\n\n"
+            f"B) JSON BLOCK\n{block}\n"
+        ),
+        "financial_analysis": (
+            "A) Financial Analysis Highlights\n"
+            "- Revenue Q2 2025 up 15% YoY vs Q2 2024 ($34.53B vs $30.0B).\n"
+            "- Net income Q2 2025 up 20% YoY ($10.56B).\n"
+            "- EBITDA rose for the fourth consecutive quarter to $17.0B.\n"
+            "- Risk: rising capex on AI infrastructure may pressure margins.\n"
+            "--- End of Financial Analysis ---\n\n"
+            f"B) JSON BLOCK\n{block}\n"
+        ),
+        "Executive Summary": "Executive Summary\nMeta grew revenue 15% YoY.\n\n--- End of Executive Summary ---",
+        "Recommendations": "Recommendations\n- Watch capex.\n\n--- End of Recommendations ---",
+    }
+
+
+class RecordingLLM(BaseLLM):
+    """Answers each task with its canned output and counts the prompt tokens it was sent."""
+
+    outputs: dict = {}
+    names: dict = {}       # id(task) → namn i TASKS/outputs
+    tokens: dict = {}
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        name = self.names.get(id(from_task), "?")
+        prompt = "\n".join(m["content"] for m in messages) if isinstance(messages, list) else messages
+        self.tokens[name] = self.tokens.get(name, 0) + ctx.count_tokens(prompt)
+        return f"Final Answer: {self.outputs.get(name, '')}"
+
+
+def _name_tasks(llm, tasks, names):
+    for task, name in zip(tasks, names):
+        llm.names[id(task)] = name
+
+
+def run_before(llm) -> dict:
+    """Old layout: all research tasks created before kickoff in one crew; CrewAI decides the context."""
+    agents = [
+        main.create_web_search_agent(llm), main.create_financial_research_agent(llm),
+        main.create_financial_analysis_agent(llm), main.create_report_agent(llm),
+    ]
+    web = main.create_web_search_task(agents[0], COMPANY)
+    research = main.create_financial_research_task(agents[1], COMPANY, dependencies=[web], quarterly_data=_payload())
+    analysis = main.create_financial_analysis_task(agents[2], COMPANY, dependencies=[web, research], quarterly_data=_payload())
+    research_tasks = [web, research, analysis]
+    _name_tasks(llm, research_tasks, ("web_search", "financial_research", "financial_analysis"))
+    for task in research_tasks:
+        task.context = NOT_SPECIFIED
+    Crew(agents=agents[:3], tasks=research_tasks, verbose=False).kickoff()
+
+    reporting = main.create_chunked_reporting_tasks(agents[3], COMPANY, dependencies=research_tasks)
+    _name_tasks(llm, reporting, main.REPORT_SECTIONS)
+    for task in reporting:
+        task.context = NOT_SPECIFIED
+    Crew(agents=agents[3:], tasks=reporting, verbose=False).kickoff()
+    return dict(llm.tokens)
+
+
+def run_after(llm) -> dict:
+    """main's own staging (sequential mode), tool data fetched up front."""
+    search_tool = {"name": "web_search", "function": lambda q: ""}
+    run = main._prepare_research(COMPANY, llm, search_tool, lambda name: _payload())
+    # tasks skapas efter hand; namnge dem när de dyker upp
+    prepare_research, prepare_analysis = main._prepare_financial_research, main._prepare_analysis
+
+    def named(prepare, names):
+        def wrapper(r):
+            prepare(r)
+            _name_tasks(llm, r.research_tasks, names)
+        return wrapper
+
+    _name_tasks(llm, run.research_tasks, ("web_search",))
+    main._prepare_financial_research = named(prepare_research, ("web_search", "financial_research"))
+    main._prepare_analysis = named(prepare_analysis, ("web_search", "financial_research", "financial_analysis"))
+    try:
+        research = main._run_research(run)
+    finally:
+        main._prepare_financial_research, main._prepare_analysis = prepare_research, prepare_analysis
+    main._collect_research(run, research)
+    _name_tasks(llm, run.reporting_crew.tasks, main.REPORT_SECTIONS)
+    main._run_reporting(run)
+    return dict(llm.tokens)
+
+
+def bench():
+    main.log_debug = lambda *a, **k: None
+    results = {}
+    for label, fn in (("before", run_before), ("after", run_after)):
+        llm = RecordingLLM(model="stub", outputs=_outputs())
+        results[label] = fn(llm)
+
+    flush = getattr(crewai_event_bus, "flush", None)
+    if flush:
+        flush()  # CrewAI:s konsolutskrifter (verbose crews) kommer annars mitt i tabellen
+
+    counter = "tiktoken" if ctx._encoder() is not None else "chars/4 estimate"
+    print(f"prompt tokens sent by CrewAI ({counter})")
+    print(f"{'task':22}{'before':>8}{'after':>8}{'saved':>8}")
+    for name in TASKS:
+        before, after = results["before"].get(name, 0), results["after"].get(name, 0)
+        saved = f"{1 - after / before:.0%}" if before else "-"
+        print(f"{name:22}{before:>8}{after:>8}{saved:>8}")
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,59 @@
+"""Stubbed-latency benchmark for TickerSnapshot.fetch.
+
+Every Yahoo dataset is replaced by a sleep, so the wall time shows how the
+fetch is scheduled: sequential ≈ sum of latencies, concurrent ≈ the slowest one.
+
+    python -m benchmarks.bench_financial_fetch
+"""
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.snapshot import DATASETS, TickerSnapshot
+
+# simulerad latens per dataset (sekunder)
+LATENCY = {d: 0.15 for d in DATASETS}
+LATENCY["history"] = 0.30
+
+
+class SlowTicker:
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def __getattr__(self, name):
+        if name not in LATENCY:
+            raise AttributeError(name)
+        time.sleep(LATENCY[name])
+        return {} if name == "info" else pd.DataFrame()
+
+    def history(self, period="2y"):
+        time.sleep(LATENCY["history"])
+        return pd.DataFrame()
+
+
+def _run(executor: ThreadPoolExecutor | None, rounds: int = 3) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        TickerSnapshot("STUB", ticker_factory=SlowTicker, executor=executor).fetch()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    with ThreadPoolExecutor(max_workers=1) as sequential:
+        seq = _run(sequential)
+    conc = _run(None)
+    print(f"sum of dataset latencies : {sum(LATENCY.values()):.2f}s")
+    print(f"slowest single dataset   : {max(LATENCY.values()):.2f}s")
+    print(f"sequential (1 worker)    : {seq:.2f}s")
+    print(f"concurrent (shared pool) : {conc:.2f}s  ({seq / conc:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""YoY/QoQ/TTM/margin/CAGR/volatility for many companies at once.
+
+Builds `quarters` rows (as financial_data returns them, ~2% of values missing)
+for N companies × 40 quarters and times QuarterlyMetrics.from_rows (dicts →
+cube + all metrics), the metrics on a prebuilt cube, and the facts for one
+company. For comparison, a per-company pandas loop computes the same YoY,
+QoQ and TTM columns.
+
+    python -m benchmarks.bench_financial_metrics [n_companies]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from financial_metrics import METRICS, QuarterlyMetrics
+
+QUARTERS = 40
+
+
+def make_rows(n: int, seed: int = 0) -> dict[str, list[dict]]:
+    rng = np.random.default_rng(seed)
+    out = {}
+    for c in range(n):
+        base = rng.uniform(1e8, 1e11)
+        growth = np.cumprod(1 + rng.normal(0.01, 0.05, QUARTERS))
+        rows = []
+        for k in range(QUARTERS):
+            year, q = 2015 + k // 4, k % 4 + 1
+            rev = base * growth[k]
+            row = {"quarter": f"Q{q} {year}", "revenue": int(rev),
+                   "net_income": int(rev * rng.normal(0.12, 0.05)), "ebitda": int(rev * 0.3)}
+            if rng.random() < 0.02:
+                del row["net_income"]
+            rows.append(row)
+        out[f"C{c}"] = rows
+    return out
+
+
+def pandas_loop(rows_by_company):
+    out = {}
+    for company, rows in rows_by_company.items():
+        df = pd.DataFrame(rows)
+        df["q"] = pd.PeriodIndex(df["quarter"].str.replace(r"Q(\d) (\d{4})", r"\2Q\1", regex=True), freq="Q")
+        df = df.set_index("q").sort_index()
+        cols = {}
+        for m in METRICS:
+            s = df[m].astype(float)
+            cols[f"{m}_yoy"] = s.pct_change(4, fill_method=None)
+            cols[f"{m}_qoq"] = s.pct_change(1, fill_method=None)
+            cols[f"{m}_ttm"] = s.rolling(4).sum()
+        out[company] = pd.DataFrame(cols)
+    return out
+
+
+def _time(fn, rounds=5):
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(n: int = 500):
+    rows = make_rows(n)
+    qm = QuarterlyMetrics.from_rows(rows)
+    cube = (qm.companies, qm.metrics, qm.quarters, qm.values)
+
+    t_rows = _time(lambda: QuarterlyMetrics.from_rows(rows))
+    t_cube = _time(lambda: QuarterlyMetrics(*cube))
+    t_facts = _time(lambda: qm.facts("C0"))
+    t_pandas = _time(lambda: pandas_loop(rows), rounds=1)
+
+    print(f"{n} companies × {QUARTERS} quarters × {len(METRICS)} metrics ({qm.values.size} cells)")
+    print(f"rows → cube + metrics: {t_rows * 1000:8.1f} ms")
+    print(f"metrics on cube:       {t_cube * 1000:8.1f} ms")
+    print(f"facts, one company:    {t_facts * 1000:8.2f} ms")
+    print(f"pandas per company:    {t_pandas * 1000:8.1f} ms (YoY/QoQ/TTM only)")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:]))
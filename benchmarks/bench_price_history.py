@@ -0,0 +1,97 @@
+"""Memory and serialization cost of `price_history_2y` for one company.
+
+Builds a two-year daily history shaped like yfinance's (tz-aware index, OHLCV),
+then compares the old {column: {str(timestamp): value}} dicts with
+PriceHistory: deep in-memory size, pickle size/time (cache, Streamlit session
+state) and JSON size/time (what ends up in a prompt).
+
+    python -m benchmarks.bench_price_history
+"""
+import json
+import os
+import pickle
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.price_history import PriceHistory
+
+COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+ROUNDS = 20
+
+
+def make_history(days: int = 502, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end="2025-10-17", periods=days, tz="Europe/Stockholm")
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.015, days)))
+    return pd.DataFrame({
+        "Open": close * rng.uniform(0.99, 1.01, days),
+        "High": close * 1.02,
+        "Low": close * 0.98,
+        "Close": close,
+        "Volume": rng.integers(1_000_000, 20_000_000, days),
+        "Dividends": 0.0,
+        "Stock Splits": 0.0,
+    }, index=idx)
+
+
+def legacy(hist: pd.DataFrame) -> dict:
+    return {k: {str(idx): v for idx, v in hist[k].dropna().items()} for k in COLUMNS if k in hist.columns}
+
+
+def deep_size(obj, seen=None) -> int:
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj)
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_size(k, seen) + deep_size(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(deep_size(x, seen) for x in obj)
+    elif isinstance(obj, PriceHistory):
+        size += deep_size(obj.days, seen) + deep_size(obj._columns, seen)
+    return size
+
+
+def _best(fn):
+    best, out = float("inf"), None
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def bench():
+    hist = make_history()
+    t_build_old, old = _best(lambda: legacy(hist))
+    t_build_new, ph = _best(lambda: PriceHistory.from_frame(hist, COLUMNS))
+    assert ph.to_dict().keys() == old.keys()
+    assert all(ph[k].keys() == old[k].keys() for k in old)
+
+    t_pickle_old, blob_old = _best(lambda: pickle.dumps(old, protocol=pickle.HIGHEST_PROTOCOL))
+    t_pickle_new, blob_new = _best(lambda: pickle.dumps(ph, protocol=pickle.HIGHEST_PROTOCOL))
+    t_json_old, js_old = _best(lambda: json.dumps(old))
+    t_json_new, js_new = _best(lambda: json.dumps(ph.to_compact()))
+    t_lazy, _ = _best(lambda: PriceHistory.from_frame(hist, COLUMNS).to_dict())
+
+    print(f"{len(hist)} days x {len(COLUMNS)} columns")
+    print(f"{'':16}{'dicts':>12}{'PriceHistory':>14}")
+    print(f"{'in memory':16}{deep_size(old) / 1024:>10.0f}KB{deep_size(ph) / 1024:>12.0f}KB")
+    print(f"{'build':16}{t_build_old * 1000:>10.2f}ms{t_build_new * 1000:>12.2f}ms")
+    print(f"{'pickle size':16}{len(blob_old) / 1024:>10.0f}KB{len(blob_new) / 1024:>12.0f}KB")
+    print(f"{'pickle time':16}{t_pickle_old * 1000:>10.2f}ms{t_pickle_new * 1000:>12.2f}ms")
+    print(f"{'json size':16}{len(js_old) / 1024:>10.0f}KB{len(js_new) / 1024:>12.0f}KB")
+    print(f"{'json time':16}{t_json_old * 1000:>10.2f}ms{t_json_new * 1000:>12.2f}ms")
+    print(f"build + all legacy dicts (lazy path): {t_lazy * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    bench()
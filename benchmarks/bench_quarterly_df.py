@@ -0,0 +1,47 @@
+"""Benchmark: vectorized chart_utils.quarterly_df vs the old nested-loop version.
+
+Builds yfinance-shaped payloads (index = ~30 line items, columns = 40 quarters)
+for several companies, checks that both implementations return identical
+frames and prints the best time of a few rounds.
+
+    python -m benchmarks.bench_quarterly_df
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tests")))
+
+import chart_utils as cu
+from legacy_quarterly_df import LINE_ITEMS, legacy_quarterly_df, make_payloads  # tests/
+
+COMPANIES = 20
+QUARTERS = 40
+ROUNDS = 3
+
+
+def _best(fn, payloads):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        out = [fn(p) for p in payloads]
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def bench():
+    payloads = make_payloads(COMPANIES, QUARTERS)
+    t_old, old = _best(legacy_quarterly_df, payloads)
+    t_new, new = _best(cu.quarterly_df, payloads)
+    for a, b in zip(old, new):
+        pd.testing.assert_frame_equal(a, b)
+    print(f"{COMPANIES} companies x {QUARTERS} quarters x {len(LINE_ITEMS)} line items")
+    print(f"legacy loops: {t_old * 1000:8.1f} ms")
+    print(f"vectorized:   {t_new * 1000:8.1f} ms ({t_old / t_new:.0f}x)")
+
+
+if __name__ == "__main__":
+    bench()
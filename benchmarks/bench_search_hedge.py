@@ -0,0 +1,84 @@
+"""Stubbed-latency benchmark for the web_search tool.
+
+SerpAPI usually answers in ~0.2 s but hangs on every fifth query (the kind
+of tail that hurt in practice); DuckDuckGo answers in ~0.4 s. The old tool
+(copied below) waited up to 5 s for SerpAPI and then joined the hung call
+when its `with ThreadPoolExecutor` block exited. Latencies are scaled by
+SCALE so the benchmark runs quickly; printed numbers are unscaled.
+
+    python -m benchmarks.bench_search_hedge
+"""
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools import http_client
+from tools import tools as tools_module
+
+SCALE = 0.1            # 1 s i tabellen = 0.1 s på riktigt
+QUERIES = 20
+SERP_LATENCY = 0.2
+SERP_HANG = 8.0        # var femte fråga
+DDG_LATENCY = 0.4
+LEGACY_TIMEOUT = 5.0
+
+
+class SerpStub:
+    def __init__(self):
+        self.n = 0
+
+    def run(self, query):
+        self.n += 1
+        time.sleep((SERP_HANG if self.n % 5 == 0 else SERP_LATENCY) * SCALE)
+        return f"serpapi: {query}"
+
+
+class DdgStub:
+    def run(self, query):
+        time.sleep(DDG_LATENCY * SCALE)
+        return f"duckduckgo: {query}"
+
+
+def legacy_web_search(serp, ddg, query):
+    # web_search före hedging: ny pool per fråga, 5 s timeout, with-blocket väntar in SerpAPI
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(serp.run, query)
+        try:
+            return future.result(timeout=LEGACY_TIMEOUT * SCALE)
+        except (TimeoutError, Exception):
+            return ddg.run(query)
+
+
+def _latencies(fn):
+    out = []
+    for i in range(QUERIES):
+        t0 = time.perf_counter()
+        fn(f"query {i}")
+        out.append((time.perf_counter() - t0) / SCALE)
+    return out
+
+
+def _report(label, lat):
+    lat = sorted(lat)
+    p95 = lat[int(0.95 * (len(lat) - 1))]
+    print(f"{label:24} p50 {statistics.median(lat):5.2f}s  p95 {p95:5.2f}s  max {lat[-1]:5.2f}s")
+
+
+def bench():
+    http_client.set_limiter(http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    serp, ddg = SerpStub(), DdgStub()
+    _report("legacy (5 s timeout)", _latencies(lambda q: legacy_web_search(serp, ddg, q)))
+
+    tools_module.SerpAPIWrapper = lambda serpapi_api_key: SerpStub()
+    tools_module.DuckDuckGoSearchAPIWrapper = DdgStub
+    for delay in (0.5, 0.0):
+        web_search = tools_module.create_search_tool("key", hedge_delay=delay * SCALE)["function"]
+        _report(f"hedged, delay {delay:.1f} s", _latencies(web_search))
+
+
+if __name__ == "__main__":
+    bench()
@@ -0,0 +1,75 @@
+"""Time to first content: run_company_analysis vs stream_company_analysis.
+
+Uses the fake fixed-latency crews from bench_async_pipeline (one LLM_LATENCY
+sleep per task) and a financial_data tool that takes TOOL_LATENCY. Prints
+when each stream event arrives; with run_company_analysis everything arrives
+at the end.
+
+    OPENAI_API_KEY=dummy python -m benchmarks.bench_streaming
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+os.environ.setdefault("OPENAI_API_KEY", "dummy")
+
+import main
+from benchmarks import bench_async_pipeline as fakes
+
+LLM_LATENCY = 0.5
+TOOL_LATENCY = 0.2
+QUARTERS = [{"quarter": f"Q{q} 2024", "revenue": 100 + q} for q in (1, 2, 3, 4)]
+RESEARCH_OUTPUT = (
+    "- Revenue Q2 2025 up 5% YoY to SEK 56,100 million (https://example.com/q2)\n"
+    "- Net income Q2 2025 rose to SEK 3,900 million\n"
+)
+REPORT_OUTPUTS = {
+    "Executive Summary": "Executive Summary\nSolid quarter.\n\n--- End of Executive Summary ---",
+    "Recommendations": "Recommendations\n- Hold.\n\n--- End of Recommendations ---",
+}
+
+
+def _reporting_tasks(agent, company_name, **_):
+    # description = sektionen, så att CallbackCrew vet vad varje rapport-task ska svara
+    return [SimpleNamespace(agent=agent, description=name, output=None) for name in main.REPORT_SECTIONS]
+
+
+class CallbackCrew(fakes.FakeCrew):
+    def kickoff(self):
+        outs = []
+        for task in self.tasks:
+            time.sleep(LLM_LATENCY)
+            # rapport-tasks känns igen på sektionen (research-tasks har också callbacks, för källorna)
+            task.output = SimpleNamespace(raw=REPORT_OUTPUTS.get(task.description, RESEARCH_OUTPUT))
+            callback = getattr(task, "callback", None)
+            if callback:
+                callback(task.output)  # som crewai efter varje task
+            outs.append(task.output)
+        return SimpleNamespace(tasks_output=outs)
+
+
+def _tool(name):
+    time.sleep(TOOL_LATENCY)
+    return {"quarters": QUARTERS}
+
+
+def bench():
+    fakes._install_fakes()
+    main.Crew = CallbackCrew
+    main.create_chunked_reporting_tasks = _reporting_tasks
+    main.create_shared_resources = lambda: (object(), {"name": "web_search"}, _tool)
+
+    t0 = time.perf_counter()
+    main.run_company_analysis("Volvo")
+    print(f"run_company_analysis: everything at {time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    print("stream_company_analysis:")
+    for event, _ in main.stream_company_analysis("Volvo"):
+        print(f"  {time.perf_counter() - t0:5.2f}s  {event}")
+
+
+if __name__ == "__main__":
+    bench()
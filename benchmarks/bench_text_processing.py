@@ -0,0 +1,142 @@
+"""Micro-benchmark for report post-processing over the debug log corpus.
+
+Compares the old per-call `re.sub`/`re.split` helpers (copied below as they
+were in main.py) with text_processing, checks that both give identical output
+and prints the best time of a few rounds for each.
+
+    python -m benchmarks.bench_text_processing [corpus.txt]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import text_processing as tp
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "debug_reporting_outputs.txt")
+ROUNDS = 5
+
+
+# --- legacy (main.py före text_processing) ---
+def _legacy_clean_corrupted_numbers(text):
+    text = re.sub(r'(?<=\d),(?=\d)', '', text)
+    text = re.sub(r'[ \t]+', ' ', text)
+    return text.strip()
+
+
+def _legacy_normalize_md_spacing(text):
+    text = re.sub(r'[ \t]+$', '', text, flags=re.MULTILINE)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+def _legacy_sanitize_line(line):
+    line = re.sub(r'!\[([^\]]*)\]\([^)]+\)', r'\1', line)
+    line = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1', line)
+    line = re.sub(r'^\s*#{1,6}\s*', '', line)
+    line = re.sub(r'[*_`>]+', '', line)
+    return re.sub(r'\s+', ' ', line).strip()
+
+
+def _legacy_looks_like_source(line):
+    if line.lower().startswith(("source:", "källa:", "link:", "url:", "published", "ref:")):
+        return True
+    return bool(re.fullmatch(r'https?://\S+', line.strip(), flags=re.IGNORECASE))
+
+
+def _legacy_extract_bullets_strict(text):
+    return [raw for raw in (text or "").splitlines() if re.match(r'^\s*([-•*]|\d+[.)])\s+', raw)]
+
+
+def _legacy_fallback_sentence_bullets(text, limit):
+    keep = []
+    pat = re.compile(r'(?:\bQ[1-4]\s?\d{4}\b|\b\d+(\.\d+)?%|\bSEK\b|\bUSD\b|\bEUR\b|\b\d{3,})')
+    for c in re.split(r'(?<=[\.\!\?])\s+', text or ""):
+        c = _legacy_sanitize_line(c)
+        if len(c) < 8:
+            continue
+        if pat.search(c) and not _legacy_looks_like_source(c):
+            keep.append(f"- {c}")
+        if len(keep) >= limit:
+            break
+    return keep
+
+
+def _legacy_normalize_bullets(lines, max_items):
+    out, seen = [], set()
+    pending = None
+
+    def _emit(text):
+        t = text.strip()
+        if not t or len(t) < 8 or _legacy_looks_like_source(t):
+            return
+        if len(t) > 240:
+            t = t[:240].rstrip() + "…"
+        if t.lower() in seen:
+            return
+        seen.add(t.lower())
+        out.append(f"- {t}")
+
+    for raw in lines:
+        l = re.sub(r'^\s*(?:[-•*]|\d+[.)])\s+', '', raw.strip())
+        l = _legacy_sanitize_line(l)
+        l = re.sub(r'\s*[-–—]\s*$', '', l)
+        if not l:
+            continue
+        if pending is not None:
+            _emit(f"{pending} {l}")
+            pending = None
+        elif l.endswith(":"):
+            pending = l.rstrip(":").strip() + ":"
+        else:
+            _emit(l)
+        if max_items and len(out) >= max_items:
+            break
+    if pending is not None and (not max_items or len(out) < max_items):
+        _emit(pending.rstrip(":"))
+    return out
+
+
+def legacy(text):
+    bullets = _legacy_normalize_bullets(_legacy_extract_bullets_strict(text), max_items=0)
+    facts = _legacy_fallback_sentence_bullets(text, limit=10**9)
+    urls = re.findall(r'https?://[^\s\)\]]+', text)
+    report = _legacy_normalize_md_spacing(_legacy_clean_corrupted_numbers(text))
+    return bullets, facts, urls, report
+
+
+def new(text):
+    seg = tp.segment_text(text)
+    bullets = tp.normalize_bullets(seg.bullets, max_items=0)
+    facts = [f"- {c}" for c in seg.facts]
+    return bullets, facts, seg.urls, tp.clean_report(text)
+
+
+def _best(fn, text):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        t0 = time.perf_counter()
+        result = fn(text)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def bench(path=CORPUS):
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    t_old, old = _best(legacy, text)
+    t_new, fresh = _best(new, text)
+    assert old[0] == fresh[0], "bullets differ"
+    assert old[1] == fresh[1], "fact sentences differ"
+    assert old[2] == fresh[2], "urls differ"
+    assert old[3] == fresh[3], "cleaned report differs"
+    assert tp.clean_report(text) == tp.normalize_md_spacing(tp.clean_corrupted_numbers(text))
+    print(f"corpus: {len(text) / 1024:.0f} KB, {len(fresh[0])} bullets, {len(fresh[1])} fact sentences, {len(fresh[2])} urls")
+    print(f"legacy helpers:  {t_old * 1000:7.1f} ms")
+    print(f"text_processing: {t_new * 1000:7.1f} ms ({t_old / t_new:.1f}x)")
+
+
+if __name__ == "__main__":
+    bench(*sys.argv[1:])
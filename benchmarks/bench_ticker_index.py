@@ -0,0 +1,64 @@
+"""Resolve 10k company names against the local ticker index.
+
+Queries are the bundled names and aliases with realistic noise (case, legal
+suffixes, truncation, one-letter typos) plus unknown names. Prints the time
+for building the index, a cold pass and a warm (memoized) pass. No network.
+
+    python -m benchmarks.bench_ticker_index [n_queries]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.ticker_index import BUNDLED_CSV, TickerIndex
+
+
+def make_queries(index: TickerIndex, n: int, seed: int = 0) -> list[str]:
+    rng = random.Random(seed)
+    names = sorted({e.name for e in index._by_symbol.values()})
+    out = []
+    for i in range(n):
+        name = rng.choice(names)
+        kind = i % 5
+        if kind == 0:
+            q = name.upper()
+        elif kind == 1:
+            q = f"{name} {rng.choice(['AB', 'Inc.', 'Corporation', 'AB (publ)', 'plc'])}"
+        elif kind == 2:
+            q = name[: max(4, len(name) - 2)]
+        elif kind == 3 and len(name) > 5:
+            j = rng.randrange(1, len(name) - 1)
+            q = name[:j] + name[j + 1:]  # ett tecken bortfallet
+        else:
+            q = f"Unknown Company {i}"
+        out.append(q)
+    return out
+
+
+def bench(n: int = 10_000):
+    t0 = time.perf_counter()
+    index = TickerIndex()
+    index.load_csv(BUNDLED_CSV)
+    t_build = time.perf_counter() - t0
+
+    queries = make_queries(index, n)
+    t0 = time.perf_counter()
+    cold = [index.resolve(q) for q in queries]
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    warm = [index.resolve(q) for q in queries]
+    t_warm = time.perf_counter() - t0
+    assert cold == warm
+
+    found = sum(s is not None for s in cold)
+    print(f"index: {len(index)} listings, built in {t_build * 1000:.1f} ms")
+    print(f"{n} queries ({len(set(queries))} distinct), {found} resolved")
+    print(f"cold: {t_cold * 1000:7.1f} ms")
+    print(f"warm: {t_warm * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    bench(*(int(a) for a in sys.argv[1:]))
@@ -9,6 +9,8 @@ import plotly.graph_objects as go
 from plotly.subplots import make_subplots
 import matplotlib.pyplot as plt
 
+from quarters import quarter_sort_key, quarter_to_ts, quarters_to_ts
+
 # =========================
 # 1) Robust parser + enkel Altair-linje
 # =========================
@@ -19,31 +21,36 @@ METRIC_ALIASES = {
     "ebitda": ["ebitda", "adjusted ebitda"],
 }
 
+# alias (gemener) → standardnamn; första träffen i METRIC_ALIASES vinner
+_METRIC_LOOKUP: dict[str, str] = {}
+for _std, _alts in METRIC_ALIASES.items():
+    for _a in (_std, *_alts):
+        _METRIC_LOOKUP.setdefault(_a, _std)
+
 def _normalize_metric_name(name: str) -> str | None:
-    n = str(name).strip().lower()
-    for std, alts in METRIC_ALIASES.items():
-        if n == std or any(n == a for a in alts):
-            return std
-    return None
+    return _METRIC_LOOKUP.get(str(name).strip().lower())
 
-def _quarter_to_ts(q):
-    import re, pandas as pd
-    s = str(q).strip().upper()
-    m1 = re.search(r"(Q[1-4])\s*[-_/ ]?\s*(\d{4})", s)
-    m2 = re.search(r"(\d{4})\s*[-_/ ]?\s*Q([1-4])", s)
-    if m1:
-        qn = m1.group(1)[1]
-        yy = m1.group(2)
-        s_norm = f"{yy}Q{qn}"
-    elif m2:
-        s_norm = f"{m2.group(1)}Q{m2.group(2)}"
-    else:
-        # tillåt råa datumsträngar; försök parse:a
-        try:
-            return pd.to_datetime(s)
-        except Exception:
-            raise ValueError(f"Kan inte tolka kvartal: {q}")
-    return pd.Period(s_norm, freq="Q").to_timestamp(how="end")
+# kvartalstolkning delas med main/tools (quarters.py, memoiserad)
+_quarter_to_ts = quarter_to_ts
+_quarters_to_ts = quarters_to_ts
+
+def _metrics_by_quarter(qf_df: pd.DataFrame, alias_order: bool) -> pd.DataFrame:
+    """
+    index=metrics, columns=quarters → en rad per kvartal med standardmetriker som kolumner.
+    Dubbla alias: sista raden vinner. Kolumnordning: METRIC_ALIASES (alias_order) eller
+    första förekomst i index.
+    """
+    std = pd.Index([_METRIC_LOOKUP.get(str(ix).strip().lower()) for ix in qf_df.index], dtype=object)
+    known = std.notna()
+    block = qf_df.loc[known]
+    block.index = std[known]
+    block = block[~block.index.duplicated(keep="last")]
+    order = [m for m in METRIC_ALIASES if m in block.index] if alias_order else list(dict.fromkeys(block.index))
+    block = block.reindex(order)
+    data = {"quarter": list(qf_df.columns)}
+    for metric, values in zip(order, block.to_numpy()):
+        data[metric] = pd.to_numeric(values, errors="coerce")
+    return pd.DataFrame(data, columns=["quarter", *order])
 
 def _ensure_metric_index_quarter_columns(qf_data) -> pd.DataFrame:
     """
@@ -118,21 +125,8 @@ def quarterly_df(raw):
         qf = data["quarterly_financials"]
         qf_df = _ensure_metric_index_quarter_columns(qf)
 
-        # Bygg radbaserad tabell: en rad per quarter
-        out_rows = []
-        for q in qf_df.columns:
-            row = {"quarter": q}
-            # hitta alias per metric
-            for std_name, aliases in METRIC_ALIASES.items():
-                # leta i index efter någon alias
-                for ix in qf_df.index:
-                    norm = _normalize_metric_name(ix)
-                    if norm == std_name:
-                        val = qf_df.loc[ix, q]
-                        row[std_name] = pd.to_numeric(val, errors="coerce")
-                # om inget träff: lämna tomt
-            out_rows.append(row)
-        df = pd.DataFrame(out_rows)
+        # radbaserad tabell: en rad per quarter, metriker i METRIC_ALIASES-ordning
+        df = _metrics_by_quarter(qf_df, alias_order=True)
 
     # 3) Fall: dict som antingen {quarter: {metric: val}} eller {metric: {quarter: val}}
     elif isinstance(data, dict):
@@ -155,15 +149,7 @@ def quarterly_df(raw):
         else:
             # antag {metric: {quarter: val}}
             qf_df = _ensure_metric_index_quarter_columns(data)
-            out_rows = []
-            for q in qf_df.columns:
-                row = {"quarter": q}
-                for ix in qf_df.index:
-                    norm = _normalize_metric_name(ix)
-                    if norm:
-                        row[norm] = pd.to_numeric(qf_df.loc[ix, q], errors="coerce")
-                out_rows.append(row)
-            df = pd.DataFrame(out_rows)
+            df = _metrics_by_quarter(qf_df, alias_order=False)
 
     # 4) Fall: list[dict]
     elif isinstance(data, list):
@@ -176,7 +162,7 @@ def quarterly_df(raw):
         raise ValueError("Saknar kolumn 'quarter' efter normalisering.")
 
     # Tidsaxel
-    df["quarter"] = df["quarter"].apply(_quarter_to_ts)
+    df["quarter"] = _quarters_to_ts(df["quarter"]).to_numpy()
 
     # Säkerställ numerik
     for c in ["revenue", "net_income", "ebitda"]:
@@ -311,17 +297,7 @@ def create_quarterly_comparison_chart(quarterly_data: dict, company_name: str):
         qf_df = _ensure_metric_index_quarter_columns(quarterly_data["quarterly_financials"])
 
         # Sortera kvartal efter tidsordning via heuristik
-        def _q_key(q):
-            s = str(q)
-            m1 = re.search(r"Q([1-4]).*?(\d{4})", s)
-            m2 = re.search(r"(\d{4}).*?Q([1-4])", s)
-            if m1:
-                return (int(m1.group(2)), int(m1.group(1)))
-            if m2:
-                return (int(m2.group(1)), int(m2.group(2)))
-            return (0, 0)
-
-        quarters_sorted = sorted(qf_df.columns, key=_q_key)
+        quarters_sorted = sorted(qf_df.columns, key=quarter_sort_key)
         latest_quarters = quarters_sorted[-8:]  # senaste 8
 
         metrics = ["Total Revenue", "Net Income", "Gross Profit", "Operating Income"]
@@ -384,17 +360,7 @@ def create_year_over_year_chart(quarterly_data: dict, company_name: str):
 
         qf_df = _ensure_metric_index_quarter_columns(quarterly_data["quarterly_financials"])
 
-        def _q_key(q):
-            s = str(q)
-            m1 = re.search(r"Q([1-4]).*?(\d{4})", s)
-            m2 = re.search(r"(\d{4}).*?Q([1-4])", s)
-            if m1:
-                return (int(m1.group(2)), int(m1.group(1)))
-            if m2:
-                return (int(m2.group(1)), int(m2.group(2)))
-            return (0, 0)
-
-        quarters_sorted = sorted(qf_df.columns, key=_q_key)
+        quarters_sorted = sorted(qf_df.columns, key=quarter_sort_key)
         if len(quarters_sorted) < 5:
             return None
 
@@ -455,17 +421,7 @@ def create_simple_quarterly_summary(quarterly_data: dict, company_name: str):
 
         qf_df = _ensure_metric_index_quarter_columns(quarterly_data["quarterly_financials"])
 
-        def _q_key(q):
-            s = str(q)
-            m1 = re.search(r"Q([1-4]).*?(\d{4})", s)
-            m2 = re.search(r"(\d{4}).*?Q([1-4])", s)
-            if m1:
-                return (int(m1.group(2)), int(m1.group(1)))
-            if m2:
-                return (int(m2.group(1)), int(m2.group(2)))
-            return (0, 0)
-
-        quarters_sorted = sorted(qf_df.columns, key=_q_key)
+        quarters_sorted = sorted(qf_df.columns, key=quarter_sort_key)
         latest_quarters = quarters_sorted[-4:]
 
         key_metrics = ["Total Revenue", "Net Income", "Gross Profit", "Operating Income"]
@@ -0,0 +1,225 @@
+# financial_metrics.py
+"""Deterministic growth, margin and trend metrics over quarterly rows.
+
+The analysis prompt used to ask the model for YoY percentages and EBITDA
+trends. Here they are computed up front, for any number of companies at once,
+on a dense cube of shape (company, metric, quarter) with NaN for missing
+quarters:
+
+    yoy, qoq     (v[t] - v[t-k]) / |v[t-k]|, k = 4 and 1
+    ttm          sum of the last 4 quarters (NaN if one of them is missing)
+    margins      net income / revenue, EBITDA / revenue
+    cagr         annualised growth of TTM between its first and last value
+    volatility   sample std of QoQ growth over the last VOLATILITY_WINDOW quarters
+
+Growth divides by |previous| so a shrinking loss reads as positive growth;
+a previous value of 0 gives NaN.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from quarterly_store import QuarterlyStore, ordinal_label, quarter_ordinal
+
+# radnycklarna från financial_data ("quarters") i visningsordning
+METRICS = ("revenue", "net_income", "ebitda")
+LABELS = {"revenue": "Revenue", "net_income": "Net income", "ebitda": "EBITDA"}
+MARGINS = {"net_margin": "net_income", "ebitda_margin": "ebitda"}  # täljare; nämnaren är revenue
+MARGIN_LABELS = {"net_margin": "Net margin", "ebitda_margin": "EBITDA margin"}
+VOLATILITY_WINDOW = 4
+TREND_QUARTERS = 5
+
+
+def _lag(a: np.ndarray, k: int) -> np.ndarray:
+    out = np.full_like(a, np.nan)
+    if a.shape[-1] > k:
+        out[..., k:] = a[..., :-k]
+    return out
+
+
+def _growth(a: np.ndarray, k: int) -> np.ndarray:
+    prev = _lag(a, k)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        g = (a - prev) / np.abs(prev)
+    g[~np.isfinite(g)] = np.nan
+    return g
+
+
+def _rolling(a: np.ndarray, window: int, fn) -> np.ndarray:
+    """fn över de senaste `window` kvartalen; NaN tills fönstret är fullt eller om ett värde saknas."""
+    out = np.full_like(a, np.nan)
+    if a.shape[-1] >= window:
+        out[..., window - 1:] = fn(sliding_window_view(a, window, axis=-1), axis=-1)
+    return out
+
+
+def _std(windows: np.ndarray, axis: int) -> np.ndarray:
+    return np.std(windows, axis=axis, ddof=1)
+
+
+def _first_last(a: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(first, last, any) index of non-NaN values along the last axis."""
+    valid = ~np.isnan(a)
+    n = a.shape[-1]
+    if n == 0:
+        none = np.zeros(a.shape[:-1], dtype=np.int64)
+        return none, none, none.astype(bool)
+    first = valid.argmax(axis=-1)
+    last = n - 1 - valid[..., ::-1].argmax(axis=-1)
+    return first, last, valid.any(axis=-1)
+
+
+def _amount(x: float) -> str:
+    a = abs(x)
+    for div, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if a >= div:
+            return f"{x / div:.2f}{suffix}"
+    return f"{x:.0f}"
+
+
+@dataclass
+class QuarterlyMetrics:
+    companies: list[str]
+    metrics: tuple[str, ...]
+    quarters: np.ndarray                 # ordinals (year * 4 + quarter - 1), sammanhängande
+    values: np.ndarray                   # (company, metric, quarter)
+    yoy: np.ndarray = field(init=False)
+    qoq: np.ndarray = field(init=False)
+    ttm: np.ndarray = field(init=False)
+    volatility: np.ndarray = field(init=False)
+    margins: dict[str, np.ndarray] = field(init=False)   # namn → (company, quarter)
+    cagr: np.ndarray = field(init=False)                 # (company, metric)
+    cagr_span: tuple[np.ndarray, np.ndarray] = field(init=False)  # kvartalsindex (från, till)
+
+    def __post_init__(self):
+        v = self.values
+        self.yoy = _growth(v, 4)
+        self.qoq = _growth(v, 1)
+        self.ttm = _rolling(v, 4, np.sum)
+        self.volatility = _rolling(self.qoq, VOLATILITY_WINDOW, _std)
+
+        self.margins = {}
+        if "revenue" in self.metrics:
+            rev = v[:, self.metrics.index("revenue")]
+            for name, metric in MARGINS.items():
+                if metric in self.metrics:
+                    with np.errstate(divide="ignore", invalid="ignore"):
+                        m = v[:, self.metrics.index(metric)] / np.where(rev > 0, rev, np.nan)
+                    self.margins[name] = m
+
+        first, last, found = _first_last(self.ttm)
+        ttm = self.ttm if self.ttm.shape[-1] else np.full(self.ttm.shape[:-1] + (1,), np.nan)
+        v0 = np.take_along_axis(ttm, first[..., None], axis=-1)[..., 0]
+        v1 = np.take_along_axis(ttm, last[..., None], axis=-1)[..., 0]
+        span = last - first
+        ok = found & (span >= 4) & (v0 > 0) & (v1 > 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.cagr = np.where(ok, (v1 / v0) ** (4.0 / np.maximum(span, 1)) - 1.0, np.nan)
+        self.cagr_span = (first, last)
+
+    # ---------- konstruktion ----------
+    @classmethod
+    def from_columns(cls, companies, metrics, company_idx, quarter_ords, metric_idx, values) -> "QuarterlyMetrics":
+        """Parallel arrays (company index, quarter ordinal, metric index, value) → dense cube."""
+        q = np.asarray(quarter_ords, dtype=np.int64)
+        v = np.asarray(values, dtype=np.float64)
+        start = int(q.min()) if len(q) else 0
+        n_q = int(q.max()) - start + 1 if len(q) else 0
+        cube = np.full((len(companies), len(metrics), n_q), np.nan)
+        cube[np.asarray(company_idx, dtype=np.int64), np.asarray(metric_idx, dtype=np.int64), q - start] = v
+        return cls(list(companies), tuple(metrics), np.arange(start, start + n_q), cube)
+
+    @classmethod
+    def from_rows(cls, rows_by_company: dict[str, list[dict]], metrics=METRICS) -> "QuarterlyMetrics":
+        """{company: financial_data 'quarters' rows}; unparseable quarters and non-numeric values are skipped."""
+        m_index = {m: i for i, m in enumerate(metrics)}
+        ci, qi, mi, vals = [], [], [], []
+        for c, rows in enumerate(rows_by_company.values()):
+            for row in rows or []:
+                o = quarter_ordinal(row.get("quarter"))
+                if o is None:
+                    continue
+                for metric, i in m_index.items():
+                    x = row.get(metric)
+                    if isinstance(x, (int, float)) and not isinstance(x, bool):
+                        ci.append(c)
+                        qi.append(o)
+                        mi.append(i)
+                        vals.append(x)
+        return cls.from_columns(list(rows_by_company), metrics, ci, qi, mi, vals)
+
+    @classmethod
+    def from_store(cls, store: QuarterlyStore, rename: dict[str, str]) -> "QuarterlyMetrics":
+        """All companies in a QuarterlyStore; `rename` maps store metric names → METRICS keys."""
+        c, q, m, v = store.columns()
+        metrics = tuple(dict.fromkeys(rename.values()))
+        lookup = np.full(max(len(store.metrics), 1), -1)
+        for name, key in rename.items():
+            mid = store.metrics.get(name)
+            if mid is not None:
+                lookup[mid] = metrics.index(key)
+        mi = lookup[m] if len(m) else m.astype(np.int64)
+        keep = mi >= 0
+        return cls.from_columns(store.companies.names, metrics, c[keep], q[keep], mi[keep], v[keep])
+
+    # ---------- fakta till prompten ----------
+    def facts(self, company: str) -> list[str]:
+        """Precomputed figures for one company as '- ...' lines, latest quarter first."""
+        if company not in self.companies or not self.quarters.size:
+            return []
+        c = self.companies.index(company)
+        v = self.values[c]
+        _, last, found = _first_last(v)
+        if not found.any():
+            return []
+        t = int(last[found].max())
+        label = ordinal_label(int(self.quarters[t]))
+        out = [f"- Latest quarter: {label}"]
+
+        for i, metric in enumerate(self.metrics):
+            x = v[i, t]
+            if np.isnan(x):
+                continue
+            name = LABELS.get(metric, metric)
+            parts = [f"{name} {label}: {_amount(x)}"]
+            if not np.isnan(self.yoy[c, i, t]):
+                parts.append(f"YoY {self.yoy[c, i, t]:+.1%} vs {ordinal_label(int(self.quarters[t - 4]))} ({_amount(v[i, t - 4])})")
+            if not np.isnan(self.qoq[c, i, t]):
+                parts.append(f"QoQ {self.qoq[c, i, t]:+.1%}")
+            if not np.isnan(self.ttm[c, i, t]):
+                parts.append(f"TTM {_amount(self.ttm[c, i, t])}")
+            out.append("- " + "; ".join(parts))
+
+            recent = [k for k in range(max(0, t - TREND_QUARTERS + 1), t + 1) if not np.isnan(v[i, k])]
+            if len(recent) >= 3:
+                span = f"{ordinal_label(int(self.quarters[recent[0]]))} → {label}"
+                out.append(f"- {name} last {len(recent)}Q ({span}): " + ", ".join(_amount(v[i, k]) for k in recent))
+
+            growth = []
+            if not np.isnan(self.cagr[c, i]):
+                q0, q1 = (ordinal_label(int(self.quarters[s[c, i]])) for s in self.cagr_span)
+                growth.append(f"CAGR {self.cagr[c, i]:+.1%}/yr (TTM {q0} → {q1})")
+            if not np.isnan(self.volatility[c, i, t]):
+                growth.append(f"QoQ volatility {self.volatility[c, i, t] * 100:.1f} pp (std, last {VOLATILITY_WINDOW}Q)")
+            if growth:
+                out.append(f"- {name}: " + "; ".join(growth))
+
+        for name, m in self.margins.items():
+            x = m[c, t]
+            if np.isnan(x):
+                continue
+            line = f"- {MARGIN_LABELS.get(name, name)} {label}: {x:.1%}"
+            if t >= 4 and not np.isnan(m[c, t - 4]):
+                line += f" ({ordinal_label(int(self.quarters[t - 4]))}: {m[c, t - 4]:.1%})"
+            out.append(line)
+        return out
+
+
+def metric_facts(rows: list[dict] | None) -> list[str]:
+    """Facts for a single company's financial_data 'quarters' rows ([] when there are none)."""
+    if not rows:
+        return []
+    return QuarterlyMetrics.from_rows({"_": rows}).facts("_")
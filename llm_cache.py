@@ -0,0 +1,273 @@
+# llm_cache.py
+"""Content-addressed cache for LLM responses.
+
+Keys are a SHA-256 of the LangChain `llm_string` (model, temperature and the
+other invocation params) and the fully rendered prompt, which already contains
+the task description and any tool outputs. Entries live in a local SQLite file
+and are evicted least-recently-used once the store exceeds `max_bytes`.
+
+Modes (env LLM_CACHE_MODE):
+  - "off" (default): no caching
+  - "on": read and write. Entries never expire and the key has no date, so a
+    rerun replays the earlier answers instead of reading fresh data; use it
+    for development and for recording runs, not for live analyses
+  - "replay": read only; a miss raises LLMCacheMiss instead of calling the API,
+    so recorded runs can be replayed without network or API spend
+
+CrewAI does not call the LangChain client: it rebuilds it as its own LLM and
+drops `cache=`. CachedCrewLLM therefore wraps the CrewAI LLM and answers crew
+calls from the same store, keyed by the full message list instead.
+"""
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any
+
+from crewai.llms.base_llm import BaseLLM
+from crewai.utilities.llm_utils import create_llm
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+from langchain_core.outputs import Generation
+from pydantic import BaseModel, Field
+
+try:
+    from crewai.llms.base_llm import call_stop_override as _stop_override
+except ImportError:  # äldre crewai: stop-orden ligger direkt på LLM:en
+    @contextlib.contextmanager
+    def _stop_override(llm, stop):
+        llm.stop = stop
+        yield
+
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024  # 200 MB
+
+
+class LLMCacheMiss(RuntimeError):
+    """Raised in replay mode when a prompt has no recorded response."""
+
+
+def llm_cache_mode() -> str:
+    mode = os.getenv("LLM_CACHE_MODE", "off").strip().lower()
+    return mode if mode in ("on", "replay", "off") else "off"
+
+
+def default_llm_cache_path() -> str:
+    base = os.getenv("COMPANY_ANALYZER_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "company-analyzer"
+    )
+    return os.path.join(base, "llm_responses.sqlite")
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    h = hashlib.sha256()
+    h.update(llm_string.encode("utf-8"))
+    h.update(b"\x00")
+    h.update(prompt.encode("utf-8"))
+    return h.hexdigest()
+
+
+class LLMResponseCache(BaseCache):
+    """SQLite-backed LangChain cache with size-based LRU eviction."""
+
+    def __init__(self, path: str | None = None, max_bytes: int = DEFAULT_MAX_BYTES, replay: bool = False):
+        self.path = path or default_llm_cache_path()
+        self.max_bytes = max_bytes
+        self.replay = replay
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " payload BLOB NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_access)")
+
+    def lookup(self, prompt: str, llm_string: str) -> RETURN_VAL_TYPE | None:
+        key = cache_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and not self.replay:
+                with self._conn:
+                    self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        if row is None:
+            if self.replay:
+                raise LLMCacheMiss(f"No recorded LLM response for key {key[:12]}… (LLM_CACHE_MODE=replay)")
+            return None
+        try:
+            return loads(zlib.decompress(row[0]).decode("utf-8"))
+        except Exception:
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        if self.replay:
+            return
+        payload = zlib.compress(dumps(return_val).encode("utf-8"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, last_access) VALUES (?, ?, ?, ?)",
+                (cache_key(prompt, llm_string), payload, len(payload), time.time()),
+            )
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # äldst använda först tills vi är under gränsen
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def size_bytes(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+
+def _tool_call_dict(call) -> dict | None:
+    if isinstance(call, BaseModel):
+        call = call.model_dump(mode="json")
+    return call if isinstance(call, dict) and "function" in call else None
+
+
+def _to_generations(result) -> list[Generation] | None:
+    """Crew-svar → det som lagras; None för svar som inte går att spara (t.ex. pydantic-objekt)."""
+    if isinstance(result, str):
+        return [Generation(text=result)]
+    if isinstance(result, list) and result:
+        calls = [_tool_call_dict(c) for c in result]
+        if all(calls):
+            return [Generation(text="", generation_info={"tool_calls": calls})]
+    return None
+
+
+def _from_generations(generations: RETURN_VAL_TYPE):
+    info = generations[0].generation_info or {}
+    return info["tool_calls"] if "tool_calls" in info else generations[0].text
+
+
+class CachedCrewLLM(BaseLLM):
+    """CrewAI LLM that answers from an LLMResponseCache before calling `inner`.
+
+    Text answers and native tool-call turns are stored; the key covers model,
+    temperature, stop words, tool schemas and every message sent.
+    """
+
+    inner: BaseLLM
+    response_cache: Any = Field(default=None, exclude=True)
+
+    @classmethod
+    def wrap(cls, llm, cache: LLMResponseCache) -> "CachedCrewLLM":
+        """`llm` may be anything CrewAI's create_llm accepts (a LangChain client, a model name, an LLM)."""
+        inner = create_llm(llm)
+        return cls(
+            model=inner.model,
+            temperature=inner.temperature,
+            provider=inner.provider,
+            stop=list(inner.stop),
+            inner=inner,
+            response_cache=cache,
+        )
+
+    def _key(self, messages, tools, response_model) -> tuple[str, str]:
+        prompt = messages if isinstance(messages, str) else json.dumps(messages, sort_keys=True, default=str)
+        llm_string = json.dumps(
+            {
+                "llm": "crewai",
+                "model": self.inner.model,
+                "temperature": self.inner.temperature,
+                "stop": self.stop_sequences,
+                "tools": tools,
+                "response_model": getattr(response_model, "__name__", None),
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return prompt, llm_string
+
+    def _store(self, prompt: str, llm_string: str, result) -> None:
+        generations = _to_generations(result)
+        if generations:
+            self.response_cache.update(prompt, llm_string, generations)
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        prompt, llm_string = self._key(messages, tools, response_model)
+        hit = self.response_cache.lookup(prompt, llm_string)  # replay: LLMCacheMiss vid miss
+        if hit:
+            return _from_generations(hit)
+        with _stop_override(self.inner, self.stop_sequences):
+            result = self.inner.call(
+                messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                from_task=from_task, from_agent=from_agent, response_model=response_model,
+            )
+        self._store(prompt, llm_string, result)
+        return result
+
+    async def acall(self, messages, tools=None, callbacks=None, available_functions=None,
+                    from_task=None, from_agent=None, response_model=None):
+        prompt, llm_string = self._key(messages, tools, response_model)
+        hit = self.response_cache.lookup(prompt, llm_string)
+        if hit:
+            return _from_generations(hit)
+        with _stop_override(self.inner, self.stop_sequences):
+            result = await self.inner.acall(
+                messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                from_task=from_task, from_agent=from_agent, response_model=response_model,
+            )
+        self._store(prompt, llm_string, result)
+        return result
+
+    # inner har redan CrewAI:s retry-wrapper; utan markeringen skulle den läggas på två gånger
+    call._crewai_rate_limit_wrapped = True
+    acall._crewai_rate_limit_wrapped = True
+
+    def supports_function_calling(self) -> bool:
+        fn = getattr(self.inner, "supports_function_calling", None)
+        return bool(fn()) if callable(fn) else False
+
+    def supports_stop_words(self) -> bool:
+        return self.inner.supports_stop_words()
+
+    def supports_multimodal(self) -> bool:
+        return self.inner.supports_multimodal()
+
+    def get_context_window_size(self) -> int:
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
+
+
+_default_cache: LLMResponseCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMResponseCache | None:
+    """Process-wide response cache for the current LLM_CACHE_MODE (None when off)."""
+    global _default_cache
+    mode = llm_cache_mode()
+    if mode == "off":
+        return None
+    with _default_cache_lock:
+        if _default_cache is None or _default_cache.replay != (mode == "replay"):
+            max_bytes = int(os.getenv("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+            _default_cache = LLMResponseCache(max_bytes=max_bytes, replay=(mode == "replay"))
+        return _default_cache
@@ -2,12 +2,21 @@ from crewai import Crew
 from langchain_openai import OpenAI
 from dotenv import load_dotenv
 import os
-import re
-import datetime
 import warnings
 import io
 import contextlib
-import json
+import contextvars
+import logging
+import math
+import asyncio
+import functools
+import queue
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from types import SimpleNamespace
+
+import pandas as pd
 
 warnings.filterwarnings("ignore")
 
@@ -25,11 +34,19 @@ from tasks.financial_analysis_task import create_financial_analysis_task
 from tasks.reporting_task import create_chunked_reporting_tasks
 
 from tools import create_search_tool, create_financial_data_tool
-from agents.agents.report_utils import format_final_report
+from tools.ticker_index import default_index as default_ticker_index
+from llm_cache import CachedCrewLLM, get_llm_cache, llm_cache_mode
+from pipeline_metrics import PipelineMetrics, token_usage_of
+import run_log
+from source_extraction import SourceCollector, source_names
+from quarters import quarter_label
+from quarterly_store import QuarterlyStore
+from text_processing import clean_report, normalize_bullets, segment_text, split_quarterly_block
 
 load_dotenv()
 
-if not os.environ.get("OPENAI_API_KEY"):
+# replay-läge svarar enbart från LLM-cachen och behöver ingen nyckel
+if not os.environ.get("OPENAI_API_KEY") and llm_cache_mode() != "replay":
     raise RuntimeError(
         "Missing OPENAI_API_KEY. Create a .env file with OPENAI_API_KEY=your_key or set the environment variable."
     )
@@ -40,213 +57,82 @@ if not os.getenv("SERPAPI_API_KEY"):
 # ---------------------------
 # Debug logging helpers
 # ---------------------------
-DEBUG_LOG_FILE = "debug_reporting_outputs.txt"
-
-def log_debug(section_name, content):
-    """Append debug info to file with clear separators."""
+# En loggfil per körning (DEBUG_LOG_DIR/<run_id>.log), skriven i bakgrunden; se run_log.py
+def log_debug(section_name, content, level: int = logging.DEBUG):
+    """Log a debug section to the current run's log with clear separators."""
     try:
-        with open(DEBUG_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(f"\n\n=== {section_name} | {datetime.datetime.now().isoformat()} ===\n")
-            if isinstance(content, (list, tuple)):
-                for i, item in enumerate(content, 1):
-                    f.write(f"\n--- Item {i} ---\n{str(item)}\n")
-            else:
-                f.write(str(content) + "\n")
+        run_log.current_logger().log(section_name, content, level=level)
     except Exception as e:
         # Keep logging failures from breaking the app
         print(f"[LOGGING WARNING] Could not write debug log for '{section_name}': {e}")
 
-def _text_of(task) -> str:
-    out = getattr(task, "output", "")
-    return out.raw if hasattr(out, "raw") else str(out or "")
 
-def _extract_bullets(text: str, max_items: int | None = None) -> list[str]:
-    lines = []
-    for line in (text or "").splitlines():
-        l = line.strip()
-        if not l:
-            continue
-        if l.startswith(("-", "•", "*")):
-            l = "- " + l.lstrip("•*-").strip()
-            lines.append(l)
-    if not lines:
-        chunks = re.split(r"(?<=[\.\!\?])\s+", text.strip())
-        for c in chunks:
-            c = c.strip("-•* ").strip()
-            if len(c) > 8:
-                lines.append(f"- {c}")
-    if max_items is not None:
-        lines = lines[:max_items]
-    return lines
-
-def _dedupe_urls(urls: list[str]) -> list[str]:
-    cleaned = []
-    seen = set()
-    for u in urls:
-        u = (u or "").strip().strip(").,];")
-        if not u.lower().startswith(("http://", "https://")):
-            continue
-        key = u.lower()
-        if key not in seen:
-            seen.add(key)
-            cleaned.append(u)
-    return cleaned
+def _submit(pool, fn, *args):
+    """pool.submit som tar med aktuell kontext (körningens logg) till tråden."""
+    return pool.submit(contextvars.copy_context().run, fn, *args)
+
 def _text_of(task) -> str:
     out = getattr(task, "output", "")
     return out.raw if hasattr(out, "raw") else str(out or "")
 
-def _extract_bullets(text: str, max_items: int | None = None) -> list[str]:
-    lines = []
-    for line in (text or "").splitlines():
-        l = line.strip()
-        if not l:
-            continue
-        if l.startswith(("-", "•", "*")):
-            l = "- " + l.lstrip("•*-").strip()
-            lines.append(l)
-    if not lines:
-        chunks = re.split(r"(?<=[\.\!\?])\s+", text.strip())
-        for c in chunks:
-            c = c.strip("-•* ").strip()
-            if len(c) > 8:
-                lines.append(f"- {c}")
-    if max_items is not None:
-        lines = lines[:max_items]
-    return lines
-
-def _dedupe_urls(urls: list[str]) -> list[str]:
-    cleaned = []
-    seen = set()
-    for u in urls:
-        u = (u or "").strip().strip(").,];")
-        if not u.lower().startswith(("http://", "https://")):
-            continue
-        key = u.lower()
-        if key not in seen:
-            seen.add(key)
-            cleaned.append(u)
-    return cleaned
 
+class _ThreadRoutedStream(io.TextIOBase):
+    """Ersätter sys.stdout/stderr: varje tråd kan fånga sin egen output.
 
-# ---------------------------
-# Formatting cleanup helpers
-# ---------------------------
-def clean_corrupted_numbers(text: str) -> str:
-    if not isinstance(text, str):
-        return text
-    # Ta bort tusentalskomma inne i tal, men rör inte radbrytningar
-    text = re.sub(r'(?<=\d),(?=\d)', '', text)
-    # Komprimera endast space/tab, inte \n
-    text = re.sub(r'[ \t]+', ' ', text)
-    return text.strip()
-
-def normalize_md_spacing(text: str) -> str:
+    contextlib.redirect_stdout byter strömmen för hela processen, vilket blandar
+    (och kan tappa bort) output när flera crews körs parallellt i trådar.
     """
-    Normalize Markdown spacing:
-    - Remove trailing spaces per line
-    - Limit multiple blank lines to 2
-    """
-    text = re.sub(r'[ \t]+$', '', text, flags=re.MULTILINE)
-    text = re.sub(r'\n{3,}', '\n\n', text)  # max 2 linebreaks
-    return text.strip()
-
-def _strip_md_links(text: str) -> str:
-    text = re.sub(r'!\[([^\]]*)\]\([^)]+\)', r'\1', text)     # ![alt](url) -> alt
-    text = re.sub(r'\[([^\]]+)\]\(([^)]+)\)', r'\1', text)     # [label](url) -> label
-    return text
-
-def _sanitize_line(line: str) -> str:
-    line = _strip_md_links(line)
-    line = re.sub(r'^\s*#{1,6}\s*', '', line)                  # ta bort # rubriker i början av raden
-    line = re.sub(r'[*_`>]+', '', line)                        # enkel MD-städning
-    line = re.sub(r'\s+', ' ', line).strip()
-    return line
-
-def _looks_like_source(line: str) -> bool:
-    l = line.lower()
-    if l.startswith(("source:", "källa:", "link:", "url:", "published", "ref:")):
-        return True
-    if re.fullmatch(r'https?://\S+', line.strip(), flags=re.IGNORECASE):
-        return True
-    return False
-
-def _extract_bullets_strict(text: str) -> list[str]:
-    """Plocka ENDAST ut riktiga bullets/numrerade listor från texten."""
-    out = []
-    for raw in (text or "").splitlines():
-        if re.match(r'^\s*([-•*]|\d+[.)])\s+', raw):
-            out.append(raw)
-    return out
 
-def _fallback_sentence_bullets(text: str, limit: int) -> list[str]:
-    """Om inga bullets hittas: välj meningsbitar som innehåller siffror/kvartal/valuta."""
-    # grov men bra nog
-    candidates = re.split(r'(?<=[\.\!\?])\s+', text or "")
-    keep = []
-    pat = re.compile(r'(?:\bQ[1-4]\s?\d{4}\b|\b\d+(\.\d+)?%|\bSEK\b|\bUSD\b|\bEUR\b|\b\d{3,})')
-    for c in candidates:
-        c = _sanitize_line(c)
-        if len(c) < 8: 
-            continue
-        if pat.search(c) and not _looks_like_source(c):
-            keep.append(f"- {c}")
-        if len(keep) >= limit:
-            break
-    return keep
+    def __init__(self, fallback):
+        self._fallback = fallback
+        self._local = threading.local()
 
-def _normalize_bullets(lines: list[str], max_items: int) -> list[str]:
-    out, seen = [], set()
-    pending = None  # håll rubrik som slutar med ":" tills vi ser nästa rad
+    def _target(self):
+        stack = getattr(self._local, "stack", None)
+        return stack[-1] if stack else self._fallback
 
-    def _emit(text: str):
-        t = text.strip()
-        if not t or len(t) < 8:
-            return
-        if _looks_like_source(t):
-            return
-        if len(t) > 240:
-            t = t[:240].rstrip() + "…"
-        key = t.lower()
-        if key in seen:
-            return
-        seen.add(key)
-        out.append(f"- {t}")
+    def push(self, buf):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        self._local.stack.append(buf)
 
-    for raw in lines:
-        l = raw.strip()
-        l = re.sub(r'^\s*(?:[-•*]|\d+[.)])\s+', '', l)  # ta bort bullet/nummer i början
-        l = _sanitize_line(l)
-        # ta bort ensamt bindestreck i slutet
-        l = re.sub(r'\s*[-–—]\s*$', '', l)
+    def pop(self):
+        self._local.stack.pop()
 
-        if not l:
-            continue
+    def writable(self):
+        return True
 
-        if pending is not None:
-            # slå ihop pending rubrik + nuvarande rad
-            combined = f"{pending} {l}"
-            _emit(combined)
-            pending = None
-        elif l.endswith(":"):
-            # spara rubrik för att slå ihop med nästa rad
-            pending = l.rstrip(":").strip() + ":"
-        else:
-            _emit(l)
-
-        if max_items and len(out) >= max_items:
-            break
+    def write(self, s):
+        return self._target().write(s)
 
-    # om sista var rubrik utan efterföljare – emit ändå
-    if pending is not None and (not max_items or len(out) < max_items):
-        _emit(pending.rstrip(":"))
+    def flush(self):
+        self._target().flush()
 
-    return out
 
+_stream_lock = threading.Lock()
 
-def _silent_kickoff(crew, label: str):
-    """Kör crew.kickoff() tyst; loggar stdout/stderr till debugfilen."""
+
+@contextlib.contextmanager
+def _capture_thread_output():
+    """Fånga stdout/stderr för den aktuella tråden. Ger (out_buf, err_buf)."""
+    with _stream_lock:
+        for name in ("stdout", "stderr"):
+            if not isinstance(getattr(sys, name), _ThreadRoutedStream):
+                setattr(sys, name, _ThreadRoutedStream(getattr(sys, name)))
+        out_stream, err_stream = sys.stdout, sys.stderr
     buf_out, buf_err = io.StringIO(), io.StringIO()
-    with contextlib.redirect_stdout(buf_out), contextlib.redirect_stderr(buf_err):
+    out_stream.push(buf_out)
+    err_stream.push(buf_err)
+    try:
+        yield buf_out, buf_err
+    finally:
+        out_stream.pop()
+        err_stream.pop()
+
+
+def _silent_kickoff(crew, label: str):
+    """Kör crew.kickoff() tyst; loggar stdout/stderr till debugfilen (trådsäkert)."""
+    with _capture_thread_output() as (buf_out, buf_err):
         result = crew.kickoff()
     out_txt, err_txt = buf_out.getvalue().strip(), buf_err.getvalue().strip()
     if out_txt:
@@ -256,76 +142,39 @@ def _silent_kickoff(crew, label: str):
     return result
 
 def resolve_ticker(company: str) -> list[str]:
-    c = (company or "").strip().lower()
-    # Start-aliasar – fyll gärna på allt eftersom
-    aliases = {
-        "ericsson": ["ERIC", "ERIC-B.ST", "ERICB.ST", "ERIC A", "ERIC-B"],
-        "tesla": ["TSLA"],
-        "apple": ["AAPL"],
-        "microsoft": ["MSFT"],
-        "alphabet": ["GOOGL", "GOOG"],
-        "amazon": ["AMZN"],
-        "nvidia": ["NVDA"],
-        "meta": ["META"],
-        "ibm": ["IBM"],
-        "intel": ["INTC"],
-    }
-    # Greppa även “telefonaktiebolaget l m ericsson”
-    if "ericsson" in c or "telefonaktiebolaget" in c:
-        return aliases["ericsson"]
-    return aliases.get(c, [])
-
-_QUART_RE = re.compile(r"\bQ([1-4])\s*([12]\d{3})\b|\b([12]\d{3})\s*Q([1-4])\b", re.I)
-
-def _label_from_ts(x) -> str:
-    """Timestamp/str -> 'Q# YYYY'."""
-    if isinstance(x, pd.Timestamp):
-        p = pd.Period(x, freq="Q")
-        return f"Q{p.quarter} {p.year}"
-    s = str(x)
-    m = _QUART_RE.search(s)
-    if m:
-        if m.group(1) and m.group(2):
-            return f"Q{int(m.group(1))} {int(m.group(2))}"
-        if m.group(3) and m.group(4):
-            return f"Q{int(m.group(4))} {int(m.group(3))}"
-    # fall back: försök tolka datum → period
+    """Kandidat-tickers för ett bolagsnamn ur det lokala tickerindexet, bästa först."""
+    return [e.symbol for e in default_ticker_index().lookup(company)]
+
+_label_from_ts = quarter_label  # Timestamp/str -> 'Q# YYYY' (quarters.py)
+
+def _int_or_none(v):
+    """Heltal, eller None för None/NaN/icke-numeriskt (yfinance fyller luckor med NaN)."""
     try:
-        ts = pd.to_datetime(s)
-        return _label_from_ts(ts)
-    except Exception:
-        return s  # lämna oförändrad om inte tolkningsbart
-
-def _parse_quarterly_json_block(*texts: str) -> dict | None:
-    """Plocka JSON mellan markörerna om det finns."""
-    for t in texts:
-        if not t:
-            continue
-        m = re.search(
-            r"===\s*QUARTERLY DATA\s*\(returned\)\s*===\s*(\{.*?\})\s*===\s*END\s*===",
-            t,
-            flags=re.S | re.I,
-        )
-        if m:
-            try:
-                return json.loads(m.group(1))
-            except Exception:
-                pass
-    return None
+        f = float(v)
+    except (TypeError, ValueError):
+        return None
+    return int(f) if math.isfinite(f) else None
 
 def _normalize_quarterly_from_tool(obj) -> dict:
     """
     Normalisera vad 'financial_data_tool' råkar returnera till:
     {
-      'quarterly_financials': { 'Total Revenue': {'Q2 2025': 82000000000, ...}, ... }
+      'quarterly_financials': { 'Total Revenue': {'Q2 2025': 82000000000, ...}, ... },
+      'quarters': [ {'quarter': 'Q2 2025', 'revenue': ...}, ... ]   # om verktyget gav rader
     }
-    Tillåt: DataFrame, dict med Timestamp-nycklar, etc.
+    Tillåt: DataFrame, dict med Timestamp-nycklar, etc. Saknade värden (None/NaN) hoppas över.
     """
     out = {"quarterly_financials": {}}
     if obj is None:
         return out
-    # yfinance-liknande: df i obj.get('quarterly_financials') eller direkt df
-    qf = obj.get("quarterly_financials") if isinstance(obj, dict) else obj
+    if isinstance(obj, dict) and isinstance(obj.get("quarters"), list):
+        out["quarters"] = obj["quarters"]
+    # yfinance-liknande: df i obj.get('quarterly_financials') eller direkt df;
+    # verktygets redan normaliserade serier föredras
+    if isinstance(obj, dict):
+        qf = obj.get("quarterly_financials_norm") or obj.get("quarterly_financials")
+    else:
+        qf = obj
     if qf is None or (hasattr(qf, "empty") and getattr(qf, "empty")):
         return out
 
@@ -338,8 +187,8 @@ def _normalize_quarterly_from_tool(obj) -> dict:
             if m in qf.index:
                 series = qf.loc[m].to_dict()
                 out["quarterly_financials"][m] = {
-                    lbl: int(series[dt]) for lbl, dt in zip(labels, cols)
-                    if pd.notna(series[dt])
+                    lbl: v for lbl, v in ((lbl, _int_or_none(series[dt])) for lbl, dt in zip(labels, cols))
+                    if v is not None
                 }
         return out
 
@@ -352,7 +201,10 @@ def _normalize_quarterly_from_tool(obj) -> dict:
             norm = {}
             for metric, series in qf.items():
                 if isinstance(series, dict):
-                    norm[metric] = { _label_from_ts(k): int(v) for k, v in series.items() if v is not None }
+                    norm[metric] = {
+                        _label_from_ts(k): v for k, v in ((k, _int_or_none(v)) for k, v in series.items())
+                        if v is not None
+                    }
             out["quarterly_financials"] = norm
             return out
         # 2) Annars: {quarter: {metric: value}}
@@ -361,9 +213,10 @@ def _normalize_quarterly_from_tool(obj) -> dict:
             lbl = _label_from_ts(qlabel)
             if isinstance(md, dict):
                 for metric, val in md.items():
-                    if val is None: 
+                    val = _int_or_none(val)
+                    if val is None:
                         continue
-                    acc.setdefault(metric, {})[lbl] = int(val)
+                    acc.setdefault(metric, {})[lbl] = val
         out["quarterly_financials"] = acc
         return out
 
@@ -373,266 +226,825 @@ def _normalize_quarterly_from_tool(obj) -> dict:
 def _merge_quarterly_payloads(tool_norm: dict, block_obj: dict | None) -> dict:
     """
     Slår ihop:
-      - tool_norm: {'quarterly_financials': {...}}
-      - block_obj: kan innehålla 'quarterly_financials' och/eller 'quarters' list[dict]
-    Returnerar en payload som UI:t gillar.
+      - tool_norm: {'quarterly_financials': {...}, 'quarters': [...]} från _normalize_quarterly_from_tool
+      - block_obj: JSON-block ur en LLM-text (reserv); kan innehålla 'quarterly_financials' och/eller 'quarters'
+    Returnerar en payload som UI:t gillar. Vid krock vinner verktygets exakta värde;
+    blocket fyller bara luckor.
     """
     result = {"quarterly_financials": {}, "quarters": []}
 
-    # 1) från tool
+    # serierna slås ihop i en kolumnlagring (quarterly_store.py); verktyget läggs sist → vinner
+    store = QuarterlyStore()
+    if block_obj and isinstance(block_obj.get("quarterly_financials"), dict):
+        store.add_payload("_", {"quarterly_financials": block_obj["quarterly_financials"]})
     if tool_norm and tool_norm.get("quarterly_financials"):
-        result["quarterly_financials"] = tool_norm["quarterly_financials"]
-
-    # 2) från block
-    if block_obj:
-        # a) quarters-lista (redan radformat)
-        if isinstance(block_obj.get("quarters"), list):
-            result["quarters"] = block_obj["quarters"]
-        # b) quarterly_financials från blocket → merge
-        if isinstance(block_obj.get("quarterly_financials"), dict):
-            for metric, series in block_obj["quarterly_financials"].items():
-                result["quarterly_financials"].setdefault(metric, {}).update(series)
-
-        # c) källor (om du vill föra upp dem)
-        # (lämnas till din befintliga sources-logic)
+        store.add_payload("_", {"quarterly_financials": tool_norm["quarterly_financials"]})
+    result["quarterly_financials"] = store.to_payload("_")["quarterly_financials"]
+    if store.skipped("_"):
+        # t.ex. "FY 2024" eller "n/a": följer med oförändrade, men syns i loggen
+        log_debug("QUARTERLY DATA (kept as given: not a quarter or not a number)", store.skipped("_"))
+
+    # quarters-lista (redan radformat): verktygets rader, annars blockets
+    for src in (tool_norm, block_obj):
+        if src and isinstance(src.get("quarters"), list) and src["quarters"]:
+            result["quarters"] = src["quarters"]
+            break
     return result
 
-def _extract_quarterly_json_block(*texts: str) -> dict | None:
-    """Hittar JSON mellan '=== QUARTERLY DATA (returned) ===' och '=== END ==='."""
-    pat = re.compile(
-        r"===\s*QUARTERLY DATA\s*\(returned\)\s*===\s*(\{.*?\})\s*===\s*END\s*===",
-        re.S | re.I,
-    )
-    for t in texts:
-        if not t:
-            continue
-        m = pat.search(t)
-        if m:
-            try:
-                return json.loads(m.group(1))
-            except Exception:
-                pass
-    return None
+def _quarterly_from_tool(tool_raw) -> dict | None:
+    """Kvartalsdata direkt ur financial_data-resultatet – exakta heltal, ingen tur via LLM:en."""
+    if not isinstance(tool_raw, dict) or tool_raw.get("error"):
+        return None
+    payload = _merge_quarterly_payloads(_normalize_quarterly_from_tool(tool_raw), None)
+    return payload if payload["quarterly_financials"] or payload["quarters"] else None
 
 # ---------------------------
 # Main pipeline
 # ---------------------------
-def run_company_analysis(company_name: str):
-    """
-    Run a comprehensive company analysis using CrewAI agents.
-    Returns: (report_text, sources, quarterly_data)
+def create_shared_resources():
+    """Build the LLM client and tool instances that can be reused across analyses."""
+    llm_cache = get_llm_cache()
+    llm_kwargs = {}
+    if llm_cache_mode() == "replay" and not os.environ.get("OPENAI_API_KEY"):
+        llm_kwargs["api_key"] = "replay-only"  # anropas aldrig; missar ger LLMCacheMiss
+    llm = OpenAI(
+        temperature=0.7,
+        model="gpt-4o-mini",
+        **llm_kwargs
+    )
+    if llm_cache is not None:
+        # CrewAI bygger om LangChain-klienten och tappar cache=, så cachen sitter på CrewAI-LLM:en
+        llm = CachedCrewLLM.wrap(llm, llm_cache)
+    log_debug("LLM CONFIG", {
+        "temperature": 0.7,
+        "model": "gpt-4o-mini",
+        "cache": llm_cache_mode(),
+        "cache_path": getattr(llm_cache, "path", None),
+    })
+
+    search_tool = create_search_tool(os.getenv("SERPAPI_API_KEY"))
+    financial_data_tool = create_financial_data_tool()
+    return llm, search_tool, financial_data_tool
+
+
+class _AnalysisRun:
+    """State för en analys medan den går genom pipelinens steg (delas av sync/async)."""
+
+    def __init__(self, company_name: str, llm, search_tool, financial_data_tool, metrics: PipelineMetrics):
+        self.company_name = company_name
+        self.metrics = metrics
+        self.llm = llm
+        self.search_tool = search_tool
+        self.financial_data_tool = financial_data_tool
+        self.parallel_research = False
+        self.research_tasks: list = []
+        self.financial_analysis_agent = None
+        self.report_agent = None
+        self.financial_research_agent = None
+        self.stage_crews: dict = {}      # en crew per research-steg (web_search, financial_research)
+        self.analysis_crew = None
+        self.tool_data = None            # financial_data hämtad direkt, en gång per analys
+        self.quarterly_data = None       # kvartalsdata ur tool_data (exakta heltal, går aldrig via LLM:en)
+        self.reporting_crew = None
+        self.concurrent_reporting = False
+        self.section_crews: list = []    # samtidigt läge: en crew per rapportsektion
+        self.sources: list[str] = []
+        self.source_provenance: dict[str, list[str]] = {}  # url → tasks som citerade den
+        self.task_sources: dict[str, SourceCollector] = {}  # research-task → källor, matas när tasken är klar
+        self.texts: dict[str, str] = {}
+        self.key_insights_bullets: list[str] = []
+        self.financial_highlights_bullets: list[str] = []
+        self.on_event = None             # (event, payload) → None, se stream_company_analysis
+
+    @property
+    def timings(self) -> dict[str, float]:
+        return self.metrics.durations()
+
+    def emit(self, event: str, payload) -> None:
+        if self.on_event is not None:
+            self.on_event(event, payload)
+
+
+def _call_financial_data_tool(financial_data_tool, company_name: str):
+    if hasattr(financial_data_tool, "run"):
+        return financial_data_tool.run(company_name)
+    if callable(financial_data_tool):
+        return financial_data_tool(company_name)
+    if isinstance(financial_data_tool, dict) and callable(financial_data_tool.get("function")):
+        return financial_data_tool["function"](company_name)
+    raise TypeError("Unsupported financial_data_tool type")
+
+
+def _prepare_research(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+    on_event=None,
+) -> _AnalysisRun:
+    """Steg 1: verktyg, agenter och web search-tasken med sin crew.
+
+    Varje research-steg körs som en egen crew. Tasks som läser tidigare output
+    skapas först när den outputen finns (_prepare_financial_research,
+    _prepare_analysis), så att den komprimerade kontexten bygger på riktig text.
+    I parallellt läge beror financial research inte på web search; de körs
+    samtidigt som financial_data hämtas direkt.
     """
-    try:
-        # Clear old logs & start
-        open(DEBUG_LOG_FILE, "w", encoding="utf-8").close()
-        log_debug("START ANALYSIS", f"Company: {company_name}")
-
-        # Initialize LLM
-        llm = OpenAI(
-            temperature=0.7,
-            model="gpt-4o-mini"
-        )
-        log_debug("LLM CONFIG", {"temperature": 0.7, "model": "gpt-4o-mini"})
-
-        # Create tools
-        search_tool = create_search_tool(os.getenv("SERPAPI_API_KEY"))
-        financial_data_tool = create_financial_data_tool()
-        log_debug("TOOLS CREATED", {
-            "search_tool": str(type(search_tool)),
-            "financial_data_tool": str(type(financial_data_tool))
-        })
-
-        # Create agents
+    log_debug("START ANALYSIS", f"Company: {company_name}")
+    if metrics is None:
+        metrics = PipelineMetrics(company_name, run_id=run_log.current_run_id())
+    else:
+        metrics.company_name = metrics.company_name or company_name
+        metrics.run_id = metrics.run_id or run_log.current_run_id()
+
+    with metrics.span("tool_creation"):
+        # LLM + verktyg kan delas mellan flera analyser (batch)
+        if llm is None or search_tool is None or financial_data_tool is None:
+            shared = create_shared_resources()
+            llm = llm or shared[0]
+            search_tool = search_tool or shared[1]
+            financial_data_tool = financial_data_tool or shared[2]
+        # tidtagning per verktygsanrop (kopior, så delade instanser lämnas orörda)
+        search_tool = metrics.wrap_tool(search_tool)
+        financial_data_tool = metrics.wrap_tool(financial_data_tool)
+    log_debug("TOOLS CREATED", {
+        "search_tool": str(type(search_tool)),
+        "financial_data_tool": str(type(financial_data_tool))
+    })
+    run = _AnalysisRun(company_name, llm, search_tool, financial_data_tool, metrics)
+    run.parallel_research = parallel_research
+    run.concurrent_reporting = concurrent_reporting
+    run.on_event = on_event
+
+    # Create agents
+    with metrics.span("agent_creation"):
         web_search_agent = create_web_search_agent(llm, tools=[search_tool])
-        financial_research_agent = create_financial_research_agent(llm, tools=[financial_data_tool, search_tool])
+        # parallellt läge: financial_data hämtas vid sidan av research, agenten ska inte hämta den igen
+        research_tools = [search_tool] if parallel_research else [financial_data_tool, search_tool]
+        financial_research_agent = create_financial_research_agent(llm, tools=research_tools)
         financial_analysis_agent = create_financial_analysis_agent(llm, tools=[financial_data_tool, search_tool])
         report_agent = create_report_agent(llm)
-        log_debug("AGENTS CREATED", [
-            getattr(web_search_agent, "role", "web_search_agent"),
-            getattr(financial_research_agent, "role", "financial_research_agent"),
-            getattr(financial_analysis_agent, "role", "financial_analysis_agent"),
-            getattr(report_agent, "role", "report_agent"),
-        ])
-
-        # Create research tasks
-        web_search_task = create_web_search_task(web_search_agent, company_name)
-        financial_research_task = create_financial_research_task(
-            financial_research_agent,
-            company_name,
-            dependencies=[web_search_task]
-        )
-        financial_analysis_task = create_financial_analysis_task(
-            financial_analysis_agent,
-            company_name,
-            dependencies=[web_search_task, financial_research_task]
-        )
-        log_debug("RESEARCH TASKS CREATED", [
-            getattr(web_search_task, "description", "web_search_task"),
-            getattr(financial_research_task, "description", "financial_research_task"),
-            getattr(financial_analysis_task, "description", "financial_analysis_task"),
-        ])
-
-        # Run research crew
-        research_crew = Crew(
-            agents=[
-                web_search_agent,
-                financial_research_agent,
-                financial_analysis_agent
-            ],
-            tasks=[
-                web_search_task,
-                financial_research_task,
-                financial_analysis_task
-            ],
-            verbose=True
-        )
-        research_result = _silent_kickoff(research_crew, "RESEARCH CREW")
-        log_debug("RESEARCH CREW RAW OUTPUTS", [
-            t.raw if hasattr(t, "raw") else str(t) for t in getattr(research_result, "tasks_output", [])
-        ])
-
-        # Collect research sources
-        sources = []
-        for task in [web_search_task, financial_research_task, financial_analysis_task]:
-            txt = _text_of(task)
-            if txt:
-                sources.extend(re.findall(r'https?://[^\s\)\]]+', txt))
-        sources = _dedupe_urls(sources)
-        log_debug("COLLECTED SOURCES (strict dedupe)", sources)
-
-        web_text = _text_of(web_search_task)
-        finres_text = _text_of(financial_research_task)
-        finanal_text = _text_of(financial_analysis_task)
-
-        raw_insights = _extract_bullets_strict(web_text + "\n" + finres_text)
-        raw_highlights = _extract_bullets_strict(finanal_text)
-
-        key_insights_bullets = _normalize_bullets(raw_insights, max_items=4)
-        if not key_insights_bullets:
-            key_insights_bullets = _fallback_sentence_bullets(web_text + "\n" + finres_text, limit=4)
+    log_debug("AGENTS CREATED", [
+        getattr(web_search_agent, "role", "web_search_agent"),
+        getattr(financial_research_agent, "role", "financial_research_agent"),
+        getattr(financial_analysis_agent, "role", "financial_analysis_agent"),
+        getattr(report_agent, "role", "report_agent"),
+    ])
+
+    # Sekventiellt läge: hämta financial_data en gång direkt så att siffrorna kan bifogas
+    # research- och analys-tasken; agenterna skriver bara text. (Parallellt läge hämtar
+    # samtidigt som web search/research körs, se _parallel_research_jobs.)
+    if not parallel_research:
+        _capture_tool_data(run, _timed(
+            metrics, "financial_data_fetch", _fetch_financial_data_safe, financial_data_tool, company_name
+        ))
+
+    # Create research tasks
+    web_search_task = create_web_search_task(web_search_agent, company_name)
+    log_debug("WEB SEARCH TASK CREATED", getattr(web_search_task, "description", "web_search_task"))
+    run.financial_research_agent = financial_research_agent
+    run.financial_analysis_agent = financial_analysis_agent
+    run.report_agent = report_agent
+    run.research_tasks = [web_search_task]
+    _collect_sources_on_finish(run, web_search_task, "web_search")
+    run.stage_crews = {"web_search": Crew(agents=[web_search_agent], tasks=[web_search_task], verbose=True)}
+    if parallel_research:
+        _prepare_financial_research(run)  # beror inte på web search, kan skapas direkt
+    return run
+
+
+# Grenar som körs samtidigt i parallellt läge (innan analysen)
+PARALLEL_RESEARCH_STAGES = ("web_search", "financial_research", "financial_data_fetch")
+
+
+def _timed(metrics: PipelineMetrics, label: str, fn, *args):
+    """Kör fn(*args) som ett span; crew-resultat får med sina LLM-tokens."""
+    with metrics.span(label) as attrs:
+        result = fn(*args)
+        attrs.update(token_usage_of(result))
+    return result
 
-        financial_highlights_bullets = _normalize_bullets(raw_highlights, max_items=6)
-        if not financial_highlights_bullets:
-            financial_highlights_bullets = _fallback_sentence_bullets(finanal_text, limit=6)
+
+def _fetch_financial_data_safe(financial_data_tool, company_name: str):
+    try:
+        return _call_financial_data_tool(financial_data_tool, company_name)
+    except Exception as e:
+        return {"error": f"Failed to fetch financial data: {e}"}
+
+
+def _capture_tool_data(run: _AnalysisRun, tool_raw) -> None:
+    """Spara verktygsresultatet och kvartalsdatan ur det (en gång per analys)."""
+    run.tool_data = tool_raw if isinstance(tool_raw, dict) and not tool_raw.get("error") else None
+    run.quarterly_data = _quarterly_from_tool(run.tool_data)
+    log_debug("QUARTERLY DATA (from tool)", {
+        "series_keys": list(run.quarterly_data["quarterly_financials"]) if run.quarterly_data else [],
+        "rows": len(run.quarterly_data["quarters"]) if run.quarterly_data else 0,
+        "error": tool_raw.get("error") if isinstance(tool_raw, dict) else None,
+    })
+    if run.quarterly_data:
+        run.emit("quarterly_data", run.quarterly_data)
+
+
+def _fetch_and_capture(run: _AnalysisRun):
+    """Parallellt läge: hämta financial_data och spara kvartalsdatan så fort den finns."""
+    tool_raw = _fetch_financial_data_safe(run.financial_data_tool, run.company_name)
+    _capture_tool_data(run, tool_raw)
+    return tool_raw
+
+
+def _parallel_research_jobs(run: _AnalysisRun) -> dict:
+    """label → (fn, args) för grenarna som inte beror på varandra."""
+    jobs = {
+        label: (_silent_kickoff, (crew, f"{label.upper()} CREW"))
+        for label, crew in run.stage_crews.items()
+    }
+    jobs["financial_data_fetch"] = (_fetch_and_capture, (run,))
+    return jobs
+
+
+def _prepare_financial_research(run: _AnalysisRun) -> None:
+    """Research-tasken; i sekventiellt läge först när web search är klar (dess output blir kontext)."""
+    dependencies = [] if run.parallel_research else list(run.research_tasks)
+    financial_research_task = create_financial_research_task(
+        run.financial_research_agent,
+        run.company_name,
+        dependencies=dependencies,
+        quarterly_data=run.quarterly_data,
+        data_fetched_separately=run.parallel_research,
+    )
+    log_debug("FINANCIAL RESEARCH TASK CREATED", getattr(financial_research_task, "description", "financial_research_task"))
+    run.research_tasks.append(financial_research_task)
+    _collect_sources_on_finish(run, financial_research_task, "financial_research")
+    run.stage_crews["financial_research"] = Crew(
+        agents=[run.financial_research_agent], tasks=[financial_research_task], verbose=True
+    )
 
 
-        reporting_tasks = create_chunked_reporting_tasks(
-            agent=report_agent,
-            company_name=company_name,
-            dependencies=[web_search_task, financial_research_task, financial_analysis_task],
-            sources=sources
-        )
+def _prepare_analysis(run: _AnalysisRun) -> None:
+    """Analys-tasken, när web search + research är klara (kvartalsdatan finns redan)."""
+    web_search_task, financial_research_task = run.research_tasks
+    financial_analysis_task = create_financial_analysis_task(
+        run.financial_analysis_agent,
+        run.company_name,
+        dependencies=[web_search_task, financial_research_task],
+        quarterly_data=run.quarterly_data,
+    )
+    log_debug("FINANCIAL ANALYSIS TASK CREATED", getattr(financial_analysis_task, "description", "financial_analysis_task"))
+    run.research_tasks.append(financial_analysis_task)
+    _collect_sources_on_finish(run, financial_analysis_task, "financial_analysis")
+    run.analysis_crew = Crew(agents=[run.financial_analysis_agent], tasks=[financial_analysis_task], verbose=True)
+
+
+def _collect_sources_on_finish(run: _AnalysisRun, task, label: str) -> None:
+    """Skanna taskens output efter källor så fort den är klar (crewai anropar task.callback)."""
+    def _done(output):
+        collector = SourceCollector()
+        collector.collect(output.raw if hasattr(output, "raw") else str(output), task=label)
+        run.task_sources[label] = collector
+
+    task.callback = _done
+
+
+def _merge_crew_results(*results):
+    outs = []
+    for r in results:
+        outs.extend(getattr(r, "tasks_output", None) or [])
+    return SimpleNamespace(tasks_output=outs)
+
+
+def _log_research_timings(run: _AnalysisRun) -> None:
+    t = run.timings
+    if not run.parallel_research:
+        stages = ("financial_data_fetch", "web_search", "financial_research", "financial_analysis")
+        log_debug("RESEARCH TIMINGS", {**{k: t.get(k) for k in stages}, "total": round(sum(t.get(k, 0.0) for k in stages), 3)})
+        return
+    branches = max(t.get(k, 0.0) for k in PARALLEL_RESEARCH_STAGES)
+    critical_path = round(branches + t.get("financial_analysis", 0.0), 3)
+    sequential = round(sum(t.get(k, 0.0) for k in ("web_search", "financial_research", "financial_analysis")), 3)
+    log_debug("RESEARCH TIMINGS", {
+        **{k: t.get(k, 0.0) for k in PARALLEL_RESEARCH_STAGES + ("financial_analysis",)},
+        "critical_path": critical_path,
+        "sequential_equivalent": sequential,
+        "saved": round(sequential - critical_path, 3),
+    })
+
+
+def _run_research_sequential(run: _AnalysisRun):
+    """Ett steg i taget; nästa task skapas när föregående har output att komprimera."""
+    web = _timed(run.metrics, "web_search", _silent_kickoff, run.stage_crews["web_search"], "WEB_SEARCH CREW")
+    _prepare_financial_research(run)
+    research = _timed(
+        run.metrics, "financial_research", _silent_kickoff, run.stage_crews["financial_research"], "FINANCIAL_RESEARCH CREW"
+    )
+    _prepare_analysis(run)
+    analysis = _timed(run.metrics, "financial_analysis", _silent_kickoff, run.analysis_crew, "ANALYSIS CREW")
+    _log_research_timings(run)
+    return _merge_crew_results(web, research, analysis)
+
+
+def _run_research(run: _AnalysisRun):
+    """Kör research-steget (sekventiellt eller parallellt). Returnerar crew-resultat."""
+    if not run.parallel_research:
+        return _run_research_sequential(run)
+
+    jobs = _parallel_research_jobs(run)
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="research") as pool:
+        futures = {label: _submit(pool, _timed, run.metrics, label, fn, *args) for label, (fn, args) in jobs.items()}
+        results = {label: fut.result() for label, fut in futures.items()}
+    _prepare_analysis(run)
+    analysis = _timed(run.metrics, "financial_analysis", _silent_kickoff, run.analysis_crew, "ANALYSIS CREW")
+    _log_research_timings(run)
+    return _merge_crew_results(results["web_search"], results["financial_research"], analysis)
+
+
+def _collect_research(run: _AnalysisRun, research_result) -> None:
+    """Steg 2: källor + bullets ur research-outputen, bygg rapport-crew."""
+    company_name = run.company_name
+    web_search_task, financial_research_task, financial_analysis_task = run.research_tasks
+    report_agent = run.report_agent
+    log_debug("RESEARCH CREW RAW OUTPUTS", [
+        t.raw if hasattr(t, "raw") else str(t) for t in getattr(research_result, "tasks_output", [])
+    ])
+
+    # Collect research sources
+    with run.metrics.span("source_collection") as attrs:
+        # varje tasks URL:er är redan utplockade i dess callback; slå ihop i task-ordning (deterministiskt)
+        collector = SourceCollector()
+        for label, task in zip(("web_search", "financial_research", "financial_analysis"), run.research_tasks):
+            fed = run.task_sources.get(label)
+            if fed is None:  # callbacken kördes inte (t.ex. ersatt task)
+                fed = SourceCollector()
+                fed.collect(_text_of(task), task=label)
+            new_urls = [u for u in fed.urls if collector.add(u, task=label)]
+            attrs[f"sources:{label}"] = len(new_urls)
+        sources = collector.urls
+        run.source_provenance = collector.provenance
+        attrs["sources"] = len(sources)
+    log_debug("COLLECTED SOURCES (canonical dedupe)", collector.provenance)
+
+    web_text = _text_of(web_search_task)
+    finres_text = _text_of(financial_research_task)
+    finanal_text = _text_of(financial_analysis_task)
+
+    with run.metrics.span("bullet_extraction") as attrs:
+        # ett pass per text: bullets + meningar med siffror (fallback) på en gång
+        research_seg = segment_text(web_text + "\n" + finres_text)
+        analysis_seg = segment_text(finanal_text)
+
+        key_insights_bullets = normalize_bullets(research_seg.bullets, max_items=4)
+        if not key_insights_bullets:
+            key_insights_bullets = [f"- {c}" for c in research_seg.facts[:4]]
 
-        # Run reporting crew
-        reporting_crew = Crew(
+        financial_highlights_bullets = normalize_bullets(analysis_seg.bullets, max_items=6)
+        if not financial_highlights_bullets:
+            financial_highlights_bullets = [f"- {c}" for c in analysis_seg.facts[:6]]
+        attrs["bullets"] = len(key_insights_bullets) + len(financial_highlights_bullets)
+
+
+    run.sources = sources
+    run.texts = {"web": web_text, "research": finres_text, "analysis": finanal_text}
+    run.key_insights_bullets = key_insights_bullets
+    run.financial_highlights_bullets = financial_highlights_bullets
+    # de deterministiska sektionerna är klara redan här – långt före rapportagenten
+    run.emit("sources", sources)
+    for name, (bullets, end_marker) in _bullet_sections(run).items():
+        if bullets:
+            run.emit(name, _bullet_section(name, bullets, end_marker))
+
+    reporting_tasks = create_chunked_reporting_tasks(
+        agent=report_agent,
+        company_name=company_name,
+        dependencies=[web_search_task, financial_research_task, financial_analysis_task],
+        sources=sources
+    )
+
+    if run.concurrent_reporting:
+        # En crew per sektion; varje crew får en egen agent eftersom en Agent
+        # inte kan köra två tasks samtidigt.
+        run.section_crews = []
+        for i, section in enumerate(REPORT_SECTIONS):
+            agent = report_agent if i == 0 else create_report_agent(run.llm)
+            task = reporting_tasks[i] if i == 0 else create_chunked_reporting_tasks(
+                agent=agent,
+                company_name=company_name,
+                dependencies=[web_search_task, financial_research_task, financial_analysis_task],
+                sources=sources
+            )[i]
+            _stream_section(run, task, section)
+            run.section_crews.append(Crew(agents=[agent], tasks=[task], verbose=True))
+    else:
+        for section, task in zip(REPORT_SECTIONS, reporting_tasks):
+            _stream_section(run, task, section)
+        # Reporting crew
+        run.reporting_crew = Crew(
             agents=[report_agent],
             tasks=reporting_tasks,
             verbose=True
         )
-        reporting_result = _silent_kickoff(reporting_crew, "REPORTING CREW")
-        raw_reporting_outputs = [t.raw if hasattr(t, "raw") else str(t) for t in getattr(reporting_result, "tasks_output", [])]
-        log_debug("REPORTING CREW RAW OUTPUTS", raw_reporting_outputs)
-
-        # Samla bara Exec Summary & Recommendations från rapportagenten
-        section_outputs = {"Executive Summary": "", "Recommendations": ""}
-        for result in reporting_result.tasks_output:
-            output_text = result.raw if hasattr(result, "raw") else str(result)
-            if "--- End of Executive Summary ---" in output_text:
-                section_outputs["Executive Summary"] = output_text
-            elif "--- End of Recommendations ---" in output_text:
-                section_outputs["Recommendations"] = output_text
-
-        # Bygg slutrapporten med deterministiska sektioner
-        parts = []
-        if section_outputs["Executive Summary"]:
-            parts.append(section_outputs["Executive Summary"].strip())
-
-        if key_insights_bullets:
-            parts.append(
-            "Key Research Insights\n"
-            + "\n".join(key_insights_bullets)
-            + "\n\n--- End of Key Research Insights ---"
-        )
 
-        if financial_highlights_bullets:
-            parts.append(
-            "Financial Analysis Highlights\n"
-            + "\n".join(financial_highlights_bullets)
-            + "\n\n--- End of Financial Analysis ---"
-        )
 
-        if section_outputs["Recommendations"]:
-            parts.append(section_outputs["Recommendations"].strip())
+# Rapportagentens sektioner, i samma ordning som create_chunked_reporting_tasks
+REPORT_SECTIONS = {
+    "Executive Summary": "--- End of Executive Summary ---",
+    "Recommendations": "--- End of Recommendations ---",
+}
 
-        if sources:
-            parts.append("Sources\n" + "\n".join(f"- {u}" for u in sources) + "\n\n--- End of Report ---")
 
-        final_report_raw = "\n\n".join(parts)
-        final_report = normalize_md_spacing(clean_corrupted_numbers(final_report_raw))
-        log_debug("FINAL REPORT (raw)", final_report_raw)
-        log_debug("FINAL REPORT (cleaned)", final_report)
+def _section_of(position_name: str, output_text: str) -> tuple[str, str] | None:
+    """(sektion, text) för en rapport-output, eller None om den är tom.
 
-        # === Quarterly data: först försök hämta från analysens JSON‑block ===
-        block_obj = _extract_quarterly_json_block(
-            finres_text,
-            finanal_text,
-            final_report  # om du senare väljer att inkludera blocket i rapporten
+    Slutmarkören avgör sektionen; saknas den används positionen (t1, t2) och
+    markören läggs till så att rapporten alltid har sina markörer.
+    """
+    name = next((n for n, marker in REPORT_SECTIONS.items() if marker in output_text), None)
+    if name is None:
+        if not output_text.strip():
+            return None
+        name = position_name
+        output_text = output_text.rstrip() + "\n\n" + REPORT_SECTIONS[name]
+    return name, output_text
+
+
+def _section_outputs(outputs: list[str]) -> dict:
+    """Mappa rapport-outputs till sektioner (se _section_of)."""
+    section_outputs = {name: "" for name in REPORT_SECTIONS}
+    for position_name, output_text in zip(REPORT_SECTIONS, outputs):
+        found = _section_of(position_name, output_text)
+        if found:
+            section_outputs[found[0]] = found[1]
+    return section_outputs
+
+
+def _stream_section(run: _AnalysisRun, task, position_name: str) -> None:
+    """Skicka sektionen som händelse så fort dess task är klar (crewai anropar task.callback)."""
+    if run.on_event is None:
+        return
+
+    def _done(output):
+        found = _section_of(position_name, output.raw if hasattr(output, "raw") else str(output))
+        if found:
+            run.emit(*found)
+
+    task.callback = _done
+
+
+def _bullet_sections(run: _AnalysisRun) -> dict:
+    """Sektionerna som byggs deterministiskt ur research-bullets: namn → (bullets, slutmarkör)."""
+    return {
+        "Key Research Insights": (run.key_insights_bullets, "--- End of Key Research Insights ---"),
+        "Financial Analysis Highlights": (run.financial_highlights_bullets, "--- End of Financial Analysis ---"),
+    }
+
+
+def _bullet_section(name: str, bullets: list[str], end_marker: str) -> str:
+    return f"{name}\n" + "\n".join(bullets) + f"\n\n{end_marker}"
+
+
+def _run_reporting(run: _AnalysisRun):
+    """Kör rapportsteget. Samtidigt läge: en crew per sektion, resultat i fast ordning."""
+    if not run.concurrent_reporting:
+        return _timed(run.metrics, "reporting_crew", _silent_kickoff, run.reporting_crew, "REPORTING CREW")
+    with ThreadPoolExecutor(max_workers=len(run.section_crews), thread_name_prefix="reporting") as pool:
+        futures = [
+            _submit(pool, _timed, run.metrics, f"reporting: {name}", _silent_kickoff, crew, f"REPORTING CREW ({name})")
+            for name, crew in zip(REPORT_SECTIONS, run.section_crews)
+        ]
+        results = [fut.result() for fut in futures]
+    log_debug("REPORTING TIMINGS", {k: v for k, v in run.timings.items() if k.startswith("reporting")})
+    return _merge_crew_results(*results)
+
+
+def _finish_report(run: _AnalysisRun, reporting_result):
+    """Steg 3: sätt ihop slutrapporten och kvartalsdata. Returnerar (report, sources, quarterly_data)."""
+    sources = run.sources
+    finres_text, finanal_text = run.texts["research"], run.texts["analysis"]
+    raw_reporting_outputs = [t.raw if hasattr(t, "raw") else str(t) for t in getattr(reporting_result, "tasks_output", [])]
+    log_debug("REPORTING CREW RAW OUTPUTS", raw_reporting_outputs)
+
+    # Samla bara Exec Summary & Recommendations från rapportagenten
+    section_outputs = _section_outputs(raw_reporting_outputs)
+
+    # Bygg slutrapporten med deterministiska sektioner
+    parts = []
+    if section_outputs["Executive Summary"]:
+        parts.append(section_outputs["Executive Summary"].strip())
+
+    for name, (bullets, end_marker) in _bullet_sections(run).items():
+        if bullets:
+            parts.append(_bullet_section(name, bullets, end_marker))
+
+    if section_outputs["Recommendations"]:
+        parts.append(section_outputs["Recommendations"].strip())
+
+    if sources:
+        parts.append("Sources\n" + "\n".join(f"- {u}" for u in sources) + "\n\n--- End of Report ---")
+
+    final_report_raw = "\n\n".join(parts)
+    final_report = clean_report(final_report_raw)
+    log_debug("FINAL REPORT (raw)", final_report_raw)
+    log_debug("FINAL REPORT (cleaned)", final_report)
+
+    # === Quarterly data: direkt från verktyget (hämtat en gång i research-steget) ===
+    # JSON-block i agenttexterna används bara om verktyget inte gav något, och fyller då luckor.
+    with run.metrics.span("quarterly_extraction") as attrs:
+        quarterly_data = run.quarterly_data
+        attrs["source"] = "tool" if quarterly_data else None
+        if quarterly_data is None:
+            block_obj = next(
+                (p for p in (split_quarterly_block(t)[0] for t in (finres_text, finanal_text, final_report)) if p),
+                None,
+            )
+            if block_obj:
+                quarterly_data = _merge_quarterly_payloads({}, block_obj)
+                attrs["source"] = "json_block"
+                run.emit("quarterly_data", quarterly_data)
+                log_debug("QUARTERLY DATA (from JSON block)", {
+                    "series_keys": list(quarterly_data["quarterly_financials"].keys()),
+                    "rows": len(quarterly_data["quarters"]),
+                })
+
+    log_debug("QUARTERLY DATA (returned)", quarterly_data if quarterly_data is not None else "No data")
+    log_debug("PIPELINE METRICS", run.metrics.summary())
+
+    return final_report, sources, quarterly_data
+
+
+def _analyze_company(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+    on_event=None,
+):
+    """Pipeline body for one company. Raises on failure; see run_company_analysis."""
+    run = _prepare_research(
+        company_name, llm, search_tool, financial_data_tool, parallel_research, concurrent_reporting, metrics, on_event
+    )
+    research_result = _run_research(run)
+    _collect_research(run, research_result)
+    reporting_result = _run_reporting(run)
+    return _finish_report(run, reporting_result)
+
+
+def _analyze_company_logged(run_id, company_name: str, *args):
+    """_analyze_company with its own run log (run_log.bind); fatal errors are logged there."""
+    with run_log.bind(run_id, company_name):
+        try:
+            return _analyze_company(company_name, *args)
+        except Exception as e:
+            log_debug("FATAL ERROR", str(e), level=logging.ERROR)
+            raise
+
+
+def run_company_analysis(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+    run_id: str | None = None,
+):
+    """
+    Run a comprehensive company analysis using CrewAI agents.
+    Pass `llm`/`search_tool`/`financial_data_tool` to reuse instances across runs.
+    With `parallel_research=True` the web search, the financial research and the
+    structured financial_data fetch start at once; only the analysis waits for them.
+    With `concurrent_reporting=True` the Executive Summary and Recommendations are
+    written at the same time by separate single-task crews.
+    Pass a `PipelineMetrics` as `metrics` to get per-stage spans (durations, LLM
+    tokens, tool calls) for the run.
+    Debug output goes to the run's own log file; pass `run_id` (run_log.new_run_id)
+    to read it afterwards with run_log.tail_run_log.
+    Returns: (report_text, sources, quarterly_data)
+    """
+    try:
+        return _analyze_company_logged(
+            run_id, company_name, llm, search_tool, financial_data_tool, parallel_research, concurrent_reporting, metrics
         )
+    except Exception as e:
+        return f"Error analyzing {company_name}: {str(e)}", [], None
+
+
+# Händelser från stream_company_analysis, ungefär i den ordning de brukar komma.
+# Sektionshändelserna heter som rapportens rubriker (app.parse_sections).
+STREAM_EVENTS = (
+    "quarterly_data",                 # {"quarterly_financials": ..., "quarters": [...]}
+    "sources",                        # list[str]
+    "Key Research Insights",          # sektionstext inkl. slutmarkör
+    "Financial Analysis Highlights",
+    "Executive Summary",
+    "Recommendations",
+    "done",                           # (report_text, sources, quarterly_data)
+)
+
+
+def stream_company_analysis(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+    run_id: str | None = None,
+):
+    """
+    Like run_company_analysis, but yields (event, payload) while the pipeline runs,
+    as soon as each part is ready (see STREAM_EVENTS): the tool's quarterly data,
+    the sources and the two bullet sections after research, then each report
+    section as its task finishes. The last event is always
+    ("done", (report_text, sources, quarterly_data)), also on failure.
+    The pipeline runs in a worker thread; stopping iteration does not cancel it.
+    """
+    events: queue.Queue = queue.Queue()
 
-        quarterly_data = None
+    def _worker():
+        try:
+            result = _analyze_company_logged(
+                run_id, company_name, llm, search_tool, financial_data_tool, parallel_research,
+                concurrent_reporting, metrics, lambda event, payload: events.put((event, payload)),
+            )
+        except Exception as e:
+            result = (f"Error analyzing {company_name}: {str(e)}", [], None)
+        events.put(("done", result))
+
+    threading.Thread(target=_worker, name="analysis-stream", daemon=True).start()
+    while True:
+        event, payload = events.get()
+        yield event, payload
+        if event == "done":
+            return
 
-        if block_obj:
-            quarterly_data = {
-                # standardnycklar som app.py/quarterly_df förväntar sig
-                "quarterly_financials": block_obj.get("quarterly_financials", {}),
-                "quarters": block_obj.get("quarters", []),
+
+def run_batch_analysis(
+    companies: list[str],
+    max_workers: int = 4,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+):
+    """
+    Analyze many companies in parallel with one shared LLM client and tool set.
+
+    Yields (company_name, (report_text, sources, quarterly_data), error) as soon as
+    each company finishes, in completion order. `error` is None on success; a
+    failing company yields its error instead of aborting the batch.
+    """
+    llm, search_tool, financial_data_tool = create_shared_resources()
+    run_ids = {name: run_log.new_run_id(name) for name in companies}
+    log_debug("START BATCH", {"companies": len(companies), "max_workers": max_workers, "run_ids": run_ids})
+
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="analysis")
+    # gamla loggar rensas en gång när batchen är klar, inte efter varje bolag (annars
+    # raderar en batch större än RUN_LOG_KEEP_RUNS sina egna loggar)
+    with run_log.batch(len(companies)):
+        try:
+            futures = {
+                pool.submit(
+                    _analyze_company_logged,
+                    run_ids[name],
+                    name,
+                    llm,
+                    search_tool,
+                    financial_data_tool,
+                    parallel_research,
+                    concurrent_reporting,
+                ): name
+                for name in companies
             }
-            log_debug("QUARTERLY DATA (from JSON block)", {
-                "series_keys": list(quarterly_data["quarterly_financials"].keys()),
-                "rows": len(quarterly_data["quarters"]),
-            })
-        else:
-            # fallback: kör verktyget precis som tidigare
-            try:
-                if hasattr(financial_data_tool, "run"):
-                    tool_raw = financial_data_tool.run(company_name)
-                elif callable(financial_data_tool):
-                    tool_raw = financial_data_tool(company_name)
-                elif isinstance(financial_data_tool, dict) and callable(financial_data_tool.get("function")):
-                    tool_raw = financial_data_tool["function"](company_name)
-                else:
-                    raise TypeError("Unsupported financial_data_tool type")
-
-                # mappa till standardnycklar om möjligt
-                if isinstance(tool_raw, dict):
-                    quarterly_data = {
-                        "quarterly_financials": tool_raw.get("quarterly_financials_norm")
-                                              or tool_raw.get("quarterly_financials")
-                                              or {},
-                        "quarters": tool_raw.get("quarters") or [],
-                    }
-                else:
-                    quarterly_data = None
-                log_debug("QUARTERLY DATA (from tool)", quarterly_data or "None")
-            except Exception as e:
-                log_debug("QUARTERLY DATA (tool) ERROR", str(e))
-                quarterly_data = None
+            for fut in as_completed(futures):
+                name = futures[fut]
+                try:
+                    yield name, fut.result(), None
+                except Exception as e:
+                    yield name, (f"Error analyzing {name}: {str(e)}", [], None), str(e)
+        finally:
+            # om konsumenten slutar läsa: avbryt köade bolag i stället för att vänta in dem
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ---------------------------
+# Async pipeline
+# ---------------------------
+# Crews och verktyg är blockerande; de körs i en egen pool så att event-loopen kan
+# ha många analyser igång samtidigt medan de väntar på LLM/sök-I/O.
+ASYNC_MAX_INFLIGHT = 32
+
+_async_pool: ThreadPoolExecutor | None = None
+_async_pool_lock = threading.Lock()
+
+
+def _get_async_pool() -> ThreadPoolExecutor:
+    global _async_pool
+    with _async_pool_lock:
+        if _async_pool is None:
+            _async_pool = ThreadPoolExecutor(max_workers=ASYNC_MAX_INFLIGHT, thread_name_prefix="analysis-async")
+        return _async_pool
+
 
-        log_debug("QUARTERLY DATA (returned)", quarterly_data if quarterly_data is not None else "No data")
+async def _run_blocking(fn, *args):
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_get_async_pool(), functools.partial(ctx.run, fn, *args))
 
 
-        return final_report, sources, quarterly_data
+async def _silent_kickoff_async(crew, label: str):
+    """Async variant of _silent_kickoff.
 
+    crew.kickoff_async() is only a thread wrapper around kickoff(); running
+    _silent_kickoff in our own pool gives the same concurrency and keeps the
+    per-thread output capture.
+    """
+    return await _run_blocking(_silent_kickoff, crew, label)
+
+
+async def _run_research_async(run: _AnalysisRun):
+    if not run.parallel_research:
+        return await _run_blocking(_run_research_sequential, run)
+
+    jobs = _parallel_research_jobs(run)
+    outputs = await asyncio.gather(*(
+        _run_blocking(_timed, run.metrics, label, fn, *args) for label, (fn, args) in jobs.items()
+    ))
+    results = dict(zip(jobs, outputs))
+    _prepare_analysis(run)
+    analysis = await _run_blocking(_timed, run.metrics, "financial_analysis", _silent_kickoff, run.analysis_crew, "ANALYSIS CREW")
+    _log_research_timings(run)
+    return _merge_crew_results(results["web_search"], results["financial_research"], analysis)
+
+
+async def _run_reporting_async(run: _AnalysisRun):
+    if not run.concurrent_reporting:
+        return await _run_blocking(_timed, run.metrics, "reporting_crew", _silent_kickoff, run.reporting_crew, "REPORTING CREW")
+    results = await asyncio.gather(*(
+        _run_blocking(_timed, run.metrics, f"reporting: {name}", _silent_kickoff, crew, f"REPORTING CREW ({name})")
+        for name, crew in zip(REPORT_SECTIONS, run.section_crews)
+    ))
+    log_debug("REPORTING TIMINGS", {k: v for k, v in run.timings.items() if k.startswith("reporting")})
+    return _merge_crew_results(*results)
+
+
+async def _analyze_company_async(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+):
+    # financial_data hämtas i _prepare_research (sekventiellt läge) → kör i poolen
+    run = await _run_blocking(
+        _prepare_research,
+        company_name, llm, search_tool, financial_data_tool, parallel_research, concurrent_reporting, metrics
+    )
+    research_result = await _run_research_async(run)
+    _collect_research(run, research_result)
+    reporting_result = await _run_reporting_async(run)
+    return await _run_blocking(_finish_report, run, reporting_result)
+
+
+async def run_company_analysis_async(
+    company_name: str,
+    llm=None,
+    search_tool=None,
+    financial_data_tool=None,
+    parallel_research: bool = False,
+    concurrent_reporting: bool = False,
+    metrics: PipelineMetrics | None = None,
+    run_id: str | None = None,
+):
+    """
+    Async version of run_company_analysis; many calls can be awaited concurrently,
+    e.g. with asyncio.gather. Up to ASYNC_MAX_INFLIGHT crews run at the same time.
+    Returns: (report_text, sources, quarterly_data)
+    """
+    try:
+        with run_log.bind(run_id, company_name):
+            try:
+                return await _analyze_company_async(
+                    company_name, llm, search_tool, financial_data_tool, parallel_research, concurrent_reporting, metrics
+                )
+            except Exception as e:
+                log_debug("FATAL ERROR", str(e), level=logging.ERROR)
+                raise
     except Exception as e:
-        log_debug("FATAL ERROR", str(e))
         return f"Error analyzing {company_name}: {str(e)}", [], None
 
 
 def extract_sources_from_outputs(crew_result):
     """
     Extract sources from crew execution results.
+    Per output (web search, then research): its URLs (canonical, deduplicated),
+    then named sources such as "Source: ..." or "... Report".
     """
-    all_sources = []
     tasks_outputs_list = []
     if hasattr(crew_result, "tasks_output") and crew_result.tasks_output:
         try:
@@ -647,46 +1059,54 @@ def extract_sources_from_outputs(crew_result):
             crew_result.get("reporting_task", ""),
         ]
 
-    for output in tasks_outputs_list[:2]:
-        if output:
-            urls = re.findall(r'https?://[^\s\)]+', output)
-            all_sources.extend(urls)
-
-            source_patterns = [
-                r'Source:\s*([^\n]+)',
-                r'According to\s+([^,\n]+)',
-                r'from\s+([^,\n]+)',
-                r'published\s+by\s+([^,\n]+)',
-                r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+(?:Report|News|Press|Media))',
-                r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+Q[0-9]+\s+[0-9]{4})',
-                r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+[0-9]{4}\s+(?:Report|Financial|Earnings))'
-            ]
-
-            for pattern in source_patterns:
-                matches = re.findall(pattern, output, re.IGNORECASE)
-                all_sources.extend(matches)
-
+    collector = SourceCollector()
     cleaned_sources = []
     seen_sources = set()
-
-    for src in all_sources:
-        src = src.strip()
-        if len(src) < 10:
+    for label, output in zip(("web_search", "financial_research"), tasks_outputs_list[:2]):
+        if not output:
             continue
-        if src.endswith((':', ',', '.', ')', ']', '}')):
-            src = src.rstrip(':,.)]}').strip()
-
-        normalized = src.lower().replace('*', '').replace('(', '').replace(')', '').strip()
-        if normalized not in seen_sources and src and len(src) >= 10:
-            cleaned_sources.append(src)
-            seen_sources.add(normalized)
+        for url in collector.feed(output, task=label):
+            cleaned_sources.append(url)
+            seen_sources.add(url.lower())
+
+        for src in source_names(output):
+            src = src.strip()
+            if len(src) < 10:
+                continue
+            if src.endswith((':', ',', '.', ')', ']', '}')):
+                src = src.rstrip(':,.)]}').strip()
+
+            normalized = src.lower().replace('*', '').replace('(', '').replace(')', '').strip()
+            # namn som bara är en länk ("Source: https://...") är redan med som URL
+            if normalized.startswith(("http://", "https://")):
+                continue
+            if normalized not in seen_sources and src and len(src) >= 10:
+                cleaned_sources.append(src)
+                seen_sources.add(normalized)
 
     return cleaned_sources if cleaned_sources else ["Sources extracted from agent outputs"]
 
 
 if __name__ == "__main__":
-    company_name = "Ericsson"
-    report, sources, quarterly_data = run_company_analysis(company_name)
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Analyze one or more companies.")
+    parser.add_argument("companies", nargs="*", default=["Ericsson"], help="Company names (default: Ericsson)")
+    parser.add_argument("--workers", type=int, default=4, help="Parallel analyses when several companies are given")
+    parser.add_argument("--parallel-research", action="store_true", help="Run web search and financial research concurrently")
+    parser.add_argument("--concurrent-reporting", action="store_true", help="Write the report sections concurrently")
+    args = parser.parse_args()
+    modes = {"parallel_research": args.parallel_research, "concurrent_reporting": args.concurrent_reporting}
+
+    if len(args.companies) > 1:
+        batch = run_batch_analysis(args.companies, max_workers=args.workers, **modes)
+        for name, (report, sources, quarterly_data), error in batch:
+            status = f"FAILED: {error}" if error else f"ok ({len(report)} chars, {len(sources)} sources)"
+            print(f"[{name}] {status}")
+        sys.exit(0)
+
+    company_name = args.companies[0]
+    report, sources, quarterly_data = run_company_analysis(company_name, **modes)
 
     print("\n--- Final Report ---\n")
     print(report)
@@ -697,8 +1117,3 @@ if __name__ == "__main__":
         print(quarterly_data.head() if hasattr(quarterly_data, 'head') else quarterly_data)
     else:
         print("No quarterly data available")
-
-
-
-
-
@@ -0,0 +1,121 @@
+# pipeline_metrics.py
+"""Structured timing spans for one analysis run.
+
+Every pipeline stage, crew kickoff and tool call becomes a span (name, start,
+duration and attributes such as LLM token counts). A `PipelineMetrics` object
+can be passed to `run_company_analysis(..., metrics=...)` and inspected
+afterwards, and spans are optionally appended as JSON lines to a file
+(env PIPELINE_METRICS_FILE).
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+
+def token_usage_of(crew_result) -> dict:
+    """LLM token counts from a CrewOutput (token_usage), or {} if unavailable."""
+    usage = getattr(crew_result, "token_usage", None)
+    if usage is None:
+        return {}
+    if hasattr(usage, "model_dump"):
+        usage = usage.model_dump()
+    elif not isinstance(usage, dict):
+        usage = vars(usage)
+    keys = ("total_tokens", "prompt_tokens", "completion_tokens", "successful_requests")
+    return {k: usage[k] for k in keys if isinstance(usage.get(k), (int, float))}
+
+
+class PipelineMetrics:
+    def __init__(self, company_name: str | None = None, run_id: str | None = None, jsonl_path: str | None = None):
+        self.company_name = company_name
+        self.run_id = run_id
+        self.jsonl_path = jsonl_path if jsonl_path is not None else os.getenv("PIPELINE_METRICS_FILE")
+        self.spans: list[dict] = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """Time a block. Yields the attribute dict so callers can add to it."""
+        start = time.time()
+        t0 = time.perf_counter()
+        error = None
+        try:
+            yield attrs
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            self.record(name, time.perf_counter() - t0, start=start, error=error, **attrs)
+
+    def record(self, name: str, duration: float, start: float | None = None, error: str | None = None, **attrs):
+        span = {
+            "run_id": self.run_id,
+            "company": self.company_name,
+            "span": name,
+            "start": round(start if start is not None else time.time() - duration, 3),
+            "duration_s": round(duration, 4),
+            **attrs,
+        }
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+        if self.jsonl_path:
+            try:
+                with self._lock, open(self.jsonl_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(span, default=str) + "\n")
+            except Exception as e:
+                print(f"[METRICS WARNING] Could not write span '{name}': {e}")
+
+    def wrap_tool(self, tool):
+        """Return a copy of a dict tool whose function/coroutine record a span per call."""
+        if not isinstance(tool, dict):
+            return tool
+        name = tool.get("name", "tool")
+        wrapped = dict(tool)
+        fn = tool.get("function")
+        if callable(fn):
+            @functools.wraps(fn)
+            def timed(*args, **kwargs):
+                with self.span(f"tool:{name}", kind="tool_call"):
+                    return fn(*args, **kwargs)
+            wrapped["function"] = timed
+        coro = tool.get("coroutine")
+        if callable(coro):
+            @functools.wraps(coro)
+            async def timed_async(*args, **kwargs):
+                with self.span(f"tool:{name}", kind="tool_call"):
+                    return await coro(*args, **kwargs)
+            wrapped["coroutine"] = timed_async
+        return wrapped
+
+    def durations(self) -> dict[str, float]:
+        """span name → total seconds (tool calls summed per tool)."""
+        out: dict[str, float] = {}
+        with self._lock:
+            for s in self.spans:
+                out[s["span"]] = round(out.get(s["span"], 0.0) + s["duration_s"], 3)
+        return out
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = list(self.spans)
+        tokens: dict[str, int] = {}
+        for s in spans:
+            for k in ("prompt_tokens", "completion_tokens", "total_tokens"):
+                if k in s:
+                    tokens[k] = tokens.get(k, 0) + int(s[k])
+        tool_calls = [s for s in spans if s.get("kind") == "tool_call"]
+        return {
+            "run_id": self.run_id,
+            "company": self.company_name,
+            "stages": self.durations(),
+            "tokens": tokens,
+            "tool_calls": len(tool_calls),
+            "tool_seconds": round(sum(s["duration_s"] for s in tool_calls), 3),
+        }
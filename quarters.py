@@ -0,0 +1,107 @@
+# quarters.py
+"""Shared quarter-label parsing.
+
+Every part of the app that turns a quarter label ("Q2 2025", "2025-Q2", a
+report-date Timestamp, "2025-06-30") into a (year, quarter) pair, a "Q# YYYY"
+label, a sort key or a quarter-end Timestamp goes through this module.
+String parsing is memoized, since the same few dozen labels repeat across
+every statement, chart and company in a batch. The canonical "Q# YYYY" form
+skips the regexes entirely.
+"""
+from __future__ import annotations
+
+import datetime
+import re
+from functools import lru_cache
+
+import pandas as pd
+
+# "Q2 2025", "Q2-2025", "q2/2025" (vinner) resp. "2025Q2", "2025-Q2"
+_Q_FIRST = re.compile(r"Q([1-4])\s*[-_/ ]?\s*(\d{4})")
+_YEAR_FIRST = re.compile(r"(\d{4})\s*[-_/ ]?\s*Q([1-4])")
+
+CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_label(s: str) -> tuple[int, int] | None:
+    """(year, quarter) from a quarter label (upper-cased, stripped), else None."""
+    if len(s) == 7 and s[0] == "Q" and s[1] in "1234" and s[2] == " " and s[3:].isdigit():
+        return int(s[3:]), int(s[1])
+    m = _Q_FIRST.search(s)
+    if m:
+        return int(m.group(2)), int(m.group(1))
+    m = _YEAR_FIRST.search(s)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    return None
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _parse_date(s: str) -> pd.Timestamp | None:
+    try:
+        ts = pd.to_datetime(s)
+    except Exception:
+        return None
+    return None if pd.isna(ts) else ts
+
+
+def _key(x) -> str:
+    return str(x).strip().upper()
+
+
+def parse_quarter(x) -> tuple[int, int] | None:
+    """(year, quarter) for a label, Timestamp/date, Period or date string; None if unparseable."""
+    if isinstance(x, (pd.Timestamp, datetime.date)):
+        return None if pd.isna(x) else (x.year, (x.month - 1) // 3 + 1)
+    if isinstance(x, pd.Period):
+        return x.year, x.quarter
+    s = _key(x)
+    parsed = _parse_label(s)
+    if parsed is None:
+        ts = _parse_date(s)
+        if ts is not None:
+            parsed = (ts.year, ts.quarter)
+    return parsed
+
+
+def quarter_label(x) -> str:
+    """'Q# YYYY', or str(x) unchanged if it can't be parsed."""
+    parsed = parse_quarter(x)
+    return f"Q{parsed[1]} {parsed[0]}" if parsed else str(x)
+
+
+def quarter_sort_key(x) -> tuple[int, int]:
+    """(year, quarter) for sorting oldest → newest; unparseable labels sort first as (0, 0)."""
+    return parse_quarter(x) or (0, 0)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def quarter_end(year: int, quarter: int) -> pd.Timestamp:
+    return pd.Period(year=year, quarter=quarter, freq="Q").to_timestamp(how="end")
+
+
+def quarter_to_ts(q) -> pd.Timestamp:
+    """Quarter label → quarter-end Timestamp. Raw dates are returned as that date.
+
+    Raises ValueError for anything else.
+    """
+    s = _key(q)
+    parsed = _parse_label(s)
+    if parsed is not None:
+        return quarter_end(*parsed)
+    ts = _parse_date(s)
+    if ts is None:
+        raise ValueError(f"Kan inte tolka kvartal: {q}")
+    return ts
+
+
+def quarters_to_ts(values) -> pd.Series:
+    """quarter_to_ts for many values; each distinct label is parsed once."""
+    values = list(values)
+    by_label = {}
+    for v in values:
+        k = _key(v)
+        if k not in by_label:
+            by_label[k] = quarter_to_ts(v)
+    return pd.Series([by_label[_key(v)] for v in values])  # samma typinferens som .apply(quarter_to_ts)
@@ -0,0 +1,134 @@
+# result_cache.py
+"""Process-wide cache of finished analyses, shared by every session of the app.
+
+Entries are keyed by (normalized company name, trading day), so "Ericsson",
+"ericsson ab" and "Ericsson AB (publ)" share one result until the next
+trading day or until the TTL runs out (env ANALYSIS_CACHE_TTL, seconds,
+default 6 hours). Error results are never stored.
+
+Single flight: the first request for a key runs the pipeline; concurrent
+requests for the same key wait for that run instead of starting their own.
+If the running request is interrupted (e.g. its Streamlit session reruns),
+one of the waiters takes over.
+"""
+from __future__ import annotations
+
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, NamedTuple
+
+import run_log
+from tools.ticker_index import normalize_name
+
+DEFAULT_TTL = 6 * 60 * 60
+MAX_ENTRIES = 128
+
+
+def default_ttl() -> float:
+    try:
+        return float(os.getenv("ANALYSIS_CACHE_TTL", DEFAULT_TTL))
+    except ValueError:
+        return DEFAULT_TTL
+
+
+def trading_day(now: datetime.datetime | None = None) -> str:
+    """ISO date of the latest trading day (UTC); Saturday and Sunday count as Friday."""
+    day = (now or datetime.datetime.now(datetime.timezone.utc)).date()
+    return (day - datetime.timedelta(days=max(0, day.weekday() - 4))).isoformat()
+
+
+def _is_error(result) -> bool:
+    # run_company_analysis returnerar fel som värden: ("Error analyzing …", [], None)
+    report = result[0] if isinstance(result, tuple) and result else None
+    return not isinstance(report, str) or report.startswith("Error analyzing")
+
+
+class CachedAnalysis(NamedTuple):
+    result: tuple        # (report, sources, quarterly_data)
+    run_id: str | None   # körningen som tog fram resultatet (för run_log.tail_run_log)
+    created_at: float
+    source: str          # "run" (körde själv), "shared" (väntade in en pågående körning) eller "cache"
+
+
+class AnalysisCache:
+    def __init__(self, ttl: float | None = None, max_entries: int = MAX_ENTRIES, clock=time.time):
+        self.ttl = default_ttl() if ttl is None else ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], CachedAnalysis] = OrderedDict()
+        self._inflight: dict[tuple[str, str], Future] = {}
+
+    @staticmethod
+    def key(company: str, day: str | None = None) -> tuple[str, str]:
+        return normalize_name(company), day or trading_day()
+
+    def _fresh(self, key) -> CachedAnalysis | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if self._clock() - entry.created_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, company: str) -> CachedAnalysis | None:
+        with self._lock:
+            return self._fresh(self.key(company))
+
+    def running(self, company: str) -> bool:
+        with self._lock:
+            return self.key(company) in self._inflight
+
+    def invalidate(self, company: str) -> None:
+        with self._lock:
+            self._entries.pop(self.key(company), None)
+
+    def get_or_run(self, company: str, run: Callable[[str], tuple], refresh: bool = False) -> CachedAnalysis:
+        """Cached result for `company`, else `run(run_id)` – at most once at a time per key.
+
+        `refresh=True` skips a stored result but still joins a run that is already going.
+        """
+        key = self.key(company)
+        while True:
+            with self._lock:
+                entry = None if refresh else self._fresh(key)
+                if entry is not None:
+                    return entry._replace(source="cache")
+                fut = self._inflight.get(key)
+                owner = fut is None
+                if owner:
+                    fut = self._inflight[key] = Future()
+            if owner:
+                break
+            try:
+                return fut.result()._replace(source="shared")
+            except BaseException:
+                continue  # ägaren avbröts – försök igen, kanske som ägare
+
+        run_id = run_log.new_run_id(company)
+        try:
+            result = run(run_id)
+        except BaseException as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        entry = CachedAnalysis(result, run_id, self._clock(), "run")
+        with self._lock:
+            self._inflight.pop(key, None)
+            if not _is_error(result):
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        fut.set_result(entry)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,188 @@
+# run_log.py
+"""Per-run debug logs.
+
+Each analysis run writes to its own file, `<DEBUG_LOG_DIR>/<run_id>.log`. Records
+go through a queue to a background thread and are buffered before they hit
+disk, so pipeline threads never block on file I/O. Each file rotates by size
+(RUN_LOG_MAX_BYTES, RUN_LOG_BACKUPS), and only the newest RUN_LOG_KEEP_RUNS
+run logs are kept. Old logs are pruned when a run ends, except inside `batch()`,
+which prunes once when the batch ends and keeps at least all of its own runs.
+
+The shared process log (records outside a run) is closed, and so flushed,
+at interpreter exit.
+
+The active run is tracked in a ContextVar so `log_debug` in main.py finds the
+right file from threads and asyncio tasks (see `bind`).
+"""
+from __future__ import annotations
+
+import atexit
+import contextlib
+import contextvars
+import datetime
+import glob
+import logging
+import os
+import queue
+import re
+import threading
+import uuid
+from logging.handlers import MemoryHandler, QueueHandler, QueueListener, RotatingFileHandler
+
+DEBUG_LOG_DIR = os.getenv("DEBUG_LOG_DIR", "debug_logs")
+RUN_LOG_MAX_BYTES = int(os.getenv("RUN_LOG_MAX_BYTES", 2 * 1024 * 1024))
+RUN_LOG_BACKUPS = int(os.getenv("RUN_LOG_BACKUPS", 2))
+RUN_LOG_KEEP_RUNS = int(os.getenv("RUN_LOG_KEEP_RUNS", 50))
+BUFFER_RECORDS = 50  # antal poster som buffras innan skrivning (ERROR flushar direkt)
+
+PROCESS_RUN_ID = "process"  # loggar utanför en körning (t.ex. batch-setup)
+
+
+def new_run_id(company_name: str | None = None) -> str:
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    slug = re.sub(r"[^a-z0-9]+", "-", (company_name or "run").lower()).strip("-")[:24] or "run"
+    return f"{stamp}-{slug}-{uuid.uuid4().hex[:6]}"
+
+
+def run_log_path(run_id: str, directory: str | None = None) -> str:
+    return os.path.join(directory or DEBUG_LOG_DIR, f"{run_id}.log")
+
+
+def format_entry(section_name, content) -> str:
+    parts = [f"\n\n=== {section_name} | {datetime.datetime.now().isoformat()} ===\n"]
+    if isinstance(content, (list, tuple)):
+        for i, item in enumerate(content, 1):
+            parts.append(f"\n--- Item {i} ---\n{str(item)}\n")
+    else:
+        parts.append(str(content) + "\n")
+    return "".join(parts)
+
+
+class RunLogger:
+    """Buffered, rotating log file for one run, written by a background thread."""
+
+    def __init__(
+        self,
+        run_id: str,
+        directory: str | None = None,
+        max_bytes: int = RUN_LOG_MAX_BYTES,
+        backup_count: int = RUN_LOG_BACKUPS,
+    ):
+        self.run_id = run_id
+        self.path = run_log_path(run_id, directory)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        file_handler = RotatingFileHandler(self.path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._buffer = MemoryHandler(BUFFER_RECORDS, flushLevel=logging.ERROR, target=file_handler)
+        self._file_handler = file_handler
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._enqueue = QueueHandler(self._queue)
+        self._listener = QueueListener(self._queue, self._buffer)
+        self._listener.start()
+        self._closed = False
+
+    def log(self, section_name, content, level: int = logging.DEBUG) -> None:
+        if self._closed:
+            return
+        record = logging.LogRecord(self.run_id, level, __file__, 0, format_entry(section_name, content), None, None)
+        self._enqueue.handle(record)
+
+    def flush(self) -> None:
+        # vänta in kön och töm bufferten
+        self._listener.stop()
+        self._buffer.flush()
+        if not self._closed:
+            self._listener.start()
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._listener.stop()
+        self._buffer.close()
+        self._file_handler.close()
+
+
+_current: contextvars.ContextVar[RunLogger | None] = contextvars.ContextVar("run_logger", default=None)
+_process_logger: RunLogger | None = None
+_process_lock = threading.Lock()
+_batches = 0  # pågående batch() – körningar rensar inte gamla loggar så länge det är > 0
+
+
+def current_logger() -> RunLogger:
+    """Logger for the active run, or the shared process log outside of a run."""
+    global _process_logger
+    logger = _current.get()
+    if logger is not None:
+        return logger
+    with _process_lock:
+        if _process_logger is None:
+            _process_logger = RunLogger(PROCESS_RUN_ID)
+            # bufferten (MemoryHandler) töms annars aldrig – de sista posterna före en krasch försvann
+            atexit.register(_process_logger.close)
+        return _process_logger
+
+
+def current_run_id() -> str | None:
+    logger = _current.get()
+    return logger.run_id if logger is not None else None
+
+
+def prune_runs(directory: str | None = None, keep: int | None = None) -> None:
+    """Delete all but the newest `keep` (default RUN_LOG_KEEP_RUNS) run logs, rotated backups included."""
+    directory = directory or DEBUG_LOG_DIR
+    keep = RUN_LOG_KEEP_RUNS if keep is None else keep
+    files = [p for p in glob.glob(os.path.join(directory, "*.log")) if not p.endswith(f"{PROCESS_RUN_ID}.log")]
+    files.sort(key=os.path.getmtime, reverse=True)
+    for path in files[keep:]:
+        for p in [path] + glob.glob(path + ".*"):
+            with contextlib.suppress(OSError):
+                os.remove(p)
+
+
+@contextlib.contextmanager
+def batch(runs: int = 0):
+    """Defer pruning until the batch ends, then prune once keeping at least `runs` logs."""
+    global _batches
+    with _process_lock:
+        _batches += 1
+    try:
+        yield
+    finally:
+        with _process_lock:
+            _batches -= 1
+            last = _batches == 0
+        if last:
+            with contextlib.suppress(Exception):
+                prune_runs(keep=max(RUN_LOG_KEEP_RUNS, runs))
+
+
+@contextlib.contextmanager
+def bind(run_id: str | None = None, company_name: str | None = None):
+    """Open a RunLogger and make it the active logger for this thread/task."""
+    logger = RunLogger(run_id or new_run_id(company_name))
+    token = _current.set(logger)
+    try:
+        yield logger
+    finally:
+        _current.reset(token)
+        logger.close()
+        if not _batches:
+            with contextlib.suppress(Exception):
+                prune_runs()
+
+
+def tail_run_log(run_id: str, max_kb: int = 5, directory: str | None = None) -> str:
+    """Last `max_kb` KB of a run's log, read with a seek (not the whole file)."""
+    path = run_log_path(run_id, directory)
+    if not os.path.exists(path):
+        return ""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        size = f.tell()
+        f.seek(max(0, size - max_kb * 1024))
+        data = f.read()
+    text = data.decode("utf-8", errors="ignore")
+    if size > max_kb * 1024 and "\n" in text:
+        text = text.split("\n", 1)[1]  # första raden är troligen avklippt
+    return text
@@ -0,0 +1,114 @@
+# source_extraction.py
+"""URL/source extraction with canonical dedupe.
+
+`SourceCollector.feed(text, task)` scans one task output and yields each URL
+the first time it is seen, in canonical form. Feed outputs as they arrive; the
+collector keeps the ordered list (`urls`), which tasks cited each URL
+(`provenance`) and a compact seen-set of 8-byte digests.
+
+Two URLs count as the same source when they differ only in scheme
+(http/https), letter case of the host, a leading "www.", a default port, a
+trailing slash, tracking parameters (utm_*, fbclid, gclid, ...) or the fragment.
+"""
+from __future__ import annotations
+
+import hashlib
+import re
+from urllib.parse import urlsplit, urlunsplit
+
+URL_RE = re.compile(r'https?://[^\s\)\]<>"\']+', re.IGNORECASE)
+_STRIP_CHARS = "()[].,;:!?*'\"<>"  # markdown/skiljetecken runt länken
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid",
+    "_hsenc", "_hsmi", "ref_src", "cmpid", "ocid", "sr_share",
+})
+
+# Namngivna källor i löptext (extract_sources_from_outputs); ordningen avgör resultatets ordning
+SOURCE_NAME_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in (
+    r'Source:\s*([^\n]+)',
+    r'According to\s+([^,\n]+)',
+    r'from\s+([^,\n]+)',
+    r'published\s+by\s+([^,\n]+)',
+    r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+(?:Report|News|Press|Media))',
+    r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+Q[0-9]+\s+[0-9]{4})',
+    r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\s+[0-9]{4}\s+(?:Report|Financial|Earnings))',
+))
+
+
+def _is_tracking(key: str) -> bool:
+    key = key.lower()
+    return key.startswith("utm_") or key in TRACKING_PARAMS
+
+
+def canonical_url(url: str) -> str | None:
+    """Cleaned URL for display (tracking params, fragment, trailing slash removed), or None."""
+    url = (url or "").strip().strip(_STRIP_CHARS)
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https") or not parts.hostname:
+        return None
+    host = parts.hostname.lower()
+    if port and not (scheme == "http" and port == 80 or scheme == "https" and port == 443):
+        host = f"{host}:{port}"
+    path = parts.path.rstrip("/")
+    # filtrera råa "k=v"-par så att övriga parametrar behåller sin kodning
+    query = "&".join(p for p in parts.query.split("&") if p and not _is_tracking(p.split("=", 1)[0]))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def dedupe_key(canonical: str) -> bytes:
+    """Compact identity of a canonical URL: scheme and "www." ignored, query params sorted."""
+    parts = urlsplit(canonical)
+    host = parts.netloc[4:] if parts.netloc.startswith("www.") else parts.netloc
+    query = "&".join(sorted(parts.query.split("&"))) if parts.query else ""
+    return hashlib.blake2b(f"{host}{parts.path}?{query}".encode("utf-8"), digest_size=8).digest()
+
+
+class SourceCollector:
+    def __init__(self):
+        self.urls: list[str] = []
+        self.provenance: dict[str, list[str]] = {}
+        self._seen: dict[bytes, str] = {}
+
+    def add(self, url: str, task: str | None = None) -> str | None:
+        """Register one URL. Returns its canonical form if it is new, else None."""
+        canonical = canonical_url(url)
+        if canonical is None:
+            return None
+        key = dedupe_key(canonical)
+        first = self._seen.get(key)
+        if first is None:
+            self._seen[key] = canonical
+            self.urls.append(canonical)
+            self.provenance[canonical] = [task] if task else []
+            return canonical
+        if task and task not in self.provenance[first]:
+            self.provenance[first].append(task)
+        return None
+
+    def feed(self, text: str, task: str | None = None):
+        """Yield the new canonical URLs in `text` as they are found."""
+        if not text or "http" not in text.lower():
+            return
+        for m in URL_RE.finditer(text):
+            canonical = self.add(m.group(0), task)
+            if canonical is not None:
+                yield canonical
+
+    def collect(self, text: str, task: str | None = None) -> list[str]:
+        return list(self.feed(text, task))
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+
+def source_names(text: str) -> list[str]:
+    """Named sources ("Source: ...", "According to ...", "... Report") in pattern order."""
+    found = []
+    for pattern in SOURCE_NAME_PATTERNS:
+        found.extend(pattern.findall(text))
+    return found
@@ -0,0 +1,185 @@
+"""Compact, token-budgeted context from upstream task outputs.
+
+Instead of pasting every dependency's raw output into the next prompt, the
+outputs are read once: the QUARTERLY DATA JSON block is parsed out, and the
+remaining text is reduced to deduplicated bullets, number-bearing sentences
+and canonical URLs, latest dependency first. Sections are then filled in priority order (payload,
+key points, figures, sources) until the task's token budget is spent.
+
+The dependencies must already have run: main creates each task after its
+upstream stage, and the tasks set context=[] so CrewAI does not append the raw
+outputs on top.
+
+Tokens are counted with tiktoken when it is installed, otherwise estimated
+as characters / 4.
+"""
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from quarterly_store import quarter_ordinal
+from source_extraction import SourceCollector
+from text_processing import MAX_BULLET_CHARS, normalize_bullets, segment_text, split_quarterly_block
+
+# token-budget per mottagande task (räknat på kontextdelen, inte instruktionerna)
+RESEARCH_CONTEXT_TOKENS = 700
+ANALYSIS_CONTEXT_TOKENS = 1500
+REPORTING_CONTEXT_TOKENS = 800
+MAX_SOURCES = 8
+TIKTOKEN_ENCODING = "cl100k_base"
+
+
+@lru_cache(maxsize=1)
+def _encoder():
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding(TIKTOKEN_ENCODING)
+    except Exception:  # ej installerat eller kodningen kunde inte laddas (offline)
+        return None
+
+
+def count_tokens(text: str) -> int:
+    enc = _encoder()
+    if enc is not None:
+        return len(enc.encode(text or "", disallowed_special=()))
+    return (len(text or "") + 3) // 4
+
+
+def dependency_text(dep) -> str:
+    """Raw text of a task's output ('' when it has not run yet)."""
+    out = getattr(dep, "output", None)
+    if not out:
+        return ""
+    raw = getattr(out, "raw", None)
+    return raw if isinstance(raw, str) else str(out)
+
+
+def _key(line: str) -> str:
+    return line.lstrip("-•*0123456789.) ").lower()
+
+
+def _compact_payload(payload: dict) -> dict:
+    # "quarters"-raderna upprepar samma siffror och källorna listas separat
+    qf = payload.get("quarterly_financials")
+    if isinstance(qf, dict) and qf:
+        return {"quarterly_financials": qf}
+    return {k: v for k, v in payload.items() if k != "sources"}
+
+
+@dataclass
+class CompactContext:
+    payload: dict | None = None
+    payload_from: str | None = None
+    bullets: list[str] = field(default_factory=list)  # "- ..." utan dubbletter
+    facts: list[str] = field(default_factory=list)
+    urls: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_dependencies(cls, dependencies) -> "CompactContext":
+        ctx = cls()
+        seen: set[str] = set()
+        collector = SourceCollector()
+        # senaste beroendet först: analysen sammanfattar redan researchen, som i sin tur
+        # sammanfattar webbsökningen, så det är dess punkter som ska överleva budgeten
+        for dep in reversed(list(dependencies or [])):
+            text = dependency_text(dep)
+            if not text:
+                continue
+            role = getattr(getattr(dep, "agent", None), "role", "previous task")
+            payload, text = split_quarterly_block(text)
+            if payload is not None and ctx.payload is None:
+                ctx.payload, ctx.payload_from = _compact_payload(payload), role
+            seg = segment_text(text)
+            for b in normalize_bullets(seg.bullets, max_items=0):
+                if _key(b) not in seen:
+                    seen.add(_key(b))
+                    ctx.bullets.append(b)
+            for f in seg.facts:
+                key = _key(f)
+                # meningar som redan står i en bullet hoppas över
+                if key in seen or any(key in b for b in seen):
+                    continue
+                seen.add(key)
+                if len(f) > MAX_BULLET_CHARS:
+                    f = f[:MAX_BULLET_CHARS].rstrip() + "…"
+                ctx.facts.append(f"- {f}")
+            for url in seg.urls:
+                collector.add(url, task=role)
+        ctx.urls = collector.urls
+        return ctx
+
+    def render(self, budget_tokens: int, include_payload: bool = True) -> str:
+        """Sections in priority order, each line kept only while it fits the budget."""
+        lines: list[str] = []
+        used = 0
+
+        def _fits(text: str) -> bool:
+            nonlocal used
+            n = count_tokens(text) + 1
+            if used + n > budget_tokens:
+                return False
+            used += n
+            return True
+
+        if include_payload and self.payload:
+            block = json.dumps(self.payload, separators=(",", ":"), ensure_ascii=False)
+            header = f"QUARTERLY DATA (JSON, from {self.payload_from}):"
+            if _fits(f"{header}\n{block}"):
+                lines += [header, block]
+
+        for title, items in (
+            ("KEY POINTS:", self.bullets),
+            ("FIGURES:", self.facts),
+            ("SOURCES:", [f"- {u}" for u in self.urls[:MAX_SOURCES]]),
+        ):
+            if not items or not _fits(title):
+                continue
+            section = [title]
+            for item in items:
+                if not _fits(item):
+                    break
+                section.append(item)
+            if len(section) > 1:
+                lines += section
+        return "\n".join(lines)
+
+    def __bool__(self) -> bool:
+        return bool(self.payload or self.bullets or self.facts or self.urls)
+
+
+def compact_dependencies(dependencies, budget_tokens: int, include_payload: bool = True) -> str:
+    """Compact context for a prompt, or '' when no dependency has output yet."""
+    ctx = CompactContext.from_dependencies(dependencies)
+    return ctx.render(budget_tokens, include_payload=include_payload) if ctx else ""
+
+
+def _latest_quarters(payload: dict, n: int) -> dict:
+    # bara de n senaste kvartalen per serie; etiketter som inte går att tolka behålls
+    qf = payload.get("quarterly_financials")
+    if not isinstance(qf, dict):
+        return payload
+    ordinals = {o for series in qf.values() if isinstance(series, dict) for o in map(quarter_ordinal, series) if o is not None}
+    keep = set(sorted(ordinals)[-n:])
+    trimmed = {
+        name: {k: v for k, v in series.items() if quarter_ordinal(k) in keep or quarter_ordinal(k) is None}
+        if isinstance(series, dict) else series
+        for name, series in qf.items()
+    }
+    return {**payload, "quarterly_financials": trimmed}
+
+
+def quarterly_data_section(quarterly_data: dict | None, max_quarters: int | None = None) -> str:
+    """Tool-fetched quarterly figures as a compact prompt section ('' when there are none).
+
+    `max_quarters` keeps only the latest that many quarters of each series.
+    """
+    if not quarterly_data:
+        return ""
+    payload = _compact_payload(quarterly_data)
+    if max_quarters is not None:
+        payload = _latest_quarters(payload, max_quarters)
+    block = json.dumps(payload, separators=(",", ":"), ensure_ascii=False)
+    return f"QUARTERLY DATA (exact, from the financial_data tool):\n{block}"
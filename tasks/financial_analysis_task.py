@@ -1,42 +1,104 @@
 from crewai import Task, Agent
 
+from financial_metrics import metric_facts
+from tasks.context import ANALYSIS_CONTEXT_TOKENS, compact_dependencies, quarterly_data_section
+
+ANALYSIS_QUARTERS = 8  # kvartal av rådatan som följer med bredvid de beräknade nyckeltalen
+
+# Reserv när verktyget inte gav några kvartalsdata: be modellen om JSON-blocket som förut
+JSON_BLOCK_FORMAT = """
+B) JSON BLOCK (valid JSON only; no trailing commas; DO NOT output "OK")
+=== QUARTERLY DATA (returned) ===
+{
+  "quarterly_financials": {
+    "Total Revenue": {"Q2 2025": 82000000000, "Q1 2025": 81000000000},
+    "Net Income":    {"Q2 2025": 20000000000},
+    "EBITDA":        {"Q2 2025": 30000000000}
+  },
+  "quarters": [
+    {"quarter":"Q2 2025","revenue":82000000000,"net_income":20000000000,"ebitda":30000000000},
+    {"quarter":"Q1 2025","revenue":81000000000,"net_income":19500000000,"ebitda":29000000000}
+  ],
+  "sources": ["https://...", "https://..."]
+}
+=== END ===
+
+VALIDATION CHECKLIST (perform before returning)
+- If no quarterly data is available at all, set "quarters": [] and "quarterly_financials": {} but still output valid JSON.
+- Never write "OK" in the JSON block.
+- Ensure JSON is valid (parse in your head); quarters use "Q# YYYY"; numbers are integers.
+"""
+
 def create_financial_analysis_task(
     agent: Agent,
     company_name: str,
     dependencies: list | None = None,
     sources: list | None = None,
+    quarterly_data: dict | None = None,
 ):
     if dependencies is None:
         dependencies = []
     if sources is None:
         sources = []
 
+    # kvartalssiffrorna hämtas direkt från verktyget av pipelinen; modellen skriver bara bullets.
+    # YoY/QoQ/TTM/marginaler/CAGR räknas här (financial_metrics); rådatan följer med kompakt
+    # (senaste ANALYSIS_QUARTERS kvartalen) för serierna som nyckeltalen inte täcker, t.ex. Gross Profit.
+    facts = metric_facts((quarterly_data or {}).get("quarters"))
+    data_section = quarterly_data_section(quarterly_data, max_quarters=ANALYSIS_QUARTERS)
+    if facts:
+        data_section = "COMPUTED METRICS (exact, from the financial_data tool):\n" + "\n".join(facts) + "\n\n" + data_section
+    if data_section:
+        data_inputs = (
+            "- The quarterly figures from the `financial_data` tool are attached below"
+            f" as {'COMPUTED METRICS and ' if facts else ''}QUARTERLY DATA.\n"
+            "  Use ONLY these for numbers. Do NOT call `financial_data` again.\n"
+            "- The quarterly payload is passed to the UI directly: do NOT output it as JSON or tables."
+        )
+        output_parts = "return ONLY part A below"
+        json_block = ""
+    else:
+        data_inputs = (
+            "- If any dependency already contains a QUARTERLY DATA JSON block, reuse it.\n"
+            f"- If not, you MUST call the tool named EXACTLY `financial_data` for {company_name} to fetch structured financials."
+        )
+        output_parts = "return BOTH parts below"
+        json_block = JSON_BLOCK_FORMAT
+
+    if facts:
+        analyze = (
+            "- YoY/QoQ growth, TTM, margins, CAGR and trends are precomputed in COMPUTED METRICS: quote them, do NOT recompute.\n"
+            "- Use QUARTERLY DATA for the series and quarters COMPUTED METRICS does not cover (e.g. Operating Income, Gross Profit)."
+        )
+    else:
+        analyze = (
+            "- Identify latest quarter and same quarter last year (YoY).\n"
+            "- Compute YoY % for Revenue and Net Income when both quarters exist.\n"
+            "- Note EBITDA trend if available (latest vs. prior 3–4 quarters)."
+        )
+
     description = f"""
 ROLE
 - You are a precise financial analyst. Do NOT invent numbers. Prefer primary sources.
 
 INPUTS
-- Read all prior task outputs (research & web search) from dependencies.
-- If any dependency already contains a QUARTERLY DATA JSON block, reuse it.
-- If not, you MUST call the tool named EXACTLY `financial_data` for {company_name} to fetch structured financials.
+- Read CONTEXT FROM PREVIOUS TASKS below (web search & research, compacted).
+{data_inputs}
 
 OBJECTIVE
-- Produce a concise financial analysis (3–6 bullets) AND a machine-readable quarterly payload the UI can chart.
+- Produce a concise financial analysis (3–6 bullets) grounded in the quarterly figures.
 
 DATA RULES
 - Quarters must be labeled "Q# YYYY" (e.g., "Q2 2025").
-- Values must be integers in USD (no strings, no commas).
-- Provide at least the latest 8 quarters when available. If a metric is unavailable, omit it (do NOT infer).
-- If the tool returns timestamps, convert to "Q# YYYY".
-- If quarterly data is truly unavailable but annual is available, you MAY output FY rows labeled "FY YYYY"; clearly say this in the bullets.
+- Quote figures exactly as given; do not round them into different values.
+- Use the latest {ANALYSIS_QUARTERS} quarters when available. If a metric is unavailable, omit it (do NOT infer).
+- If quarterly data is truly unavailable but annual is available, you MAY use FY figures labeled "FY YYYY"; clearly say this in the bullets.
 
 WHAT TO ANALYZE (if data exists)
-- Identify latest quarter and same quarter last year (YoY).
-- Compute YoY % for Revenue and Net Income when both quarters exist.
-- Note EBITDA trend if available (latest vs. prior 3–4 quarters).
+{analyze}
 - Call out any material changes (mix shift, services vs. hardware, margins) grounded in sources.
 
-OUTPUT FORMAT (return BOTH parts below; markers must be exact):
+OUTPUT FORMAT ({output_parts}; markers must be exact):
 
 A) Financial Analysis Highlights (markdown bullets)
 Financial Analysis Highlights
@@ -45,40 +107,26 @@ Financial Analysis Highlights
 - Include 1 short risk/uncertainty bullet if relevant.
 - End with this marker exactly:
 --- End of Financial Analysis ---
+{json_block}""".strip()
 
-B) JSON BLOCK (valid JSON only; no trailing commas; DO NOT output "OK")
-=== QUARTERLY DATA (returned) ===
-{{
-  "quarterly_financials": {{
-    "Total Revenue": {{"Q2 2025": 82000000000, "Q1 2025": 81000000000}},
-    "Net Income":    {{"Q2 2025": 20000000000}},
-    "EBITDA":        {{"Q2 2025": 30000000000}}
-  }},
-  "quarters": [
-    {{"quarter":"Q2 2025","revenue":82000000000,"net_income":20000000000,"ebitda":30000000000}},
-    {{"quarter":"Q1 2025","revenue":81000000000,"net_income":19500000000,"ebitda":29000000000}}
-  ],
-  "sources": ["https://...", "https://..."]
-}}
-=== END ===
+    if data_section:
+        description += f"\n\n{data_section}"
 
-VALIDATION CHECKLIST (perform before returning)
-- If no quarterly data is available at all, set "quarters": [] and "quarterly_financials": {{}} but still output valid JSON.
-- Never write "OK" in the JSON block.
-- Ensure JSON is valid (parse in your head); quarters use "Q# YYYY"; numbers are integers.
-""".strip()
-
-    if dependencies:
-        dep_outputs = "\n\n".join(
-            f"Dependency output from {getattr(dep.agent, 'role', 'previous task')}:\n{getattr(dep, 'output', '')}"
-            for dep in dependencies
-        )
+    # kompakt kontext (JSON-payload, bullets, siffror, källor) inom en token-budget i stället för rå output
+    context = compact_dependencies(dependencies, ANALYSIS_CONTEXT_TOKENS, include_payload=not data_section)
+    if context:
         description += (
             "\n\nCONTEXT FROM PREVIOUS TASKS\n"
-            f"{dep_outputs}"
+            f"{context}"
         )
 
-    expected_output = f"""
+    if data_section:
+        expected_output = """
+- A bullet-style 'Financial Analysis Highlights' section with the exact end marker.
+- No JSON block: the quarterly figures are already attached to the run.
+""".strip()
+    else:
+        expected_output = """
 - A bullet-style 'Financial Analysis Highlights' section with the exact end marker.
 - A valid JSON block between the markers with 'quarterly_financials' and/or 'quarters'.
 - Sources included inside the JSON (array of URLs).
@@ -88,8 +136,6 @@ VALIDATION CHECKLIST (perform before returning)
         description=description,
         agent=agent,
         expected_output=expected_output,
-        dependencies=dependencies,
+        context=[],  # inte CrewAI:s standard (all tidigare rå output); kontexten står komprimerad i beskrivningen
         sources=sources,
     )
-
-
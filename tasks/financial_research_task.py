@@ -1,88 +1,93 @@
 from crewai import Task
 from crewai import Agent
 
+from tasks.context import RESEARCH_CONTEXT_TOKENS, compact_dependencies, quarterly_data_section
+
 def create_financial_research_task(
     agent: Agent,
     company_name: str,
     dependencies: list | None = None,
     sources: list | None = None,
+    quarterly_data: dict | None = None,
+    data_fetched_separately: bool = False,
 ):
     if dependencies is None:
         dependencies = []
     if sources is None:
         sources = []
 
+    # kvartalssiffrorna går direkt från verktyget till analys/UI; här skrivs bara sammanfattningen
+    data_section = quarterly_data_section(quarterly_data)
+    if data_section:
+        tool_rules = (
+            f"- The structured quarterly financials for {company_name} were already fetched with the `financial_data` tool\n"
+            "  and are attached below as QUARTERLY DATA. Do NOT call `financial_data` again."
+        )
+    elif data_fetched_separately:
+        # parallellt läge: pipelinen hämtar financial_data samtidigt och skickar den direkt till analysen
+        tool_rules = (
+            f"- The structured quarterly financials for {company_name} are fetched separately by the pipeline\n"
+            "  and passed straight to the analysis. Do NOT call `financial_data`; quote only figures from cited sources."
+        )
+    else:
+        tool_rules = (
+            f"- You MUST call the `financial_data` tool first to fetch structured quarterly financials for {company_name}."
+        )
+
+    figures_from = "the cited sources" if data_fetched_separately and not data_section else "`financial_data`"
+
     description = f"""
 ROLE
 - You are a cautious financial researcher. You MUST NOT invent numbers.
 
 TOOLS
-- You MUST call the `financial_data` tool first to fetch structured quarterly financials for {company_name}.
+{tool_rules}
 - Then call `web_search` for context (analyst notes, management commentary, recent news).
 - Prefer primary sources (10-K/10-Q, earnings releases, investor relations) for the numbers.
 
 OBJECTIVE
-- Produce machine-readable quarterly financials (at least the last 8 quarters) PLUS a short human summary.
+- Produce a short human summary of {company_name}'s recent quarterly performance (the last 8 quarters when available).
 
 STRICT REQUIREMENTS
-1) QUARTERLY DATA:
-   - Provide a JSON object with this shape (omit metrics if truly unavailable, do NOT make them up):
-     {{
-       "quarterly_financials": {{
-         "Total Revenue": {{"Q2 2025": 82000000000, "Q1 2025": 81000000000, ...}},
-         "Net Income":    {{"Q2 2025": 20000000000, ...}},
-         "EBITDA":        {{"Q2 2025": 30000000000, ...}}
-       }},
-       "quarters": [
-         {{"quarter":"Q2 2025","revenue":82000000000,"net_income":20000000000,"ebitda":30000000000}},
-         {{"quarter":"Q1 2025","revenue":81000000000,"net_income":19500000000,"ebitda":29000000000}}
-       ],
-       "sources": ["https://...", "https://..."]
-     }}
+1) NUMBERS:
+   - Quote figures exactly as given by {figures_from}; do NOT make up or re-derive values.
    - Quarter labels MUST be "Q# YYYY" (e.g., "Q2 2025").
-   - Values MUST be numeric (integers in USD), not strings, no commas.
-   - Provide >= 8 quarters when available. If EBITDA missing in sources, omit the key (don't infer).
-   - Ensure quarters are consistent across metrics (same set of labels).
+   - The pipeline passes the tool's quarterly data to the analysis and the charts directly:
+     do NOT repeat it as a JSON block or table.
 
 2) SOURCING:
-   - Every metric series MUST be traceable to cited sources (IR releases, SEC filings, reputable financial data providers).
+   - Every figure MUST be traceable to the tool data or cited sources (IR releases, SEC filings, reputable financial data providers).
    - If two sources disagree, prefer the primary source and note the discrepancy.
 
 3) DATA HYGIENE:
    - Do NOT mix annual and quarterly values.
-   - Do NOT include ratios or per-share metrics in quarterly_financials (those can be separate).
    - If the tool returns dates (Timestamps), convert them to "Q# YYYY".
 
-OUTPUT FORMAT (return BOTH parts below):
-A) HUMAN SUMMARY (markdown, concise, 5–8 bullets).
-B) JSON BLOCK (exact markers, valid JSON):
-=== QUARTERLY DATA (returned) ===
-{{ JSON here exactly as described above }}
-=== END ===
+OUTPUT FORMAT:
+HUMAN SUMMARY (markdown, concise, 5–8 bullets), followed by the source URLs you relied on.
 """.strip()
 
-    if dependencies:
-        dep_outputs = "\n\n".join(
-            f"Dependency output from {getattr(dep.agent, 'role', 'previous task')}:\n{getattr(dep, 'output', '')}"
-            for dep in dependencies
-        )
+    if data_section:
+        description += f"\n\n{data_section}"
+
+    # kompakt kontext (bullets, siffror, källor) inom en token-budget i stället för rå output
+    context = compact_dependencies(dependencies, RESEARCH_CONTEXT_TOKENS)
+    if context:
         description += (
             "\n\nCONTEXT FROM PREVIOUS TASKS\n"
-            f"{dep_outputs}"
+            f"{context}"
         )
 
     expected_output = f"""
-- Clear, sourced quarterly financials for {company_name} (>=8 quarters when available).
-- Human summary + JSON block exactly between markers.
-- Sources list included in the JSON ("sources": [...]).
+- A concise, sourced human summary of {company_name}'s quarterly financials (>=8 quarters when available).
+- No JSON block: the quarterly figures come straight from the financial_data tool.
+- Source URLs listed after the summary.
 """.strip()
 
     return Task(
         description=description,
         agent=agent,
         expected_output=expected_output,
-        dependencies=dependencies,
+        context=[],  # inte CrewAI:s standard (all tidigare rå output); kontexten står komprimerad i beskrivningen
         sources=sources,
     )
-
-
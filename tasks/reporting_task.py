@@ -1,6 +1,6 @@
 import re
 from crewai import Task, Agent
-from agents.agents.report_utils import format_report_md  # harmless cleanup util
+from tasks.context import REPORTING_CONTEXT_TOKENS, compact_dependencies
 
 # Optional: keep the old single-task API but make it explicit it shouldn't be used.
 def create_reporting_task(*args, **kwargs):
@@ -10,20 +10,8 @@ def create_reporting_task(*args, **kwargs):
     )
 
 def _dependency_snippets(dependencies) -> str:
-    """Collect short, cleaned excerpts from upstream tasks."""
-    parts = []
-    for dep in dependencies or []:
-        out = getattr(dep, "output", None)
-        if not out:
-            continue
-        s = getattr(out, "raw", None)
-        s = s if isinstance(s, str) else str(out)
-        if len(s) > 1200:
-            s = s[:1200] + "... [truncated]"
-        s = format_report_md(s)  # light cleanup (e.g., fix malformed md)
-        role = getattr(getattr(dep, "agent", None), "role", "previous task")
-        parts.append(f"From {role}:\n{s}")
-    return "\n\n".join(parts) if parts else "No prior text."
+    """Compact, deduplicated context from upstream tasks within the reporting token budget."""
+    return compact_dependencies(dependencies, REPORTING_CONTEXT_TOKENS, include_payload=False) or "No prior text."
 
 def _latest_quarter_from_sources(sources) -> str:
     """Try to detect 'Qx 20xx' in sources; fall back to a generic label."""
@@ -76,7 +64,7 @@ def create_chunked_reporting_tasks(
         description=t1_desc,
         agent=agent,
         expected_output="Executive Summary (2–3 paragraphs) ending with '--- End of Executive Summary ---'.",
-        dependencies=dependencies,
+        context=[],  # komprimerad kontext står redan i INPUT
         sources=sources,  # for context only; the agent must not list sources
     )
 
@@ -102,7 +90,7 @@ def create_chunked_reporting_tasks(
         description=t2_desc,
         agent=agent,
         expected_output="Recommendations list (3–4 bullets) ending with '--- End of Recommendations ---'.",
-        dependencies=dependencies,
+        context=[],  # komprimerad kontext står redan i INPUT
         sources=sources,  # context only
     )
 
@@ -51,6 +51,6 @@ def create_web_search_task(
         description=description,
         agent=agent,
         expected_output=expected_output,
-        dependencies=dependencies,
+        context=[],  # inte CrewAI:s standard (all tidigare rå output)
         sources=sources,
     )
@@ -0,0 +1,164 @@
+"""Reference for the quarterly_df tests and benchmark.
+
+`legacy_quarterly_df` is chart_utils.quarterly_df as it was before it was
+vectorized, and `make_payloads` builds yfinance-shaped payloads
+(index = ~30 line items, columns = quarters) to compare the two on.
+"""
+import numpy as np
+import pandas as pd
+
+from chart_utils import METRIC_ALIASES, _ensure_metric_index_quarter_columns
+
+LINE_ITEMS = [
+    "Total Revenue", "Cost Of Revenue", "Gross Profit", "Operating Expense", "Operating Income",
+    "Net Income", "EBITDA", "EBIT", "Interest Expense", "Tax Provision", "Diluted EPS", "Basic EPS",
+    "Research And Development", "Selling General And Administration", "Normalized EBITDA",
+    "Net Income Common Stockholders", "Total Expenses", "Pretax Income", "Other Income Expense",
+    "Depreciation And Amortization", "Reconciled Depreciation", "Diluted Average Shares",
+    "Basic Average Shares", "Interest Income", "Net Interest Income", "Operating Revenue",
+    "Total Operating Income As Reported", "Special Income Charges", "Tax Rate For Calcs", "Sales",
+]
+
+
+# --- legacy (chart_utils före vektoriseringen) ---
+def _legacy_normalize_metric_name(name):
+    n = str(name).strip().lower()
+    for std, alts in METRIC_ALIASES.items():
+        if n == std or any(n == a for a in alts):
+            return std
+    return None
+
+
+def _legacy_quarter_to_ts(q):
+    import re
+    s = str(q).strip().upper()
+    m1 = re.search(r"(Q[1-4])\s*[-_/ ]?\s*(\d{4})", s)
+    m2 = re.search(r"(\d{4})\s*[-_/ ]?\s*Q([1-4])", s)
+    if m1:
+        s_norm = f"{m1.group(2)}Q{m1.group(1)[1]}"
+    elif m2:
+        s_norm = f"{m2.group(1)}Q{m2.group(2)}"
+    else:
+        try:
+            return pd.to_datetime(s)
+        except Exception:
+            raise ValueError(f"Kan inte tolka kvartal: {q}")
+    return pd.Period(s_norm, freq="Q").to_timestamp(how="end")
+
+
+def legacy_quarterly_df(raw):
+    """chart_utils.quarterly_df före vektoriseringen (referens för benchmark och test)."""
+    import json, re, pandas as pd
+
+    data = raw
+
+    # 0) Om en lång text: extrahera JSON-block efter rubriken
+    if isinstance(raw, str):
+        m = re.search(
+            r"===\s*QUARTERLY DATA\s*\(returned\).*?===\s*(.*?)\s*(?:(?:===)|\Z)",
+            raw, flags=re.S | re.I
+        )
+        if m:
+            candidate = m.group(1).strip()
+            if candidate.upper() == "OK":
+                raise ValueError("QUARTERLY DATA är 'OK' (inga data ännu).")
+            try:
+                data = json.loads(candidate)
+            except json.JSONDecodeError:
+                raise ValueError("Kunde inte tolka QUARTERLY DATA som JSON.")
+
+    # 1) Fall: {"quarters": [...]}
+    if isinstance(data, dict) and "quarters" in data:
+        rows = data["quarters"]
+        df = pd.DataFrame(rows)
+
+    # 2) Fall: {"quarterly_financials": <df|dict>} (din nuvarande struktur)
+    elif isinstance(data, dict) and "quarterly_financials" in data:
+        qf = data["quarterly_financials"]
+        qf_df = _ensure_metric_index_quarter_columns(qf)
+
+        # Bygg radbaserad tabell: en rad per quarter
+        out_rows = []
+        for q in qf_df.columns:
+            row = {"quarter": q}
+            # hitta alias per metric
+            for std_name, aliases in METRIC_ALIASES.items():
+                # leta i index efter någon alias
+                for ix in qf_df.index:
+                    norm = _legacy_normalize_metric_name(ix)
+                    if norm == std_name:
+                        val = qf_df.loc[ix, q]
+                        row[std_name] = pd.to_numeric(val, errors="coerce")
+                # om inget träff: lämna tomt
+            out_rows.append(row)
+        df = pd.DataFrame(out_rows)
+
+    # 3) Fall: dict som antingen {quarter: {metric: val}} eller {metric: {quarter: val}}
+    elif isinstance(data, dict):
+        # Heuristik: om nycklar ser ut som quarters → tolka som {quarter: {...}}
+        keys = list(data.keys())
+        def looks_like_quarter(x):
+            return bool(re.search(r"Q[1-4].*\d{4}|\d{4}.*Q[1-4]", str(x), re.I))
+        if any(looks_like_quarter(k) for k in keys):
+            # { "Q2 2025": {"Revenue": 82e9, ...}, ... }
+            rows = []
+            for q, metrics in data.items():
+                row = {"quarter": q}
+                if isinstance(metrics, dict):
+                    for k, v in metrics.items():
+                        norm = _legacy_normalize_metric_name(k)
+                        if norm:
+                            row[norm] = pd.to_numeric(v, errors="coerce")
+                rows.append(row)
+            df = pd.DataFrame(rows)
+        else:
+            # antag {metric: {quarter: val}}
+            qf_df = _ensure_metric_index_quarter_columns(data)
+            out_rows = []
+            for q in qf_df.columns:
+                row = {"quarter": q}
+                for ix in qf_df.index:
+                    norm = _legacy_normalize_metric_name(ix)
+                    if norm:
+                        row[norm] = pd.to_numeric(qf_df.loc[ix, q], errors="coerce")
+                out_rows.append(row)
+            df = pd.DataFrame(out_rows)
+
+    # 4) Fall: list[dict]
+    elif isinstance(data, list):
+        df = pd.DataFrame(data)
+
+    else:
+        raise ValueError(f"Oväntat format för quarterly data: {type(data).__name__}")
+
+    if "quarter" not in df.columns:
+        raise ValueError("Saknar kolumn 'quarter' efter normalisering.")
+
+    # Tidsaxel
+    df["quarter"] = df["quarter"].apply(_legacy_quarter_to_ts)
+
+    # Säkerställ numerik
+    for c in ["revenue", "net_income", "ebitda"]:
+        if c in df.columns:
+            df[c] = pd.to_numeric(df[c], errors="coerce")
+
+    # Sortera och rensa tomma rader
+    df = df.sort_values("quarter").reset_index(drop=True)
+    if {"revenue", "net_income", "ebitda"}.isdisjoint(df.columns):
+        # inga kända metriker hittades – låt altair-del hantera detta
+        pass
+
+    return df
+
+
+def make_payloads(companies=20, quarters=40, seed=0):
+    """{"quarterly_financials": DataFrame} per bolag, kvartalsetiketter i blandade format."""
+    rng = np.random.default_rng(seed)
+    labels = [f"Q{q % 4 + 1} {2000 + q // 4}" for q in range(quarters)]
+    payloads = []
+    for c in range(companies):
+        cols = labels if c % 2 == 0 else [l.split()[1] + "-" + l.split()[0] for l in labels]
+        frame = pd.DataFrame(rng.normal(1e9, 2e8, (len(LINE_ITEMS), quarters)), index=LINE_ITEMS, columns=cols)
+        frame.iloc[rng.integers(0, len(LINE_ITEMS), 5), rng.integers(0, quarters, 5)] = np.nan
+        payloads.append({"quarterly_financials": frame})
+    return payloads
@@ -0,0 +1,98 @@
+import sys
+import os
+import json
+from types import SimpleNamespace
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from crewai import Agent, Crew
+from crewai.llms.base_llm import BaseLLM
+
+from tasks.context import CompactContext, compact_dependencies, count_tokens
+from tasks.financial_research_task import create_financial_research_task
+from tasks.web_search_task import create_web_search_task
+
+PAYLOAD = {
+    "quarterly_financials": {"Total Revenue": {"Q2 2025": 56100000000, "Q1 2025": 55000000000}},
+    "quarters": [{"quarter": "Q2 2025", "revenue": 56100000000}],
+    "sources": ["https://example.com/q2"],
+}
+BLOCK = "=== QUARTERLY DATA (returned) ===\n" + json.dumps(PAYLOAD, indent=2) + "\n=== END ==="
+
+
+def _dep(role, raw):
+    return SimpleNamespace(output=SimpleNamespace(raw=raw), agent=SimpleNamespace(role=role))
+
+
+def _deps():
+    web = (
+        "1. Revenue rose 5% to SEK 56,100 million in Q2 2025.\n"
+        "   Source: [Q2 report](https://example.com/q2?utm_source=news)\n"
+        "2. Demand in North America grew 12%.\n"
+    )
+    research = f"- Revenue rose 5% to SEK 56,100 million in Q2 2025.\n- Margin improved to 40.1%.\n\n{BLOCK}\n"
+    analysis = f"- Revenue up 5% YoY.\n- Risk: currency headwinds.\n\n{BLOCK}\n"
+    return [_dep("web", web), _dep("research", research), _dep("analysis", analysis)]
+
+
+def test_payload_is_parsed_once_and_points_are_deduplicated_latest_first():
+    ctx = CompactContext.from_dependencies(_deps())
+
+    assert ctx.payload == {"quarterly_financials": PAYLOAD["quarterly_financials"]}
+    assert ctx.payload_from == "analysis"
+    assert ctx.bullets[:2] == ["- Revenue up 5% YoY.", "- Risk: currency headwinds."]
+    assert sum("56,100" in b for b in ctx.bullets) == 1
+    assert ctx.urls == ["https://example.com/q2"]
+
+    text = ctx.render(1000)
+    assert text.count("Total Revenue") == 1
+    assert "=== QUARTERLY DATA" not in text
+
+
+def test_render_respects_budget_and_empty_dependencies_give_nothing():
+    deps = _deps() + [_dep("filler", "\n".join(f"- Point {i} about the quarter." for i in range(200)))]
+    for budget in (25, 200, 600):
+        assert count_tokens(compact_dependencies(deps, budget)) <= budget
+    # payloaden får inte plats i 25 tokens, punkterna gör det
+    assert compact_dependencies(deps, 25).startswith("KEY POINTS:")
+    assert compact_dependencies(deps, 200).startswith("QUARTERLY DATA")
+    assert "QUARTERLY DATA" not in compact_dependencies(deps, 1000, include_payload=False)
+
+    pending = SimpleNamespace(output=None, agent=SimpleNamespace(role="web"))
+    assert compact_dependencies([pending], 500) == ""
+    assert compact_dependencies([], 500) == ""
+
+
+class RecordingLLM(BaseLLM):
+    """Returns canned answers and keeps every prompt CrewAI sends."""
+
+    answer: str = ""
+    prompts: list = []
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        self.prompts.append("\n".join(m["content"] for m in messages) if isinstance(messages, list) else messages)
+        return f"Final Answer: {self.answer}"
+
+
+def _kickoff(llm, task_factory):
+    agent = Agent(role="Analyst", goal="Answer", backstory="Test", llm=llm, max_iter=1, verbose=False)
+    task = task_factory(agent)
+    Crew(agents=[agent], tasks=[task], verbose=False).kickoff()
+    return task
+
+
+def test_crew_prompt_gets_compact_context_instead_of_raw_upstream_output():
+    padding = "This paragraph is only padding and carries nothing worth keeping"
+    web_llm = RecordingLLM(model="stub", answer=f"- Revenue rose 5% to SEK 56,100 million in Q2 2025.\n{padding}.")
+    web = _kickoff(web_llm, lambda agent: create_web_search_task(agent, "Volvo"))
+
+    # byggs efter att web search har kört, som i main._prepare_financial_research
+    research_llm = RecordingLLM(model="stub", answer="- Summary.")
+    research = _kickoff(research_llm, lambda agent: create_financial_research_task(agent, "Volvo", dependencies=[web]))
+
+    assert research.context == []
+    prompt = research_llm.prompts[0]
+    assert "CONTEXT FROM PREVIOUS TASKS\nKEY POINTS:\n- Revenue rose 5% to SEK 56,100 million in Q2 2025." in prompt
+    assert padding not in prompt
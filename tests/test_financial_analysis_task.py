@@ -0,0 +1,63 @@
+import sys
+import os
+import json
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tasks.financial_analysis_task import create_financial_analysis_task
+from tasks.financial_research_task import create_financial_research_task
+
+QUARTERLY = {
+    "quarterly_financials": {"Total Revenue": {"Q2 2025": 56100000000, "Q1 2025": 55000000000}},
+    "quarters": [{"quarter": "Q1 2025", "revenue": 55000000000}, {"quarter": "Q2 2025", "revenue": 56100000000}],
+}
+MARKER = "=== QUARTERLY DATA (returned) ==="
+
+
+def test_tool_data_is_attached_and_no_json_block_is_requested():
+    research = create_financial_research_task(None, "Volvo", quarterly_data=QUARTERLY)
+    # exakta heltal i prompten, kompakt och bara serierna
+    assert json.dumps(QUARTERLY["quarterly_financials"], separators=(",", ":")) in research.description
+
+    # analysen får färdigräknade nyckeltal i stället för rådatan
+    analysis = create_financial_analysis_task(None, "Volvo", quarterly_data=QUARTERLY)
+    assert "COMPUTED METRICS" in analysis.description
+    assert "- Revenue Q2 2025: 56.10B; QoQ +2.0%" in analysis.description
+    assert "Compute YoY %" not in analysis.description
+    # rådatan följer med bredvid nyckeltalen (serier som nyckeltalen inte täcker)
+    assert '"Total Revenue":{"Q2 2025":56100000000' in analysis.description
+
+    for task in (research, analysis):
+        assert MARKER not in task.description
+        assert "Do NOT call `financial_data` again" in task.description
+
+
+def test_analysis_falls_back_to_json_block_without_tool_data():
+    task = create_financial_analysis_task(None, "Volvo")
+    assert MARKER in task.description
+    assert "MUST call the tool named EXACTLY `financial_data`" in task.description
+    assert "QUARTERLY DATA (exact" not in task.description
+
+
+def test_research_does_not_fetch_data_the_pipeline_fetches_in_parallel():
+    task = create_financial_research_task(None, "Volvo", data_fetched_separately=True)
+    assert "Do NOT call `financial_data`" in task.description
+    assert "MUST call the `financial_data` tool" not in task.description
+    assert "MUST call the `financial_data` tool" in create_financial_research_task(None, "Volvo").description
+
+
+def test_analysis_keeps_the_latest_quarters_of_every_series():
+    labels = [f"Q{q} {y}" for y in (2023, 2024, 2025) for q in (1, 2, 3, 4)]
+    data = {
+        "quarterly_financials": {
+            "Total Revenue": {label: 1000 + i for i, label in enumerate(labels)},
+            "Gross Profit": {label: 400 + i for i, label in enumerate(labels)},
+        },
+        "quarters": [{"quarter": label, "revenue": 1000 + i} for i, label in enumerate(labels)],
+    }
+    task = create_financial_analysis_task(None, "Volvo", quarterly_data=data)
+    assert "COMPUTED METRICS" in task.description
+    assert '"Gross Profit":{' in task.description and '"Q4 2025":411' in task.description
+    assert '"Q4 2023"' not in task.description and '"Q1 2024":404' in task.description
+    assert "Use the latest 8 quarters" in task.description
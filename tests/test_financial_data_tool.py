@@ -0,0 +1,196 @@
+import sys
+import os
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import yfinance
+from tools import create_financial_data_tool
+from tools import http_client
+from tools.cache import DatasetCache
+from tools.snapshot import DATASETS, TickerSnapshot
+
+
+def _quarterly_frame():
+    cols = [pd.Timestamp("2025-06-30"), pd.Timestamp("2025-03-31")]
+    return pd.DataFrame(
+        {cols[0]: [82_000, 20_000], cols[1]: [81_000, 19_500]},
+        index=["Total Revenue", "Net Income"],
+    )
+
+
+class StubTicker:
+    """Stand-in for yf.Ticker that records every remote attribute read."""
+
+    calls: list = []
+    offline = False
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    def _fetch(self, name, value):
+        if StubTicker.offline:
+            raise ConnectionError("no network")
+        StubTicker.calls.append((self.symbol, name))
+        return value
+
+    @property
+    def info(self):
+        return self._fetch("info", {"shortName": "Stub Corp", "regularMarketPrice": 10.0})
+
+    @property
+    def quarterly_financials(self):
+        return self._fetch("quarterly_financials", _quarterly_frame())
+
+    @property
+    def financials(self):
+        return self._fetch("financials", pd.DataFrame())
+
+    @property
+    def quarterly_balance_sheet(self):
+        return self._fetch("quarterly_balance_sheet", pd.DataFrame())
+
+    @property
+    def balance_sheet(self):
+        return self._fetch("balance_sheet", pd.DataFrame())
+
+    @property
+    def quarterly_cashflow(self):
+        return self._fetch("quarterly_cashflow", pd.DataFrame())
+
+    @property
+    def cashflow(self):
+        return self._fetch("cashflow", pd.DataFrame())
+
+    def history(self, period="2y"):
+        idx = pd.to_datetime(["2025-06-02", "2025-06-03"])
+        return self._fetch("history", pd.DataFrame({"Close": [10.0, 10.5]}, index=idx))
+
+
+@pytest.fixture
+def stub_ticker(monkeypatch):
+    StubTicker.calls = []
+    StubTicker.offline = False
+    monkeypatch.setattr(yfinance, "Ticker", StubTicker)
+    monkeypatch.setattr(http_client, "_limiter", http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    return StubTicker
+
+
+def test_cache_serves_repeat_calls_without_refetching(stub_ticker, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache.sqlite"))
+    get_financial_data = create_financial_data_tool(cache=cache)["function"]
+
+    first = get_financial_data("STUB")
+    n_calls = len(stub_ticker.calls)
+    second = get_financial_data("STUB")
+
+    assert "error" not in first
+    assert len(stub_ticker.calls) == n_calls
+    assert second["quarters"] == first["quarters"]
+    assert second["stale"] is False
+
+
+def test_cache_marks_expired_entries_as_stale_when_offline(stub_ticker, tmp_path):
+    cache = DatasetCache(str(tmp_path / "cache.sqlite"), ttls={"history": 0})
+    get_financial_data = create_financial_data_tool(cache=cache)["function"]
+    get_financial_data("STUB")
+
+    stub_ticker.offline = True
+    data = get_financial_data("STUB")
+
+    assert "error" not in data
+    assert data["stale"] is True
+    assert data["stale_datasets"] == ["history"]
+    assert data["price_history_2y"]["Close"]
+
+
+def test_each_dataset_is_fetched_once_per_call(stub_ticker, monkeypatch):
+    monkeypatch.setenv("FINANCIAL_DATA_CACHE", "off")
+    get_financial_data = create_financial_data_tool()["function"]
+
+    data = get_financial_data("STUB")
+
+    # info (från ticker-gissningen) + 6 rapporter + history
+    assert "error" not in data
+    assert data["remote_fetches"] == 8
+    assert len(stub_ticker.calls) == 8
+    assert [name for _, name in stub_ticker.calls].count("info") == 1
+    assert data["company_info"]["shortName"] == "Stub Corp"
+
+
+def test_failed_dataset_is_dropped_instead_of_failing_the_call(stub_ticker, monkeypatch):
+    monkeypatch.setenv("FINANCIAL_DATA_CACHE", "off")
+
+    def broken(self):
+        raise ConnectionError("cashflow endpoint down")
+
+    monkeypatch.setattr(StubTicker, "cashflow", property(broken))
+    data = create_financial_data_tool()["function"]("STUB")
+
+    assert "error" not in data
+    assert "cashflow" not in data
+    assert data["missing_datasets"] == ["cashflow"]
+    assert data["quarters"]
+
+
+def test_deadline_starts_when_the_dataset_call_starts_not_when_it_is_queued(stub_ticker, monkeypatch):
+    # en worker som redan är upptagen längre än timeout: köad tid får inte räknas
+    pool = ThreadPoolExecutor(max_workers=1)
+    release = threading.Event()
+    pool.submit(release.wait, 5)
+    threading.Timer(0.4, release.set).start()
+
+    snap = TickerSnapshot("STUB", ticker_factory=StubTicker, timeout=0.2, executor=pool).fetch()
+    assert snap.missing_datasets == []
+    assert snap.remote_fetches == 8
+
+    # ett dataset som självt är långsammare än timeout släpps fortfarande
+    def slow(self):
+        time.sleep(0.5)
+        return pd.DataFrame()
+
+    monkeypatch.setattr(StubTicker, "cashflow", property(slow))
+    snap = TickerSnapshot("STUB", ticker_factory=StubTicker, timeout=0.2, executor=pool).fetch()
+    assert snap.missing_datasets == ["cashflow"]
+
+    # kön bevakas separat av queue_timeout
+    blocker = threading.Event()
+    pool.submit(blocker.wait, 5)
+    snap = TickerSnapshot("STUB", ticker_factory=StubTicker, timeout=0.2, executor=pool, queue_timeout=0.1).fetch()
+    blocker.set()
+    assert snap.missing_datasets == list(DATASETS) and snap.remote_fetches == 0
+    pool.shutdown(wait=True)
+
+
+def test_hung_yahoo_calls_do_not_starve_the_shared_pool(stub_ticker, monkeypatch):
+    from tools import snapshot
+
+    monkeypatch.setattr(snapshot, "FETCH_WORKERS", 4)
+    monkeypatch.setattr(snapshot, "_pool", None)
+    monkeypatch.setattr(snapshot, "_stuck", set())
+    hang = threading.Event()
+
+    def hung(self):
+        hang.wait(5)
+        return pd.DataFrame()
+
+    first = snapshot._fetch_pool()
+    with monkeypatch.context() as m:
+        m.setattr(StubTicker, "cashflow", property(hung))
+        m.setattr(StubTicker, "balance_sheet", property(hung))
+        snap = TickerSnapshot("STUB", ticker_factory=StubTicker, timeout=0.2).fetch()
+    assert sorted(snap.missing_datasets) == ["balance_sheet", "cashflow"]
+
+    # två av fyra workers hänger: nästa snapshot får en ny pool i stället för att köa bakom dem
+    assert snapshot._fetch_pool() is not first and not snapshot._stuck
+    snap = TickerSnapshot("STUB", ticker_factory=StubTicker, timeout=0.2, queue_timeout=0.5).fetch()
+    hang.set()
+    assert snap.missing_datasets == []
+    snapshot._fetch_pool().shutdown(wait=True)
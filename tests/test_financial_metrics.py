@@ -0,0 +1,58 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from financial_metrics import QuarterlyMetrics, metric_facts
+from quarterly_store import QuarterlyStore
+
+LABELS = [f"Q{q} {y}" for y in (2023, 2024) for q in (1, 2, 3, 4)] + ["Q1 2025"]
+
+
+def _rows():
+    rows = []
+    for k, label in enumerate(LABELS):
+        row = {"quarter": label, "revenue": 100 + 10 * k, "net_income": -20 + 5 * k}
+        if label == "Q3 2023":
+            row["ebitda"] = 30
+        rows.append(row)
+    return list(reversed(rows))  # ordningen i indata spelar ingen roll
+
+
+def test_growth_ttm_margins_and_cagr():
+    qm = QuarterlyMetrics.from_rows({"A": _rows(), "B": [{"quarter": "Q4 2024", "revenue": 5}]})
+    rev, ni = qm.values[0, 0], qm.values[0, 1]
+
+    assert qm.values.shape == (2, 3, 9)
+    assert np.isclose(qm.yoy[0, 0, -1], 180 / 140 - 1)               # Q1 2025 mot Q1 2024
+    assert np.isclose(qm.qoq[0, 0, -1], 180 / 170 - 1)
+    assert np.isclose(qm.yoy[0, 1, 4], (0 - -20) / 20)                # förlust → noll: +100 %
+    assert np.isnan(qm.qoq[0, 1, 5])                                  # föregående värde 0
+    assert qm.ttm[0, 0, -1] == rev[-4:].sum() and np.isnan(qm.ttm[0, 0, 2])
+    assert np.isclose(qm.margins["net_margin"][0, -1], ni[-1] / rev[-1])
+    assert np.isclose(qm.cagr[0, 0], (rev[-4:].sum() / rev[:4].sum()) ** (4 / 5) - 1)
+    assert np.isnan(qm.cagr[0, 2]) and np.isnan(qm.ttm[0, 2]).all()   # EBITDA: ett enda kvartal
+    assert np.isnan(qm.values[1, 0, :-2]).all() and qm.values[1, 0, -2] == 5
+
+    expected = pd.Series(qm.qoq[0, 0]).rolling(4).std().to_numpy()
+    assert np.allclose(qm.volatility[0, 0], expected, equal_nan=True)
+
+
+def test_from_store_matches_rows_and_facts_read_latest_quarter():
+    store = QuarterlyStore()
+    for row in _rows():
+        store.add_series("A", "Total Revenue", {row["quarter"]: row["revenue"]})
+        store.add_series("A", "Net Income", {row["quarter"]: row["net_income"]})
+    qm = QuarterlyMetrics.from_store(store, {"Total Revenue": "revenue", "Net Income": "net_income"})
+    assert np.allclose(qm.values, QuarterlyMetrics.from_rows({"A": _rows()}, ("revenue", "net_income")).values)
+
+    facts = metric_facts(_rows())
+    assert facts[0] == "- Latest quarter: Q1 2025"
+    assert "- Revenue Q1 2025: 180; YoY +28.6% vs Q1 2024 (140); QoQ +5.9%; TTM 660" in facts
+    assert "- Net margin Q1 2025: 11.1% (Q1 2024: 0.0%)" in facts
+    assert not any(f.startswith("- EBITDA") for f in facts)
+    assert metric_facts([]) == metric_facts([{"quarter": "n/a", "revenue": 1}]) == []
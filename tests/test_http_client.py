@@ -0,0 +1,102 @@
+import sys
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools import http_client
+from tools.http_client import HostRateLimiter, TokenBucket, build_retry, build_session
+
+
+@pytest.fixture
+def stub_server():
+    """Local server that answers with the queued statuses, then 200."""
+    statuses: list[int] = []
+    seen: list[str] = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            seen.append(self.path)
+            status = statuses.pop(0) if statuses else 200
+            body = b'{"quotes": [{"symbol": "STUB"}]}' if status == 200 else b"busy"
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", statuses, seen
+    server.shutdown()
+    server.server_close()
+
+
+def test_session_retries_throttling_and_server_errors(stub_server):
+    url, statuses, seen = stub_server
+    statuses.extend([429, 503])
+    session = build_session(limiter=HostRateLimiter(rates={}, default=(1e6, 1000)), backoff_factor=0.01)
+
+    resp = session.get(f"{url}/v1/finance/search", params={"q": "Stub Corp"}, timeout=5)
+
+    assert resp.status_code == 200
+    assert resp.json()["quotes"][0]["symbol"] == "STUB"
+    assert seen == ["/v1/finance/search?q=Stub+Corp"] * 3
+
+
+def test_session_gives_up_after_the_retry_budget(stub_server):
+    url, statuses, seen = stub_server
+    statuses.extend([429] * 5)
+    session = build_session(limiter=HostRateLimiter(rates={}, default=(1e6, 1000)), retries=1, backoff_factor=0.01)
+
+    assert session.get(url, timeout=5).status_code == 429
+    assert len(seen) == 2
+
+
+def test_retries_take_a_token_too(stub_server):
+    url, statuses, seen = stub_server
+    statuses.extend([429, 503])
+    hosts = []
+
+    class CountingLimiter(HostRateLimiter):
+        def acquire(self, host):
+            hosts.append(host)
+            return super().acquire(host)
+
+    session = build_session(limiter=CountingLimiter(rates={}, default=(1e6, 1000)), backoff_factor=0.01)
+
+    assert session.get(url, timeout=5).status_code == 200
+    assert len(seen) == 3
+    assert hosts == ["127.0.0.1"] * 3  # första anropet + två omförsök
+
+
+def test_retry_works_without_backoff_jitter(monkeypatch):
+    # urllib3 < 2: Retry tar inte backoff_jitter
+    init = http_client.Retry.__init__
+
+    def old_init(self, *args, backoff_jitter=None, **kwargs):
+        if backoff_jitter is not None:
+            raise TypeError("unexpected keyword argument 'backoff_jitter'")
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(http_client.Retry, "__init__", old_init)
+    retry = build_retry(retries=2)
+    assert retry.total == 2 and retry.status_forcelist == http_client.RETRY_STATUSES
+
+
+def test_rate_limiter_buckets_per_host():
+    limiter = HostRateLimiter(rates={"finance.yahoo.com": (50.0, 2)})
+    assert limiter.bucket("query1.finance.yahoo.com") is limiter.bucket("query2.finance.yahoo.com")
+    assert limiter.bucket("serpapi.com") is not limiter.bucket("finance.yahoo.com")
+
+    bucket = TokenBucket(rate=50.0, burst=2)
+    waits = [bucket.acquire() for _ in range(4)]
+    assert waits[:2] == [0.0, 0.0]
+    assert waits[2] > 0 and waits[3] > 0
+    assert sum(waits) >= 0.035  # 2 tokens utöver burst à 20 ms
@@ -0,0 +1,88 @@
+import sys
+import os
+
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from crewai import Agent, Crew, Task
+from crewai.llms.base_llm import BaseLLM
+from langchain_core.language_models.fake import FakeListLLM
+from langchain_core.outputs import Generation
+
+from llm_cache import CachedCrewLLM, LLMCacheMiss, LLMResponseCache, get_llm_cache, llm_cache_mode
+
+
+def test_identical_prompt_is_served_from_cache(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"))
+    llm = FakeListLLM(responses=["first answer", "second answer"], cache=cache)
+
+    assert llm.invoke("Summarize Ericsson Q2 2025") == "first answer"
+    assert llm.invoke("Summarize Ericsson Q2 2025") == "first answer"
+    assert llm.invoke("Summarize Tesla Q2 2025") == "second answer"
+
+
+def test_cache_is_opt_in(monkeypatch):
+    # "on" återspelar gamla svar utan utgångstid – ska aldrig vara på för vanliga körningar
+    monkeypatch.delenv("LLM_CACHE_MODE", raising=False)
+    assert llm_cache_mode() == "off" and get_llm_cache() is None
+    monkeypatch.setenv("LLM_CACHE_MODE", "sometimes")
+    assert llm_cache_mode() == "off"
+
+
+def test_replay_mode_never_calls_the_model_on_a_miss(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    FakeListLLM(responses=["recorded"], cache=LLMResponseCache(path)).invoke("recorded prompt")
+
+    replay = FakeListLLM(responses=["recorded"], cache=LLMResponseCache(path, replay=True))
+
+    assert replay.invoke("recorded prompt") == "recorded"
+    with pytest.raises(LLMCacheMiss):
+        replay.invoke("new prompt")
+
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(tmp_path):
+    cache = LLMResponseCache(str(tmp_path / "llm.sqlite"), max_bytes=5_000)
+    big = [Generation(text=os.urandom(3000).hex())]  # ~3 KB komprimerat
+
+    cache.update("a", "llm", big)
+    cache.update("b", "llm", big)  # över gränsen → "a" (äldst) försvinner
+
+    assert cache.lookup("a", "llm") is None
+    assert cache.lookup("b", "llm")[0].text == big[0].text
+    assert cache.size_bytes() <= 5_000
+
+
+class ScriptedLLM(BaseLLM):
+    """Stand-in for the provider LLM CrewAI would build; counts real calls."""
+
+    calls: int = 0
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None,
+             from_task=None, from_agent=None, response_model=None):
+        self.calls += 1
+        return f"Final Answer: answer {self.calls}"
+
+
+def _run_crew(llm, description):
+    agent = Agent(role="Analyst", goal="Answer", backstory="Test", llm=llm, max_iter=1, verbose=False)
+    task = Task(description=description, expected_output="One line", agent=agent)
+    return Crew(agents=[agent], tasks=[task], verbose=False).kickoff().raw
+
+
+def test_crew_calls_go_through_the_cache_and_replay_raises_on_a_miss(tmp_path):
+    path = str(tmp_path / "llm.sqlite")
+    inner = ScriptedLLM(model="gpt-4o-mini", temperature=0.7)
+    llm = CachedCrewLLM.wrap(inner, LLMResponseCache(path))
+
+    assert _run_crew(llm, "Summarize Ericsson") == "answer 1"
+    assert _run_crew(llm, "Summarize Ericsson") == "answer 1"
+    assert inner.calls == 1
+
+    replay_inner = ScriptedLLM(model="gpt-4o-mini", temperature=0.7)
+    replay = CachedCrewLLM.wrap(replay_inner, LLMResponseCache(path, replay=True))
+    assert _run_crew(replay, "Summarize Ericsson") == "answer 1"
+    with pytest.raises(LLMCacheMiss):
+        _run_crew(replay, "Summarize Tesla")
+    assert replay_inner.calls == 0
@@ -0,0 +1,61 @@
+import sys
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.price_history import PriceHistory
+
+
+def _history():
+    idx = pd.bdate_range("2025-03-27", periods=5, tz="America/New_York")  # över sommartidsbytet
+    return pd.DataFrame({
+        "Close": [101.25, np.nan, 99.1, 100.0, 123.45],
+        "Volume": [1_200_000, 900_000, 1_000_000, 123_456_789, 800_000],
+        "Dividends": 0.0,
+    }, index=idx)
+
+
+def test_mapping_view_matches_the_old_dicts():
+    hist = _history()
+    legacy = {k: {str(idx): v for idx, v in hist[k].dropna().items()} for k in ("Close", "Volume")}
+
+    ph = PriceHistory.from_frame(hist, ["Open", "Close", "Volume"])
+
+    assert list(ph) == ["Close", "Volume"]
+    assert ph.to_dict() == legacy
+    assert ph["Close"]["2025-04-02 00:00:00-04:00"] == 123.45
+    assert ph.days.dtype == np.int32 and ph.column("Close").dtype == np.float32
+    assert not PriceHistory.from_frame(pd.DataFrame())
+
+
+def test_roundtrips_through_pickle_and_frame():
+    ph = PriceHistory.from_frame(_history(), ["Close", "Volume"])
+    ph["Close"]  # bygger dict-vyn, ska inte följa med i pickle
+
+    restored = pickle.loads(pickle.dumps(ph))
+
+    assert restored.to_dict() == ph.to_dict()
+    frame = restored.to_frame()
+    assert list(frame.index) == list(_history().index)
+    assert frame["Volume"].iloc[3] == 123_456_789
+    compact = ph.to_compact()
+    assert compact["start"] == "2025-03-27" and compact["days"] == [0, 1, 4, 5, 6]
+
+
+def test_repr_gives_the_llm_a_price_summary():
+    idx = pd.bdate_range("2024-01-01", "2025-06-30", tz="America/New_York")
+    close = np.linspace(100, 200, len(idx))
+    ph = PriceHistory.from_frame(pd.DataFrame({"Close": close}, index=idx), ["Close"])
+
+    s = ph.summary()
+    assert s["last_date"] == "2025-06-30" and s["last_close"] == 200.0
+    assert s["high_52w"] == 200.0 and 130 < s["low_52w"] < 135
+    assert set(s["returns"]) == {"1m", "3m", "1y"} and 0 < s["returns"]["1m"] < s["returns"]["1y"]
+    text = repr({"price_history_2y": ph})
+    assert "last close 200 on 2025-06-30" in text and "1y return +" in text
+    assert repr(PriceHistory.from_frame(pd.DataFrame())) == "PriceHistory(empty)"
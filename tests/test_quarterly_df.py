@@ -0,0 +1,54 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
+
+import chart_utils as cu
+from legacy_quarterly_df import legacy_quarterly_df, make_payloads
+
+QUARTERS = ["Q3 2024", "Q4 2024", "2025-Q1", "Q2 2025"]
+
+CASES = {
+    "statement_frame": {
+        "quarterly_financials": pd.DataFrame(
+            [[80.0, 85.0, 79.0, 82.0], [9.0, np.nan, 8.5, 10.0], [20.0, 21.0, 19.0, 22.0], [1, 2, 3, 4], [7, 7, 7, 7]],
+            index=["Net Income", "Total Revenue", "EBITDA", "Diluted EPS", "Revenue"],
+            columns=QUARTERS,
+        )
+    },
+    "metric_to_quarter_dict": {
+        "Net Income": dict(zip(QUARTERS, [9, 8, 7, 6])),
+        "Sales": dict(zip(QUARTERS, ["80", "81", "x", "83"])),
+        "Gross Profit": dict(zip(QUARTERS, [1, 2, 3, 4])),
+    },
+    "quarter_to_metric_dict": {q: {"Revenue": 80 + i, "Profit": 5 + i} for i, q in enumerate(QUARTERS)},
+    "row_list": {"quarters": [{"quarter": "2024-06-30", "revenue": 70}, {"quarter": "Q1 2025", "revenue": 75}]},
+    "timestamp_columns": {
+        "quarterly_financials": pd.DataFrame(
+            [[1.0, 2.0], [3.0, 4.0]],
+            index=["Total Revenue", "Net Income"],
+            columns=[pd.Timestamp("2025-06-30"), pd.Timestamp("2025-03-31")],
+        )
+    },
+}
+
+
+@pytest.mark.parametrize("name", list(CASES))
+def test_vectorized_quarterly_df_matches_the_loop_version(name):
+    pd.testing.assert_frame_equal(cu.quarterly_df(CASES[name]), legacy_quarterly_df(CASES[name]))
+
+
+def test_vectorized_quarterly_df_matches_on_large_inputs():
+    for payload in make_payloads(companies=2):
+        pd.testing.assert_frame_equal(cu.quarterly_df(payload), legacy_quarterly_df(payload))
+
+
+def test_unparseable_quarter_still_raises():
+    with pytest.raises(ValueError, match="Kan inte tolka kvartal"):
+        cu.quarterly_df([{"quarter": "next year", "revenue": 1}])
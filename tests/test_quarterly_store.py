@@ -0,0 +1,69 @@
+import sys
+import os
+
+import numpy as np
+import pandas as pd
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from quarterly_store import QuarterlyStore
+
+
+def _statement():
+    return pd.DataFrame(
+        [[82.0, 80.0, np.nan], [9.0, 8.0, 7.0]],
+        index=["Total Revenue", "Net Income"],
+        columns=[pd.Timestamp("2025-06-30"), pd.Timestamp("2025-03-31"), pd.Timestamp("2024-12-31")],
+    )
+
+
+def test_frame_and_payload_round_trip():
+    store = QuarterlyStore()
+    store.add_frame("ERIC", _statement())
+
+    assert len(store) == 5  # NaN hoppas över
+    assert store.to_payload("ERIC") == {
+        "quarterly_financials": {
+            "Total Revenue": {"Q1 2025": 80, "Q2 2025": 82},
+            "Net Income": {"Q4 2024": 7, "Q1 2025": 8, "Q2 2025": 9},
+        }
+    }
+
+    df = store.to_frame("ERIC", rename={"Total Revenue": "revenue", "Net Income": "net_income"})
+    assert list(df.columns) == ["quarter", "revenue", "net_income"]
+    assert df["quarter"].is_monotonic_increasing
+    assert df["revenue"].tolist()[1:] == [80.0, 82.0] and np.isnan(df["revenue"].iloc[0])
+
+
+def test_merge_resolves_conflicts_by_preference():
+    base = QuarterlyStore()
+    base.add_series("ERIC", "Total Revenue", {"Q2 2025": 82, "Q1 2025": 80})
+    update = QuarterlyStore()
+    update.add_series("ERIC", "Total Revenue", {"Q2 2025": 83})
+    update.add_series("NOKIA", "Total Revenue", {"Q2 2025": 45})
+
+    kept = QuarterlyStore().merge(base).merge(update, prefer="self")
+    assert kept.to_payload("ERIC")["quarterly_financials"]["Total Revenue"]["Q2 2025"] == 82
+
+    base.merge(update)
+    assert base.to_payload("ERIC")["quarterly_financials"]["Total Revenue"] == {"Q1 2025": 80, "Q2 2025": 83}
+
+    matrix = base.metric_matrix("Total Revenue")
+    assert list(matrix.index) == ["ERIC", "NOKIA"]
+    assert matrix.loc["NOKIA"].iloc[-1] == 45
+
+
+def test_unparseable_entries_are_kept_and_amounts_stay_integers():
+    store = QuarterlyStore()
+    store.add_payload("X", {"quarterly_financials": {
+        "Total Revenue": {"Q1 2025": 82_000_000_000, "FY 2024": 310_000_000_000, "Q2 2025": "n/a", "Q3 2025": None},
+        "EPS": {"Q1 2025": 1.25},
+    }})
+    store.add_payload("X", {"quarterly_financials": {"Total Revenue": {"Q2 2025": "83000000000"}}})
+
+    payload = store.to_payload("X")["quarterly_financials"]
+    assert payload["Total Revenue"] == {"Q1 2025": 82_000_000_000, "Q2 2025": 83_000_000_000, "FY 2024": 310_000_000_000}
+    assert all(type(v) is int for v in payload["Total Revenue"].values())
+    assert payload["EPS"] == {"Q1 2025": 1.25}
+    assert store.skipped("X") == {"Total Revenue": {"FY 2024": 310_000_000_000, "Q2 2025": "n/a"}}
@@ -0,0 +1,47 @@
+import sys
+import os
+import datetime
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import quarters
+
+
+@pytest.mark.parametrize(
+    "raw, expected",
+    [
+        ("Q2 2025", (2025, 2)),
+        ("q3-2024", (2024, 3)),
+        ("2025Q1", (2025, 1)),
+        ("2024 - Q4", (2024, 4)),
+        (pd.Timestamp("2025-06-30"), (2025, 2)),
+        (datetime.date(2024, 11, 2), (2024, 4)),
+        ("2025-03-31", (2025, 1)),
+        (pd.Period("2023Q3", freq="Q"), (2023, 3)),
+        ("no quarter here", None),
+    ],
+)
+def test_parse_quarter(raw, expected):
+    assert quarters.parse_quarter(raw) == expected
+
+
+def test_label_sort_key_and_quarter_end_agree():
+    labels = ["2025-Q1", pd.Timestamp("2024-12-31"), "Q2 2025", "n/a"]
+
+    assert [quarters.quarter_label(x) for x in labels] == ["Q1 2025", "Q4 2024", "Q2 2025", "n/a"]
+    assert sorted(labels, key=quarters.quarter_sort_key)[1:] == [labels[1], labels[0], labels[2]]
+    assert quarters.quarter_to_ts("Q2 2025") == pd.Period("2025Q2", freq="Q").to_timestamp(how="end")
+    with pytest.raises(ValueError):
+        quarters.quarter_to_ts("n/a")
+
+
+def test_repeated_labels_are_parsed_once():
+    quarters._parse_label.cache_clear()
+    series = quarters.quarters_to_ts(["Q1 2024", "Q2 2024"] * 500)
+
+    assert len(series) == 1000
+    assert quarters._parse_label.cache_info().misses == 2
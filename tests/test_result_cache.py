@@ -0,0 +1,88 @@
+import sys
+import os
+import datetime
+import threading
+import time
+
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from result_cache import AnalysisCache, trading_day
+
+OK = ("## Executive Summary\nfine", [{"url": "https://example.com"}], {"quarters": []})
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_key_ttl_refresh_and_errors():
+    assert trading_day(datetime.datetime(2025, 6, 14)) == trading_day(datetime.datetime(2025, 6, 15)) == "2025-06-13"
+    assert trading_day(datetime.datetime(2025, 6, 16)) == "2025-06-16"
+
+    clock, calls = Clock(), []
+    cache = AnalysisCache(ttl=60, clock=clock)
+
+    def run(run_id):
+        calls.append(run_id)
+        return OK
+
+    first = cache.get_or_run("Ericsson", run)
+    assert first.source == "run" and first.result == OK
+    hit = cache.get_or_run("ericsson ab (publ)", run)
+    assert hit.source == "cache" and hit.run_id == first.run_id and len(calls) == 1
+
+    assert cache.get_or_run("Ericsson", run, refresh=True).source == "run" and len(calls) == 2
+    clock.now += 61
+    assert cache.get("Ericsson") is None
+    assert cache.get_or_run("Ericsson", run).source == "run" and len(calls) == 3
+
+    failed = cache.get_or_run("Volvo", lambda run_id: ("Error analyzing Volvo: boom", [], None))
+    assert failed.result[0].startswith("Error analyzing") and cache.get("Volvo") is None
+
+
+def test_concurrent_requests_share_one_run_and_take_over_after_interrupt():
+    cache = AnalysisCache(ttl=60)
+    calls, started = [], threading.Event()
+
+    def slow(run_id):
+        calls.append(run_id)
+        started.set()
+        time.sleep(0.2)
+        return OK
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get_or_run("Tesla", slow))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(r.source for r in results) == ["run"] + ["shared"] * 7
+    assert {r.run_id for r in results} == {calls[0]}
+
+    # ägaren avbryts (t.ex. Streamlit-rerun) → en väntande session kör i stället
+    started.clear()
+    calls.clear()
+
+    def interrupted(run_id):
+        started.set()
+        time.sleep(0.1)
+        raise KeyboardInterrupt
+
+    waiter = []
+    owner = threading.Thread(target=lambda: pytest.raises(KeyboardInterrupt, cache.get_or_run, "Apple", interrupted))
+    owner.start()
+    started.wait(1)
+    assert cache.running("Apple")
+    t = threading.Thread(target=lambda: waiter.append(cache.get_or_run("Apple", slow)))
+    t.start()
+    owner.join()
+    t.join()
+    assert len(calls) == 1 and waiter[0].source == "run" and not cache.running("Apple")
@@ -0,0 +1,84 @@
+import sys
+import os
+import subprocess
+import threading
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import run_log
+
+
+def test_concurrent_runs_write_to_their_own_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_log, "DEBUG_LOG_DIR", str(tmp_path))
+
+    def one(name):
+        with run_log.bind(f"run-{name}"):
+            for i in range(20):
+                run_log.current_logger().log("STEP", f"{name} {i}")
+
+    threads = [threading.Thread(target=one, args=(n,)) for n in ("a", "b", "c")]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for name in ("a", "b", "c"):
+        text = (tmp_path / f"run-{name}.log").read_text(encoding="utf-8")
+        assert text.count("=== STEP") == 20
+        assert all(f"{other} 0" not in text for other in "abc" if other != name)
+
+
+def test_tail_returns_only_the_end_of_the_log(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_log, "DEBUG_LOG_DIR", str(tmp_path))
+    with run_log.bind("big") as logger:
+        for i in range(500):
+            logger.log("LINE", f"entry {i:04d} " + "x" * 40)
+
+    tail = run_log.tail_run_log("big", max_kb=1)
+    assert len(tail.encode("utf-8")) <= 1024
+    assert "entry 0499" in tail
+    assert "entry 0000" not in tail
+
+
+def test_old_runs_are_pruned(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_log, "DEBUG_LOG_DIR", str(tmp_path))
+    for i in range(5):
+        path = tmp_path / f"old-{i}.log"
+        path.write_text("x")
+        os.utime(path, (1000 + i, 1000 + i))
+
+    run_log.prune_runs(keep=2)
+
+    assert sorted(p.name for p in tmp_path.glob("*.log")) == ["old-3.log", "old-4.log"]
+
+
+def test_a_batch_prunes_once_at_the_end_and_keeps_its_own_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr(run_log, "DEBUG_LOG_DIR", str(tmp_path))
+    monkeypatch.setattr(run_log, "RUN_LOG_KEEP_RUNS", 2)
+    old = tmp_path / "old.log"
+    old.write_text("x")
+    os.utime(old, (1000, 1000))
+
+    with run_log.batch(runs=4):
+        for i in range(4):
+            with run_log.bind(f"batch-{i}") as logger:
+                logger.log("STEP", i)
+        assert len(list(tmp_path.glob("*.log"))) == 5  # inget rensat mitt i batchen
+
+    assert sorted(p.name for p in tmp_path.glob("*.log")) == [f"batch-{i}.log" for i in range(4)]
+
+    with run_log.bind("single"):
+        pass
+    assert len(list(tmp_path.glob("*.log"))) == 2
+
+
+def test_process_log_is_flushed_at_exit(tmp_path):
+    # färre poster än bufferten rymmer, och ingen explicit flush/close
+    code = "import run_log; run_log.current_logger().log('SETUP', 'batch starting'); raise SystemExit(1)"
+    root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+    env = {**os.environ, "DEBUG_LOG_DIR": str(tmp_path), "PYTHONPATH": root}
+    subprocess.run([sys.executable, "-c", code], env=env, cwd=str(tmp_path), check=False)
+
+    text = (tmp_path / f"{run_log.PROCESS_RUN_ID}.log").read_text(encoding="utf-8")
+    assert "batch starting" in text
@@ -0,0 +1,111 @@
+import sys
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools import http_client
+from tools import tools as tools_module
+
+
+class Backend:
+    """Stand-in for SerpAPIWrapper/DuckDuckGoSearchAPIWrapper with a scripted latency and answer."""
+
+    def __init__(self, name, latency=0.0, answer=None, error=None):
+        self.name, self.latency, self.answer, self.error = name, latency, answer, error
+        self.calls = 0
+        self.release = threading.Event()
+
+    def run(self, query):
+        self.calls += 1
+        self.release.wait(self.latency)
+        if self.error:
+            raise self.error
+        return self.answer or f"{self.name}: {query}"
+
+
+@pytest.fixture
+def backends(monkeypatch):
+    serp, ddg = Backend("serpapi"), Backend("duckduckgo")
+    monkeypatch.setattr(tools_module, "SerpAPIWrapper", lambda serpapi_api_key: serp)
+    monkeypatch.setattr(tools_module, "DuckDuckGoSearchAPIWrapper", lambda: ddg)
+    monkeypatch.setattr(http_client, "_limiter", http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    yield serp, ddg
+    serp.release.set()  # släpp ev. hängande trådar
+
+
+def test_hung_serpapi_does_not_block_past_the_hedge(backends):
+    serp, ddg = backends
+    serp.latency = 30
+    web_search = tools_module.create_search_tool("key", hedge_delay=0.05)["function"]
+
+    t0 = time.monotonic()
+    result = web_search("ericsson q2")
+
+    assert result == "duckduckgo: ericsson q2"
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_fast_serpapi_answer_skips_duckduckgo(backends):
+    serp, ddg = backends
+    web_search = tools_module.create_search_tool("key", hedge_delay=1.0)["function"]
+
+    assert web_search("volvo") == "serpapi: volvo"
+    assert ddg.calls == 0
+
+
+def test_serpapi_error_starts_duckduckgo_without_waiting_for_the_delay(backends):
+    serp, ddg = backends
+    serp.error = RuntimeError("quota exceeded")
+    web_search = tools_module.create_search_tool("key", hedge_delay=10)["function"]
+
+    t0 = time.monotonic()
+    assert web_search("saab") == "duckduckgo: saab"
+    assert time.monotonic() - t0 < 1.0
+
+
+def test_both_backends_failing_returns_the_failure_text(backends):
+    serp, ddg = backends
+    serp.error = ddg.error = ConnectionError("offline")
+    web_search = tools_module.create_search_tool("key", hedge_delay=0)["function"]
+
+    assert web_search("abb") == tools_module.SEARCH_FAILED
+
+
+def test_serpapi_goes_through_the_shared_session_with_a_timeout(monkeypatch):
+    calls = []
+
+    class Session:
+        def get(self, url, params=None, timeout=None):
+            calls.append((url, params, timeout))
+            return SimpleNamespace(json=lambda: {"organic_results": [{"snippet": "Volvo Q2 revenue up"}]})
+
+    monkeypatch.setattr(tools_module, "DuckDuckGoSearchAPIWrapper", lambda: Backend("duckduckgo"))
+    monkeypatch.setattr(http_client, "_session", Session())
+    web_search = tools_module.create_search_tool("key", hedge_delay=5)["function"]
+
+    assert "Volvo Q2 revenue up" in web_search("volvo")
+    (url, params, timeout), = calls
+    assert url == tools_module.SERPAPI_URL and params["q"] == "volvo" and params["api_key"] == "key"
+    assert timeout == tools_module.SERPAPI_TIMEOUT
+
+
+def test_shared_pool_is_replaced_when_abandoned_calls_pile_up(backends, monkeypatch):
+    serp, ddg = backends
+    serp.latency = 30
+    monkeypatch.setattr(tools_module, "_search_pool", None)
+    monkeypatch.setattr(tools_module, "_stuck", set())
+    web_search = tools_module.create_search_tool("key", hedge_delay=0.01)["function"]
+
+    first = tools_module._get_search_pool()
+    for i in range(tools_module.SEARCH_WORKERS // 2 - 1):
+        assert web_search(f"q{i}") == f"duckduckgo: q{i}"
+    assert tools_module._get_search_pool() is first and len(tools_module._stuck) == tools_module.SEARCH_WORKERS // 2 - 1
+
+    web_search("one more")
+    assert tools_module._get_search_pool() is not first and not tools_module._stuck
@@ -0,0 +1,28 @@
+import sys
+import os
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from source_extraction import SourceCollector, canonical_url
+
+
+def test_canonical_url_drops_tracking_fragment_and_trailing_slash():
+    url = "HTTPS://IR.Example.com:443/news/q2-2025/?utm_source=x&id=7&fbclid=abc#top"
+    assert canonical_url(url) == "https://ir.example.com/news/q2-2025?id=7"
+    assert canonical_url("**https://example.com/report).**") == "https://example.com/report"
+    assert canonical_url("ftp://example.com/file") is None
+
+
+def test_collector_dedupes_variants_and_records_provenance():
+    collector = SourceCollector()
+    web = "See https://www.example.com/q2/?utm_medium=email and [IR](http://example.com/q2#x)."
+    analysis = "Per https://example.com/q2 and https://news.example.org/a?b=2&a=1"
+
+    assert collector.collect(web, task="web_search") == ["https://www.example.com/q2"]
+    assert list(collector.feed(analysis, task="financial_analysis")) == ["https://news.example.org/a?b=2&a=1"]
+    assert collector.collect("https://news.example.org/a?a=1&b=2", task="web_search") == []
+    assert collector.provenance == {
+        "https://www.example.com/q2": ["web_search", "financial_analysis"],
+        "https://news.example.org/a?b=2&a=1": ["financial_analysis", "web_search"],
+    }
@@ -0,0 +1,43 @@
+import sys
+import os
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import text_processing as tp
+
+AGENT_OUTPUT = """## Key findings
+- **Revenue** rose 5% to SEK 56,100 million in [Q2 2025](https://example.com/q2).
+- Margins:
+- improved on lower costs
+* Source: https://example.com/q2
+1. Net income was USD 1,234 million.
+Management expects a stronger H2. Demand in North America grew 12%. See https://ir.example.com/report.
+"""
+
+
+def test_segment_text_returns_bullets_sentences_urls_and_facts():
+    seg = tp.segment_text(AGENT_OUTPUT)
+
+    assert len(seg.bullets) == 5
+    assert seg.urls == ["https://example.com/q2", "https://example.com/q2", "https://ir.example.com/report."]
+    assert any(s.startswith("Demand in North America") for s in seg.sentences)
+    assert "Demand in North America grew 12%." in seg.facts
+    assert all("Management expects" not in f for f in seg.facts)
+
+
+def test_normalize_bullets_merges_headings_and_drops_sources():
+    seg = tp.segment_text(AGENT_OUTPUT)
+
+    assert tp.normalize_bullets(seg.bullets, max_items=6) == [
+        "- Revenue rose 5% to SEK 56,100 million in Q2 2025.",
+        "- Margins: improved on lower costs",
+        "- Net income was USD 1,234 million.",
+    ]
+
+
+def test_clean_report_matches_the_two_step_cleanup():
+    text = "Revenue 56,100  MSEK \t\n \n\n\n- Growth\t5%  \nEnd "
+
+    assert tp.clean_report(text) == tp.normalize_md_spacing(tp.clean_corrupted_numbers(text))
+    assert tp.clean_report(text) == "Revenue 56100 MSEK\n\n- Growth 5%\nEnd"
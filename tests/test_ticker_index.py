@@ -0,0 +1,129 @@
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.ticker_index import BUNDLED_CSV, TickerIndex, normalize_name
+
+
+@pytest.fixture(scope="module")
+def index():
+    ix = TickerIndex()
+    ix.load_csv(BUNDLED_CSV)
+    return ix
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("Ericsson", "ERIC"),                                 # exakt namn
+    ("Telefonaktiebolaget L M Ericsson", "ERIC"),         # alias
+    ("eric-b", "ERIC-B.ST"),                              # symbol utan börssuffix
+    ("AB Volvo (publ)", "VOLV-B.ST"),                     # bolagsform bortplockad
+    ("Industrivärden", "INDU-C.ST"),                      # diakritiska tecken
+    ("Hennes & Mauritz", "HM-B.ST"),
+    ("Alfa", "ALFA.ST"),                                  # symbol
+    ("Microsft", None),                                   # stavfel: bara ett förslag
+    ("Some Unknown Startup", None),
+    ("xy", None),
+])
+def test_lookup_stages(index, query, expected):
+    assert index.resolve(query) == expected
+
+
+@pytest.mark.parametrize("query, lookalike", [
+    ("Intelsat", "INTC"),
+    ("Amazonas", "AMZN"),
+    ("Oracle Japan", "ORCL"),
+    ("Electrolux Professional", "ELUX-B.ST"),
+    ("Volvo Penta", "VOLV-B.ST"),
+    ("Invest", "INVE-B.ST"),
+    ("Sandvik Coromant", "SAND.ST"),
+    ("Microsft", "MSFT"),
+])
+def test_prefix_and_fuzzy_matches_are_only_suggestions(index, query, lookalike):
+    assert index.resolve(query) is None
+    assert index.lookup(query)[0].symbol == lookalike
+
+
+def test_lookup_returns_every_listing_of_the_company(index):
+    assert [e.symbol for e in index.lookup("ericsson b")] == ["ERIC-B.ST", "ERIC", "ERIC-A.ST"]
+    assert normalize_name("Apple Inc.") == normalize_name("apple") == "apple"
+
+
+def test_user_csv_rows_win_and_tool_resolves_without_network(monkeypatch, tmp_path):
+    import yfinance
+    from tools import create_financial_data_tool, http_client
+
+    csv_path = tmp_path / "mine.csv"
+    csv_path.write_text("name,symbol,suffix,aliases\nEricsson,ERIC-B,ST,\n", encoding="utf-8")
+    index = TickerIndex()
+    index.load_csv(str(csv_path))
+    index.load_csv(BUNDLED_CSV)
+    assert index.resolve("Ericsson") == "ERIC-B.ST"
+
+    class NoNetwork:
+        def get(self, *a, **k):
+            raise AssertionError("ticker resolution went to the network")
+
+    class Ticker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        def __getattr__(self, name):
+            if self.symbol != "ERIC-B.ST":
+                raise AssertionError(f"guessed ticker {self.symbol}")
+            raise ConnectionError("offline")
+
+    monkeypatch.setenv("FINANCIAL_DATA_CACHE", "off")
+    monkeypatch.setattr(yfinance, "Ticker", Ticker)
+    monkeypatch.setattr(http_client, "_limiter", http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    data = create_financial_data_tool(ticker_index=index, session=NoNetwork())["function"]("Ericsson AB")
+
+    assert data["ticker"] == "ERIC-B.ST"
+
+
+def test_tool_asks_yahoo_instead_of_trusting_a_lookalike(monkeypatch):
+    import yfinance
+    from tools import create_financial_data_tool, http_client
+
+    searched = []
+
+    class Search:
+        def get(self, url, params=None, **k):
+            searched.append(params["q"])
+            return SimpleNamespace(raise_for_status=lambda: None, json=lambda: {"quotes": []})
+
+    class Ticker:
+        def __init__(self, symbol):
+            self.info = {}
+
+    monkeypatch.setenv("FINANCIAL_DATA_CACHE", "off")
+    monkeypatch.setattr(yfinance, "Ticker", Ticker)
+    monkeypatch.setattr(http_client, "_limiter", http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    index = TickerIndex()
+    index.load_csv(BUNDLED_CSV)
+    data = create_financial_data_tool(ticker_index=index, session=Search())["function"]("Volvo Penta")
+
+    assert searched == ["Volvo Penta"]
+    assert "ticker" not in data
+    assert data["error"].startswith("No ticker found for company: Volvo Penta (did you mean: Volvo (VOLV-B.ST)")
+
+
+def test_match_cache_is_bounded_and_shared_across_threads(monkeypatch):
+    from concurrent.futures import ThreadPoolExecutor
+    from tools import ticker_index
+
+    monkeypatch.setattr(ticker_index, "MATCH_CACHE_SIZE", 16)
+    ix = TickerIndex()
+    ix.load_csv(BUNDLED_CSV)
+
+    for i in range(100):
+        ix.lookup(f"no such company {i}")
+    assert ix._matches.cache_info().currsize <= 16
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        symbols = set(pool.map(ix.resolve, ["Ericsson"] * 64))
+    assert symbols == {ix.resolve("Ericsson")} and None not in symbols
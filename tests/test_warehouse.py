@@ -0,0 +1,103 @@
+import sys
+import os
+
+import pandas as pd
+import pytest
+
+# Add the parent directory to the Python path so we can import modules
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("pyarrow")
+
+import yfinance
+from tools import create_financial_data_tool
+from tools import http_client
+from tools.cache import DatasetCache
+from tools.warehouse import FundamentalsWarehouse, _period_due
+
+
+def _statement(values_by_quarter: dict) -> pd.DataFrame:
+    cols = sorted((pd.Timestamp(q) for q in values_by_quarter), reverse=True)
+    return pd.DataFrame(
+        {c: values_by_quarter[str(c.date())] for c in cols},
+        index=["Total Revenue", "Net Income", "EBITDA"],
+    )
+
+
+def test_append_upserts_fetched_periods_and_keeps_older_ones(tmp_path):
+    wh = FundamentalsWarehouse(str(tmp_path))
+    first = _statement({"2025-03-31": [81_000, 19_500, 30_000], "2025-06-30": [82_000, None, 31_000]})
+    # Yahoo-fönstret har flyttats: ny Q3, Q1 har fallit bort och Q2 är omräknad/ifylld i efterhand
+    second = _statement({"2025-06-30": [82_500, 20_000, 31_000], "2025-09-30": [83_000, 21_000, 32_000]})
+
+    assert wh.append("stub", "quarterly_financials", first) == 2
+    assert wh.append("STUB", "quarterly_financials", second) == 2   # Q3 ny, Q2 ändrad
+    assert wh.append("STUB", "quarterly_financials", second) == 0   # samma igen: inget skrivs
+    assert wh.watermark("STUB", "quarterly_financials") == pd.Timestamp("2025-09-30")
+
+    df = wh.read("STUB", "quarterly_financials", columns=["Total Revenue", "Net Income", "Not Stored"])
+    assert list(df.index) == ["Total Revenue", "Net Income"]
+    assert list(df.columns) == [pd.Timestamp(d) for d in ("2025-09-30", "2025-06-30", "2025-03-31")]
+    assert df.loc["Total Revenue"].tolist() == [83_000, 82_500, 81_000]
+    assert df.loc["Net Income"].tolist() == [21_000, 20_000, 19_500]
+
+
+def test_statements_are_refetched_while_the_latest_period_can_be_revised():
+    q2 = pd.Timestamp("2025-06-30")
+    # strax efter rapporten: sena fält/omräkningar kan fortfarande komma
+    assert _period_due("quarterly_financials", q2, pd.Timestamp("2025-08-20"))
+    # efter revisionsfönstret och före nästa rapport kan inget ha ändrats
+    assert not _period_due("quarterly_financials", q2, pd.Timestamp("2025-09-20"))
+    assert _period_due("quarterly_financials", q2, pd.Timestamp("2025-10-21"))
+    assert _period_due("financials", pd.Timestamp("2024-12-31"), pd.Timestamp("2025-03-15"))
+    assert not _period_due("financials", pd.Timestamp("2024-12-31"), pd.Timestamp("2025-08-01"))
+
+
+class IncrementalTicker:
+    """yf.Ticker stand-in with three days of prices; `last_close` is today's (still moving) bar."""
+
+    history_calls: list = []
+    last_close = 12.0
+
+    def __init__(self, symbol):
+        self.symbol = symbol
+
+    @property
+    def info(self):
+        return {"shortName": "Stub Corp", "regularMarketPrice": 10.0}
+
+    quarterly_financials = property(lambda self: _statement({"2025-06-30": [82_000, 20_000, 31_000]}))
+    financials = quarterly_balance_sheet = balance_sheet = property(lambda self: pd.DataFrame())
+    quarterly_cashflow = cashflow = property(lambda self: pd.DataFrame())
+
+    def history(self, period=None, start=None):
+        IncrementalTicker.history_calls.append({"period": period, "start": start})
+        idx = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=3)
+        df = pd.DataFrame({"Close": [10.0, 11.0, IncrementalTicker.last_close], "Dividends": 0.0}, index=idx)
+        return df[df.index >= pd.Timestamp(start)] if start is not None else df
+
+
+def test_price_history_is_fetched_from_the_watermark(monkeypatch, tmp_path):
+    IncrementalTicker.history_calls = []
+    IncrementalTicker.last_close = 12.0
+    monkeypatch.setattr(yfinance, "Ticker", IncrementalTicker)
+    monkeypatch.setattr(http_client, "_limiter", http_client.HostRateLimiter(rates={}, default=(1e6, 1000)))
+    cache = DatasetCache(str(tmp_path / "cache.sqlite"), ttls={"history": 0})
+    get_financial_data = create_financial_data_tool(cache=cache)["function"]
+
+    first = get_financial_data("STUB")
+    IncrementalTicker.last_close = 12.5
+    second = get_financial_data("STUB")
+
+    assert IncrementalTicker.history_calls[0] == {"period": "2y", "start": None}
+    assert IncrementalTicker.history_calls[1]["start"] == pd.bdate_range(
+        end=pd.Timestamp.today().normalize(), periods=3
+    )[-1].date()
+    assert len(first["price_history_2y"]["Close"]) == 3
+    # överlappande dagen ersatt, inte dubblerad
+    assert list(second["price_history_2y"]["Close"].values()) == [10.0, 11.0, 12.5]
+    assert "Dividends" not in second["price_history_2y"]
+    assert second["quarters"] == first["quarters"] == [
+        {"quarter": "Q2 2025", "revenue": 82_000, "net_income": 20_000, "ebitda": 31_000}
+    ]
+    assert os.path.exists(tmp_path / "warehouse" / "STUB" / "quarterly_financials.parquet")
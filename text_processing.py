@@ -0,0 +1,190 @@
+# text_processing.py
+"""Post-processing of agent output for report assembly.
+
+All patterns are compiled once at import. `segment_text` splits an agent
+output into bullets, sentences, URLs and number-bearing fragments in one call,
+so the pipeline reads each text once instead of once per helper.
+`clean_report` is clean_corrupted_numbers + normalize_md_spacing without the
+slow per-line trailing-space regex.
+"""
+from __future__ import annotations
+
+import json
+import re
+from dataclasses import dataclass, field
+
+# ---------------------------
+# Precompiled patterns
+# ---------------------------
+_MD_IMAGE = re.compile(r'!\[([^\]]*)\]\([^)]+\)')           # ![alt](url) -> alt
+_MD_LINK = re.compile(r'\[([^\]]+)\]\(([^)]+)\)')           # [label](url) -> label
+_HEADING = re.compile(r'^\s*#{1,6}\s*')                     # "# " i början av raden
+_BULLET_LINE = re.compile(r'^\s*([-•*]|\d+[.)])\s+')        # bullet eller numrerad rad
+_BULLET_PREFIX = re.compile(r'^\s*(?:[-•*]|\d+[.)])\s+')
+_TRAILING_DASH = re.compile(r'\s*[-–—]\s*$')
+_SENTENCE_END = re.compile(r'(?<=[\.\!\?])\s+')
+_FACT = re.compile(r'(?:\bQ[1-4]\s?\d{4}\b|\b\d+(\.\d+)?%|\bSEK\b|\bUSD\b|\bEUR\b|\b\d{3,})')
+_URL = re.compile(r'https?://[^\s\)\]]+')
+_URL_ONLY = re.compile(r'https?://\S+', re.IGNORECASE)
+_THOUSANDS_COMMA = re.compile(r'(?<=\d),(?=\d)')
+_HSPACE = re.compile(r'[ \t]+')
+_TRAILING_SPACE = re.compile(r'[ \t]+$', re.MULTILINE)
+_BLANK_LINES = re.compile(r'\n{3,}')
+_MD_MARKUP = str.maketrans("", "", "*_`>")
+_QUARTERLY_BLOCK = re.compile(
+    r"===\s*QUARTERLY DATA\s*\(returned\)\s*===\s*(\{.*?\})\s*===\s*END\s*===", re.S | re.I
+)
+
+_SOURCE_PREFIXES = ("source:", "källa:", "link:", "url:", "published", "ref:")
+MAX_BULLET_CHARS = 240
+
+
+# ---------------------------
+# Line helpers
+# ---------------------------
+def strip_md_links(text: str) -> str:
+    if "](" not in text:
+        return text
+    text = _MD_IMAGE.sub(r'\1', text)
+    return _MD_LINK.sub(r'\1', text)
+
+
+def sanitize_line(line: str) -> str:
+    line = strip_md_links(line)
+    if "#" in line:
+        line = _HEADING.sub('', line)                          # ta bort # rubriker i början av raden
+    line = line.translate(_MD_MARKUP)                           # enkel MD-städning
+    return " ".join(line.split())
+
+
+def looks_like_source(line: str) -> bool:
+    if line.lower().startswith(_SOURCE_PREFIXES):
+        return True
+    return _URL_ONLY.fullmatch(line.strip()) is not None
+
+
+def extract_bullets_strict(text: str) -> list[str]:
+    """Plocka ENDAST ut riktiga bullets/numrerade listor från texten."""
+    return [raw for raw in (text or "").splitlines() if _BULLET_LINE.match(raw)]
+
+
+def fact_sentences(sentences, limit: int | None = None) -> list[str]:
+    """Sanerade meningar med siffror/kvartal/valuta, utan källrader."""
+    keep = []
+    for c in sentences:
+        c = sanitize_line(c)
+        if len(c) < 8:
+            continue
+        if _FACT.search(c) and not looks_like_source(c):
+            keep.append(c)
+            if limit is not None and len(keep) >= limit:
+                break
+    return keep
+
+
+def fallback_sentence_bullets(text: str, limit: int) -> list[str]:
+    """Om inga bullets hittas: välj meningsbitar som innehåller siffror/kvartal/valuta."""
+    return [f"- {c}" for c in fact_sentences(_SENTENCE_END.split(text or ""), limit)]
+
+
+def normalize_bullets(lines: list[str], max_items: int) -> list[str]:
+    out, seen = [], set()
+    pending = None  # håll rubrik som slutar med ":" tills vi ser nästa rad
+
+    def _emit(text: str):
+        t = text.strip()
+        if len(t) < 8 or looks_like_source(t):
+            return
+        if len(t) > MAX_BULLET_CHARS:
+            t = t[:MAX_BULLET_CHARS].rstrip() + "…"
+        key = t.lower()
+        if key in seen:
+            return
+        seen.add(key)
+        out.append(f"- {t}")
+
+    for raw in lines:
+        l = _BULLET_PREFIX.sub('', raw.strip(), count=1)  # ta bort bullet/nummer i början
+        l = sanitize_line(l)
+        l = _TRAILING_DASH.sub('', l)  # ta bort ensamt bindestreck i slutet
+        if not l:
+            continue
+
+        if pending is not None:
+            # slå ihop pending rubrik + nuvarande rad
+            _emit(f"{pending} {l}")
+            pending = None
+        elif l.endswith(":"):
+            pending = l.rstrip(":").strip() + ":"
+        else:
+            _emit(l)
+
+        if max_items and len(out) >= max_items:
+            break
+
+    # om sista var rubrik utan efterföljare – emit ändå
+    if pending is not None and (not max_items or len(out) < max_items):
+        _emit(pending.rstrip(":"))
+
+    return out
+
+
+# ---------------------------
+# Whole-text passes
+# ---------------------------
+def clean_corrupted_numbers(text: str) -> str:
+    if not isinstance(text, str):
+        return text
+    text = _THOUSANDS_COMMA.sub('', text)  # tusentalskomma inne i tal, radbrytningar orörda
+    return _HSPACE.sub(' ', text).strip()  # komprimera endast space/tab, inte \n
+
+
+def normalize_md_spacing(text: str) -> str:
+    """Trailing spaces per line removed, at most 2 consecutive line breaks."""
+    text = _TRAILING_SPACE.sub('', text)
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def clean_report(text: str) -> str:
+    """normalize_md_spacing(clean_corrupted_numbers(text)), same result with cheaper scans."""
+    if not isinstance(text, str):
+        return text
+    text = _HSPACE.sub(' ', _THOUSANDS_COMMA.sub('', text))
+    # efter komprimeringen är blanksteg i radslut alltid exakt " \n" → ingen regex behövs
+    text = text.replace(' \n', '\n')
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def split_quarterly_block(text: str) -> tuple[dict | None, str]:
+    """(parsed JSON between the QUARTERLY DATA markers or None, text with every such block removed)."""
+    text = text or ""
+    payload = None
+    for m in _QUARTERLY_BLOCK.finditer(text):
+        try:
+            payload = json.loads(m.group(1))
+            break
+        except Exception:
+            continue
+    return payload, _QUARTERLY_BLOCK.sub("", text)
+
+
+@dataclass
+class TextSegments:
+    bullets: list[str] = field(default_factory=list)    # råa bullet-/listrader
+    sentences: list[str] = field(default_factory=list)  # meningsbitar (hela texten)
+    urls: list[str] = field(default_factory=list)       # http(s)-länkar i ordning
+    facts: list[str] = field(default_factory=list)      # sanerade meningar med siffror
+
+
+def segment_text(text: str) -> TextSegments:
+    """Split agent output into bullets, sentences, URLs and number-bearing fragments."""
+    text = text or ""
+    seg = TextSegments()
+    for raw in text.splitlines():
+        if _BULLET_LINE.match(raw):
+            seg.bullets.append(raw)
+        if "http" in raw:
+            seg.urls.extend(_URL.findall(raw))
+    seg.sentences = _SENTENCE_END.split(text)
+    seg.facts = fact_sentences(seg.sentences)
+    return seg
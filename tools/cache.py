@@ -0,0 +1,164 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, NamedTuple
+
+# ------------------------------------------------------------
+# On-disk TTL cache for Yahoo Finance datasets (ticker, dataset) → value
+# ------------------------------------------------------------
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+DAY = 24 * HOUR
+
+# TTL per dataset – pris rör sig snabbt, rapporter kommer en gång per kvartal
+DEFAULT_TTLS = {
+    "symbol": 30 * DAY,  # company name → resolved ticker
+    "info": 6 * HOUR,
+    "history": 15 * MINUTE,
+    "quarterly_financials": 2 * DAY,
+    "quarterly_balance_sheet": 2 * DAY,
+    "quarterly_cashflow": 2 * DAY,
+    "financials": 7 * DAY,
+    "balance_sheet": 7 * DAY,
+    "cashflow": 7 * DAY,
+}
+DEFAULT_TTL = HOUR
+
+
+def default_cache_path() -> str:
+    base = os.getenv("COMPANY_ANALYZER_CACHE_DIR") or os.path.join(
+        os.path.expanduser("~"), ".cache", "company-analyzer"
+    )
+    return os.path.join(base, "financial_data.sqlite")
+
+
+def _is_empty(value) -> bool:
+    if value is None:
+        return True
+    if hasattr(value, "empty"):
+        return bool(value.empty)
+    if isinstance(value, (dict, list, tuple, str)):
+        return len(value) == 0
+    return False
+
+
+class CacheEntry(NamedTuple):
+    value: Any
+    fetched_at: float
+    stale: bool
+
+
+class DatasetCache:
+    """SQLite-backed cache keyed by (key, dataset) with a TTL per dataset.
+
+    Expired entries are kept on disk so they can be served, marked as stale,
+    when a refresh fails (e.g. no network).
+    """
+
+    def __init__(self, path: str | None = None, ttls: dict[str, float] | None = None):
+        self.path = path or default_cache_path()
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        if self.path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT NOT NULL,"
+                " dataset TEXT NOT NULL,"
+                " fetched_at REAL NOT NULL,"
+                " payload BLOB NOT NULL,"
+                " PRIMARY KEY (key, dataset))"
+            )
+
+    def ttl(self, dataset: str) -> float:
+        return self.ttls.get(dataset, DEFAULT_TTL)
+
+    def get(self, key: str, dataset: str, allow_stale: bool = False) -> CacheEntry | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fetched_at, payload FROM entries WHERE key = ? AND dataset = ?",
+                (key.upper(), dataset),
+            ).fetchone()
+        if row is None:
+            return None
+        fetched_at, payload = row
+        stale = time.time() - fetched_at > self.ttl(dataset)
+        if stale and not allow_stale:
+            return None
+        try:
+            value = pickle.loads(payload)
+        except Exception:
+            return None
+        return CacheEntry(value, fetched_at, stale)
+
+    def put(self, key: str, dataset: str, value) -> None:
+        payload = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, dataset, fetched_at, payload) VALUES (?, ?, ?, ?)",
+                (key.upper(), dataset, time.time(), payload),
+            )
+
+    def get_or_fetch(self, key: str, dataset: str, fetch: Callable[[], Any]) -> CacheEntry:
+        """Return a fresh entry, refreshing through `fetch` when missing or expired.
+
+        If the refresh raises, or returns nothing while an older non-empty entry
+        exists, the older entry is returned with `stale=True`.
+        """
+        entry = self.get(key, dataset)
+        if entry is not None:
+            return entry
+        try:
+            value = fetch()
+        except Exception:
+            old = self.get(key, dataset, allow_stale=True)
+            if old is not None:
+                return old._replace(stale=True)
+            raise
+        if _is_empty(value):
+            old = self.get(key, dataset, allow_stale=True)
+            if old is not None and not _is_empty(old.value):
+                return old._replace(stale=True)
+        self.put(key, dataset, value)
+        return CacheEntry(value, time.time(), False)
+
+    def invalidate(self, key: str | None = None, dataset: str | None = None) -> None:
+        clauses, params = [], []
+        if key is not None:
+            clauses.append("key = ?")
+            params.append(key.upper())
+        if dataset is not None:
+            clauses.append("dataset = ?")
+            params.append(dataset)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM entries{where}", params)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_default_cache: DatasetCache | None = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> DatasetCache | None:
+    """Process-wide cache, or None when disabled with FINANCIAL_DATA_CACHE=off."""
+    global _default_cache
+    if os.getenv("FINANCIAL_DATA_CACHE", "").lower() in ("0", "off", "false", "no"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            try:
+                _default_cache = DatasetCache()
+            except Exception as e:
+                print(f"[FinancialData] Could not open cache: {e}. Continuing without cache.")
+                return None
+        return _default_cache
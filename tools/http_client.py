@@ -0,0 +1,216 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# ------------------------------------------------------------
+# Shared HTTP layer for the tools: pooled session, retries, per-host rate limits
+# ------------------------------------------------------------
+#
+# `get_session()` is one process-wide requests.Session with keep-alive pools
+# (at most POOL_MAXSIZE connections per host) that retries 429/5xx with
+# jittered exponential backoff, honouring Retry-After. Every request through
+# it first takes a token from the host's bucket in `get_limiter()`, and so
+# does every retry urllib3 makes after its backoff (`RateLimitedRetry`), so a
+# burst of 429s cannot make the retries outrun the bucket.
+#
+# Clients that cannot use this session (yfinance needs its own curl_cffi
+# session, SerpAPI/DuckDuckGo use their libraries' clients) call
+# `rate_limited(host)` before each request so they share the same buckets.
+#
+# Tests swap in their own session/limiter with `set_session` / `set_limiter`.
+
+YAHOO_HOST = "finance.yahoo.com"
+SERPAPI_HOST = "serpapi.com"
+DUCKDUCKGO_HOST = "duckduckgo.com"
+
+# (requests per second, burst) per host; subdomäner delar förälderns hink
+HOST_RATES = {
+    YAHOO_HOST: (5.0, 20),
+    SERPAPI_HOST: (5.0, 5),
+    DUCKDUCKGO_HOST: (1.0, 3),
+}
+DEFAULT_RATE = (10.0, 10)
+
+POOL_CONNECTIONS = 10   # antal värdar vars pooler hålls öppna
+POOL_MAXSIZE = 8        # samtidiga anslutningar per värd
+RETRIES = 3
+BACKOFF_FACTOR = 0.5    # 0.5s, 1s, 2s …
+BACKOFF_JITTER = 0.5    # + upp till 0.5s slump så att parallella körningar inte krockar igen
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+USER_AGENT = "Mozilla/5.0 (compatible; company-analyzer)"
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `acquire` reserves a token and sleeps until it is due."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class HostRateLimiter:
+    def __init__(self, rates: dict[str, tuple[float, int]] | None = None, default=DEFAULT_RATE):
+        self.rates = dict(HOST_RATES if rates is None else rates)
+        self.default = default
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, host: str) -> str:
+        host = (host or "").lower().split(":")[0]
+        for domain in self.rates:
+            if host == domain or host.endswith("." + domain):
+                return domain
+        return host
+
+    def bucket(self, host: str) -> TokenBucket:
+        key = self._key(host)
+        with self._lock:
+            b = self._buckets.get(key)
+            if b is None:
+                b = self._buckets[key] = TokenBucket(*self.rates.get(key, self.default))
+            return b
+
+    def acquire(self, host: str) -> float:
+        return self.bucket(host).acquire()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a token from the host's bucket before each request.
+
+    `send` runs once per request; urllib3 retries happen inside it and take
+    their tokens in `RateLimitedRetry.sleep`.
+    """
+
+    def __init__(self, limiter: "HostRateLimiter | None" = None, **kwargs):
+        self.limiter = limiter
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        limiter = self.limiter or get_limiter()
+        limiter.acquire(urlsplit(request.url).hostname or "")
+        return super().send(request, **kwargs)
+
+
+class RateLimitedRetry(Retry):
+    """Retry that takes a token from the host's bucket after each backoff, before the retry is sent."""
+
+    limiter: "HostRateLimiter | None" = None  # None → get_limiter()
+    host = ""
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.limiter, retry.host = self.limiter, self.host
+        return retry
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        retry.host = getattr(_pool, "host", None) or self.host
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        (self.limiter or get_limiter()).acquire(self.host)
+
+
+def build_retry(
+    retries: int = RETRIES,
+    backoff_factor: float = BACKOFF_FACTOR,
+    limiter: "HostRateLimiter | None" = None,
+) -> Retry:
+    kwargs = dict(
+        total=retries,
+        status=retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,  # sista svaret (t.ex. 429) lämnas till anroparen
+    )
+    try:
+        retry = RateLimitedRetry(backoff_jitter=BACKOFF_JITTER * backoff_factor / BACKOFF_FACTOR, **kwargs)
+    except TypeError:
+        retry = RateLimitedRetry(**kwargs)  # urllib3 < 2 saknar backoff_jitter; backoff utan slump
+    retry.limiter = limiter
+    return retry
+
+
+def build_session(
+    limiter: HostRateLimiter | None = None,
+    retries: int = RETRIES,
+    backoff_factor: float = BACKOFF_FACTOR,
+    pool_connections: int = POOL_CONNECTIONS,
+    pool_maxsize: int = POOL_MAXSIZE,
+) -> requests.Session:
+    """New pooled, retrying, rate-limited session. `limiter=None` uses the shared limiter."""
+    adapter = RateLimitedAdapter(
+        limiter,
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        pool_block=True,  # vänta på ledig anslutning i stället för att öppna fler
+        max_retries=build_retry(retries, backoff_factor, limiter),
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+_session: requests.Session | None = None
+_limiter: HostRateLimiter | None = None
+_lock = threading.Lock()
+
+
+def get_limiter() -> HostRateLimiter:
+    global _limiter
+    with _lock:
+        if _limiter is None:
+            _limiter = HostRateLimiter()
+        return _limiter
+
+
+def set_limiter(limiter: HostRateLimiter | None) -> None:
+    global _limiter
+    with _lock:
+        _limiter = limiter
+
+
+def get_session() -> requests.Session:
+    """Process-wide session for the tools."""
+    global _session
+    with _lock:
+        if _session is None:
+            _session = build_session()
+        return _session
+
+
+def set_session(session: requests.Session | None) -> None:
+    """Replace the shared session (None → a new default one on next use)."""
+    global _session
+    with _lock:
+        _session = session
+
+
+def rate_limited(host: str) -> float:
+    """Take a token for `host` before a call that does not go through `get_session()`."""
+    return get_limiter().acquire(host)
+
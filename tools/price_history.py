@@ -0,0 +1,171 @@
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+# ------------------------------------------------------------
+# Compact daily price history: epoch days + one array per column
+# ------------------------------------------------------------
+#
+# `price_history_2y` used to be {column: {str(timestamp): value}} – ~2,500
+# Python strings and floats per company. PriceHistory keeps the same data as
+# an int32 array of days since 1970-01-01 plus a float32 array per price
+# column (Volume as int64, float32 would round it). It is a read-only
+# Mapping, so `ph["Close"]` still gives {str(timestamp): value}; those dicts
+# are built on first access and kept.
+#
+# Agents see the tool result as text, i.e. repr(): instead of ~500 bars that
+# is a one-line `summary()` (last close, 52-week range, 1m/3m/1y returns).
+
+_EPOCH = np.datetime64("1970-01-01", "D")
+RETURN_WINDOWS = {"1m": 30, "3m": 91, "1y": 365}  # kalenderdagar bakåt från sista stängningen
+
+
+def _values(arr: np.ndarray) -> list:
+    if arr.dtype == np.float32:
+        # avrunda till float32-precision (7 siffror): 123.45 ska inte bli 123.44999694824219
+        x = arr.astype(np.float64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mag = np.where(np.isfinite(x) & (x != 0), np.floor(np.log10(np.abs(x))), 0)
+        scale = 10.0 ** (6 - mag)
+        return (np.round(x * scale) / scale).tolist()
+    return arr.tolist()
+
+
+def _rounded(x: float) -> float:
+    return _values(np.array([x], np.float32))[0]
+
+
+class PriceHistory(Mapping):
+    """Daily bars for one ticker. Mapping[column, dict[str(timestamp), value]] for backward compatibility."""
+
+    __slots__ = ("days", "tz", "_columns", "_dicts", "_labels")
+
+    def __init__(self, days: np.ndarray, columns: dict[str, np.ndarray], tz: str | None = None):
+        self.days = np.asarray(days, dtype=np.int32)
+        self.tz = tz
+        self._columns = columns
+        self._dicts: dict[str, dict] = {}
+        self._labels: list[str] | None = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame | None, columns=None) -> "PriceHistory":
+        """From a yfinance history frame (index = dates, one column per field)."""
+        if df is None or df.empty:
+            return cls(np.empty(0, np.int32), {})
+        idx = pd.DatetimeIndex(df.index)
+        tz = str(idx.tz) if idx.tz is not None else None
+        local = idx.tz_localize(None) if tz else idx
+        days = (local.normalize().to_numpy().astype("datetime64[D]") - _EPOCH).astype(np.int32)
+        names = [c for c in (columns or df.columns) if c in df.columns]
+        cols = {}
+        for name in names:
+            values = pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64)
+            if name == "Volume":
+                # NaN-volym saknas i praktiken; -1 markerar den ändå som saknad
+                cols[name] = np.where(np.isnan(values), -1, values).astype(np.int64)
+            else:
+                cols[name] = values.astype(np.float32)
+        return cls(days, cols, tz)
+
+    # ---------- Mapping (bakåtkompatibel dict-vy) ----------
+    def __getitem__(self, column: str) -> dict:
+        d = self._dicts.get(column)
+        if d is None:
+            arr = self._columns[column]  # KeyError för okända kolumner, som en dict
+            valid = arr >= 0 if arr.dtype == np.int64 else ~np.isnan(arr)
+            labels, values = self.labels, _values(arr)
+            d = self._dicts[column] = {labels[i]: values[i] for i in np.flatnonzero(valid)}
+        return d
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        if not len(self):
+            return "PriceHistory(empty)"
+        first, last = (str(_EPOCH + int(d)) for d in (self.days[0], self.days[-1]))
+        parts = [f"{len(self.days)} days {first}..{last}"]
+        s = self.summary()
+        if s:
+            parts.append(f"last close {s['last_close']:g} on {s['last_date']}")
+            parts.append(f"52w range {s['low_52w']:g}-{s['high_52w']:g}")
+            parts.extend(f"{k} return {v:+.1%}" for k, v in s["returns"].items())
+        parts.append(f"columns={list(self._columns)}")
+        return f"PriceHistory({', '.join(parts)})"
+
+    def summary(self) -> dict:
+        """Last close, 52-week low/high and returns over RETURN_WINDOWS; {} without closes."""
+        close = self._columns.get("Close")
+        if close is None:
+            return {}
+        valid = ~np.isnan(close)
+        if not valid.any():
+            return {}
+        days, close = self.days[valid], close[valid].astype(np.float64)
+        last_day, last = int(days[-1]), float(close[-1])
+        year = close[days > last_day - 365]
+        returns = {}
+        for label, back in RETURN_WINDOWS.items():
+            # senaste stängning på eller före dagen fönstret börjar; saknas historik hoppas fönstret över
+            i = np.searchsorted(days, last_day - back, side="right") - 1
+            if i >= 0 and close[i]:
+                returns[label] = last / float(close[i]) - 1
+        return {
+            "last_date": str(_EPOCH + last_day),
+            "last_close": _rounded(last),
+            "low_52w": _rounded(year.min()),
+            "high_52w": _rounded(year.max()),
+            "returns": returns,
+        }
+
+    # ---------- övrigt ----------
+    @property
+    def dates(self) -> pd.DatetimeIndex:
+        idx = pd.DatetimeIndex(_EPOCH + self.days.astype("timedelta64[D]"))
+        return idx.tz_localize(self.tz) if self.tz else idx
+
+    @property
+    def labels(self) -> list[str]:
+        """str(timestamp) per day, the key format of the old dicts."""
+        if self._labels is None:
+            self._labels = [str(ts) for ts in self.dates]
+        return self._labels
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name]
+
+    def to_frame(self) -> pd.DataFrame:
+        df = pd.DataFrame({k: v for k, v in self._columns.items()}, index=self.dates)
+        if "Volume" in df:
+            df["Volume"] = df["Volume"].where(df["Volume"] >= 0)
+        df.index.name = "Date"
+        return df
+
+    def to_dict(self) -> dict:
+        """The full legacy {column: {str(timestamp): value}} structure."""
+        return {k: self[k] for k in self}
+
+    def to_compact(self) -> dict:
+        """JSON-friendly form: first date, day offsets from it and one value list per column."""
+        start = int(self.days[0]) if len(self.days) else 0
+        return {
+            "start": str(_EPOCH + start),
+            "tz": self.tz,
+            "days": (self.days - start).tolist(),
+            "columns": {k: _values(v) for k, v in self._columns.items()},
+        }
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + sum(a.nbytes for a in self._columns.values())
+
+    def __getstate__(self):
+        # de lata dict-vyerna byggs om vid behov, skickas inte med
+        return {"days": self.days, "tz": self.tz, "columns": self._columns}
+
+    def __setstate__(self, state):
+        self.__init__(state["days"], state["columns"], state["tz"])
@@ -0,0 +1,221 @@
+import datetime
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import yfinance as yf
+
+from .cache import DatasetCache
+from .http_client import YAHOO_HOST, rate_limited
+from .warehouse import WAREHOUSE_DATASETS, FundamentalsWarehouse, history_window, ttl_for
+
+# ------------------------------------------------------------
+# One fetched snapshot per ticker (info + statements + price history)
+# ------------------------------------------------------------
+
+STATEMENT_DATASETS = (
+    "quarterly_financials",
+    "financials",
+    "quarterly_balance_sheet",
+    "balance_sheet",
+    "quarterly_cashflow",
+    "cashflow",
+)
+DATASETS = ("info",) + STATEMENT_DATASETS + ("history",)
+
+# Delad, begränsad pool så att batchkörningar inte öppnar obegränsat många anrop mot Yahoo
+FETCH_WORKERS = 8
+DATASET_TIMEOUT = 15.0  # sekunder per dataset, räknat från att Yahoo-anropet startar
+QUEUE_TIMEOUT = 120.0   # max väntan på ledig worker + rate limit innan datasetet släpps
+
+_pool: ThreadPoolExecutor | None = None
+_pool_lock = threading.Lock()
+_stuck: set = set()  # Yahoo-anrop som missat sin deadline men fortfarande kör i den delade poolen
+
+
+def _fetch_pool() -> ThreadPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="yf-fetch")
+        return _pool
+
+
+def _abandon(fut, pool: ThreadPoolExecutor) -> None:
+    """A dataset call the snapshot gave up on. Once half of the shared pool is stuck on such
+    calls, later fetches get a fresh pool; the old one's threads finish their calls and exit."""
+    global _pool
+    if fut.cancel() or fut.done():
+        return
+    with _pool_lock:
+        if pool is not _pool:
+            return
+        _stuck.add(fut)
+        fut.add_done_callback(_stuck.discard)
+        if len(_stuck) >= FETCH_WORKERS // 2:
+            print(f"[FinancialData] {len(_stuck)} Yahoo calls still hanging; starting a new fetch pool")
+            _pool.shutdown(wait=False)
+            _pool = None
+            _stuck.clear()
+
+
+class TickerSnapshot:
+    """Everything `get_financial_data` reads for one ticker, fetched exactly once.
+
+    Each dataset is read from Yahoo at most once (or served from `cache`), and
+    `remote_fetches` counts the round trips that actually went to the network.
+    Datasets are fetched concurrently on a bounded pool; one that fails or misses
+    its deadline is left out and listed in `missing_datasets`. The deadline
+    (`timeout`) starts when the dataset's Yahoo call starts, so time spent
+    queued behind other snapshots or waiting for the rate limiter does not
+    count; that wait is bounded separately by `queue_timeout`. yfinance's
+    statement reads take no timeout, so a call that misses its deadline keeps
+    its worker; once half of the shared pool is held that way, later snapshots
+    get a fresh pool instead of queueing behind the hung calls.
+
+    With a `warehouse`, statements and price history are read from local Parquet
+    files (projected to `columns[dataset]` when given) and only the periods
+    newer than what is stored are fetched.
+    """
+
+    def __init__(
+        self,
+        symbol: str,
+        cache: DatasetCache | None = None,
+        ticker_factory=None,
+        timeout: float = DATASET_TIMEOUT,
+        executor: ThreadPoolExecutor | None = None,
+        queue_timeout: float = QUEUE_TIMEOUT,
+        warehouse: FundamentalsWarehouse | None = None,
+        columns: dict[str, list[str]] | None = None,
+    ):
+        self.symbol = symbol
+        self.cache = cache
+        self.warehouse = warehouse
+        self.columns = columns or {}
+        self.timeout = timeout
+        self.queue_timeout = queue_timeout
+        self._executor = executor
+        self._ticker_factory = ticker_factory or yf.Ticker
+        self._ticker = None
+        self._lock = threading.Lock()
+        self._progress = threading.Condition(self._lock)  # signaleras när ett anrop startar/ett dataset är klart
+        self._started: dict[str, float] = {}               # dataset → monotonic när Yahoo-anropet startade
+        self.remote_fetches = 0
+        self.stale_datasets: list[str] = []
+        self.missing_datasets: list[str] = []
+        self.as_of: dict[str, str] = {}
+        self.info: dict = {}
+        self.statements: dict = {}
+        self.history = None
+
+    @property
+    def ticker(self):
+        with self._lock:
+            if self._ticker is None:
+                self._ticker = self._ticker_factory(self.symbol)
+            return self._ticker
+
+    def _remote(self, dataset: str, fetch):
+        rate_limited(YAHOO_HOST)  # yfinance har egen curl_cffi-session, men delar värdens hink
+        with self._progress:
+            self.remote_fetches += 1
+            self._started[dataset] = time.monotonic()
+            self._progress.notify_all()
+        return fetch()
+
+    def _since(self, dataset: str):
+        return history_window() if dataset == "history" else None
+
+    def _load(self, dataset: str, fetch):
+        if self.warehouse is not None and dataset in WAREHOUSE_DATASETS:
+            entry = self.warehouse.refresh(
+                self.symbol,
+                dataset,
+                lambda watermark: self._remote(dataset, self._incremental_fetcher(dataset, watermark)),
+                ttl=ttl_for(self.cache, dataset),
+                columns=self.columns.get(dataset),
+                since=self._since(dataset),
+            )
+            return entry.value, entry
+        if self.cache is None:
+            return self._remote(dataset, fetch), None
+        entry = self.cache.get_or_fetch(self.symbol, dataset, lambda: self._remote(dataset, fetch))
+        return entry.value, entry
+
+    def _fetcher(self, dataset: str):
+        if dataset == "info":
+            return lambda: self.ticker.info
+        if dataset == "history":
+            return lambda: self.ticker.history(period="2y")
+        return lambda: getattr(self.ticker, dataset)
+
+    def _incremental_fetcher(self, dataset: str, watermark):
+        # Yahoo har ingen "sedan"-parameter för rapporter – bara priser kan hämtas från vattenmärket
+        if dataset == "history" and watermark is not None:
+            return lambda: self.ticker.history(start=watermark.date())
+        return self._fetcher(dataset)
+
+    def _fallback(self, dataset: str):
+        if self.warehouse is not None and dataset in WAREHOUSE_DATASETS:
+            return self.warehouse.stored(
+                self.symbol, dataset, columns=self.columns.get(dataset), since=self._since(dataset)
+            )
+        return self.cache.get(self.symbol, dataset, allow_stale=True) if self.cache is not None else None
+
+    def _notify(self, _fut) -> None:
+        with self._progress:
+            self._progress.notify_all()
+
+    def _result(self, dataset: str, fut, queued_at: float):
+        """fut.result() with the deadline counted from the dataset's own Yahoo call."""
+        with self._progress:
+            while not fut.done():
+                started = self._started.get(dataset)
+                if started is None:
+                    limit, what = queued_at + self.queue_timeout, "did not start"
+                else:
+                    limit, what = started + self.timeout, "timed out"
+                left = limit - time.monotonic()
+                if left <= 0:
+                    raise TimeoutError(f"{what} within {self.queue_timeout if started is None else self.timeout:g}s")
+                self._progress.wait(left)
+        return fut.result()
+
+    def fetch(self, info: dict | None = None) -> "TickerSnapshot":
+        """Load all datasets. `info` can be passed in when it was already fetched."""
+        wanted = [d for d in DATASETS if not (d == "info" and info is not None)]
+        pool = self._executor or _fetch_pool()
+        queued_at = time.monotonic()
+        futures = {d: pool.submit(self._load, d, self._fetcher(d)) for d in wanted}
+        for fut in futures.values():
+            fut.add_done_callback(self._notify)
+
+        values = {}
+        for dataset, fut in futures.items():
+            entry = None
+            try:
+                value, entry = self._result(dataset, fut, queued_at)
+            except Exception as e:
+                if self._executor is None:
+                    _abandon(fut, pool)
+                else:
+                    fut.cancel()
+                # timeout/fel: använd gammal cachepost om den finns, annars släpp datasetet
+                entry = self._fallback(dataset)
+                if entry is None:
+                    print(f"[FinancialData] Dropping {dataset} for {self.symbol}: {type(e).__name__}: {e}")
+                    self.missing_datasets.append(dataset)
+                    continue
+                entry = entry._replace(stale=True)
+                value = entry.value
+            if entry is not None:
+                self.as_of[dataset] = datetime.datetime.fromtimestamp(entry.fetched_at).isoformat(timespec="seconds")
+                if entry.stale:
+                    self.stale_datasets.append(dataset)
+            values[dataset] = value
+
+        self.info = info if info is not None else (values.get("info") or {})
+        self.statements = {d: values[d] for d in STATEMENT_DATASETS if d in values}
+        self.history = values.get("history")
+        return self
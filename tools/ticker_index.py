@@ -0,0 +1,202 @@
+import csv
+import functools
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left
+from typing import NamedTuple
+
+# ------------------------------------------------------------
+# Local company name → ticker index (no network)
+# ------------------------------------------------------------
+#
+# Loaded from tickers.csv next to this file plus any CSVs listed in
+# TICKER_INDEX_CSV (os.pathsep-separated), with the columns
+#
+#     name,symbol,suffix,aliases
+#     Ericsson,ERIC-B,ST,ericsson b|telefonaktiebolaget lm ericsson
+#
+# The Yahoo symbol is symbol + "." + suffix (ERIC-B.ST). Rows for the same
+# name are returned in file order, so list the preferred listing first.
+# A lookup tries a ticker symbol, then the exact normalized name/alias, then
+# the shortest name starting with the query and finally trigram similarity.
+# Only the first two are trusted by resolve(): "Volvo Penta" starts like
+# "Volvo" and "Intelsat" looks like "Intel", but they are other companies, so
+# prefix and trigram hits are suggestions for the caller to confirm.
+
+BUNDLED_CSV = os.path.join(os.path.dirname(__file__), "tickers.csv")
+
+# bolagsformer m.m. som inte hjälper matchningen ("Volvo AB (publ)" == "volvo")
+LEGAL_WORDS = frozenset({
+    "ab", "publ", "asa", "oyj", "as", "a/s", "sa", "nv", "ag", "se", "plc", "inc",
+    "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "the",
+    "group", "holding", "holdings",
+})
+MIN_PREFIX = 3      # kortare prefix matchar för mycket
+MIN_FUZZY = 4
+FUZZY_THRESHOLD = 0.6  # Dice-likhet på trigram
+MATCH_CACHE_SIZE = 4096  # senaste frågorna; fritext från användare ska inte växa obegränsat
+
+_NON_ALNUM = re.compile(r"[^0-9a-z]+")
+
+
+class TickerEntry(NamedTuple):
+    symbol: str  # Yahoo-symbol inkl. suffix, t.ex. "ERIC-B.ST"
+    name: str
+    exchange: str = ""
+
+
+def normalize_name(name: str) -> str:
+    """Lowercase ASCII words without punctuation or legal-form words."""
+    s = unicodedata.normalize("NFKD", str(name or "")).encode("ascii", "ignore").decode("ascii").lower()
+    s = s.replace("&", " and ").replace("'", "")
+    words = _NON_ALNUM.sub(" ", s).split()
+    kept = [w for w in words if w not in LEGAL_WORDS]
+    return " ".join(kept or words)
+
+
+def _trigrams(key: str) -> set[str]:
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TickerIndex:
+    def __init__(self):
+        self._by_key: dict[str, list[TickerEntry]] = {}
+        self._by_symbol: dict[str, TickerEntry] = {}
+        self._grams: dict[str, list[str]] = {}
+        self._gram_count: dict[str, int] = {}
+        self._sorted: list[str] | None = None
+        self._lock = threading.Lock()
+        # fråga (strip + lower) → (träffar, exakt); lru_cache är trådsäker och begränsad
+        self._matches = functools.lru_cache(maxsize=MATCH_CACHE_SIZE)(self._find)
+
+    # ---------- uppbyggnad ----------
+    def add(self, symbol: str, name: str, aliases=(), exchange: str = "") -> TickerEntry:
+        exchange = (exchange or "").strip().upper()
+        symbol = symbol.strip().upper()
+        full = f"{symbol}.{exchange}" if exchange and not symbol.endswith(f".{exchange}") else symbol
+        entry = TickerEntry(full, name.strip(), exchange)
+        with self._lock:
+            self._by_symbol.setdefault(full, entry)
+            self._by_symbol.setdefault(symbol, entry)  # "ERIC-B" utan börssuffix
+            for text in (name, *aliases):
+                key = normalize_name(text)
+                if not key:
+                    continue
+                bucket = self._by_key.get(key)
+                if bucket is None:
+                    bucket = self._by_key[key] = []
+                    grams = _trigrams(key)
+                    self._gram_count[key] = len(grams)
+                    for g in grams:
+                        self._grams.setdefault(g, []).append(key)
+                if entry not in bucket:
+                    bucket.append(entry)
+            self._sorted = None
+            self._matches.cache_clear()
+        return entry
+
+    def load_csv(self, path: str) -> int:
+        """Add every row of a name,symbol,suffix,aliases CSV. Returns the number of rows."""
+        n = 0
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                if not row.get("symbol") or not row.get("name"):
+                    continue
+                aliases = [a for a in (row.get("aliases") or "").split("|") if a.strip()]
+                self.add(row["symbol"], row["name"], aliases, row.get("suffix") or "")
+                n += 1
+        return n
+
+    def __len__(self) -> int:
+        return len(set(self._by_symbol.values()))
+
+    # ---------- uppslag ----------
+    def _prefix(self, key: str) -> list[str]:
+        keys = self._sorted
+        if keys is None:
+            with self._lock:
+                if self._sorted is None:
+                    self._sorted = sorted(self._by_key)
+                keys = self._sorted
+        out = []
+        for i in range(bisect_left(keys, key), len(keys)):
+            if not keys[i].startswith(key):
+                break
+            out.append(keys[i])
+        return sorted(out, key=len)  # kortaste (närmast) först, stabil → filordning vid lika
+
+    def _fuzzy(self, key: str) -> list[str]:
+        grams = _trigrams(key)
+        common: dict[str, int] = {}
+        for g in grams:
+            for cand in self._grams.get(g, ()):
+                common[cand] = common.get(cand, 0) + 1
+        scored = []
+        for cand, n in common.items():
+            score = 2 * n / (len(grams) + self._gram_count[cand])
+            if score >= FUZZY_THRESHOLD:
+                scored.append((-score, cand))
+        return [cand for _, cand in sorted(scored)]
+
+    def _match(self, query: str) -> tuple[tuple[TickerEntry, ...], bool]:
+        return self._matches((query or "").strip().lower())
+
+    def _find(self, raw: str) -> tuple[tuple[TickerEntry, ...], bool]:
+        entry = self._by_symbol.get(raw.upper())
+        exact = True
+        if entry is not None:
+            found = [entry]
+        else:
+            key = normalize_name(raw)
+            if key in self._by_key:
+                keys = [key]
+            elif len(key) >= MIN_PREFIX and (keys := self._prefix(key)):
+                exact = False
+            elif len(key) >= MIN_FUZZY:
+                keys = self._fuzzy(key)
+                exact = False
+            else:
+                keys = []
+            found = []
+            for k in keys:
+                for e in self._by_key[k]:
+                    # alias → alla noteringar för samma bolag, den matchade först
+                    for same in (e, *self._by_key.get(normalize_name(e.name), ())):
+                        if same not in found:
+                            found.append(same)
+        return tuple(found), exact and bool(found)
+
+    def lookup(self, query: str, limit: int = 5) -> list[TickerEntry]:
+        """Best matches for a company name or ticker, best first (empty if nothing is close).
+
+        Includes prefix and trigram matches, which may be a different company.
+        """
+        return list(self._match(query)[0][:limit])
+
+    def resolve(self, query: str) -> str | None:
+        """Yahoo symbol for an exact ticker, name or alias match, or None."""
+        found, exact = self._match(query)
+        return found[0].symbol if exact else None
+
+
+_default: TickerIndex | None = None
+_default_lock = threading.Lock()
+
+
+def default_index() -> TickerIndex:
+    """Process-wide index: the bundled CSV plus TICKER_INDEX_CSV files (those win on name clashes)."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            index = TickerIndex()
+            extra = [p for p in os.getenv("TICKER_INDEX_CSV", "").split(os.pathsep) if p.strip()]
+            for path in extra + [BUNDLED_CSV]:
+                try:
+                    index.load_csv(path)
+                except OSError as e:
+                    print(f"[TickerIndex] Could not read {path}: {e}")
+            _default = index
+        return _default
@@ -1,21 +1,101 @@
 import os
-from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from langchain_community.utilities import SerpAPIWrapper, DuckDuckGoSearchAPIWrapper
 import yfinance as yf
 
+from .http_client import DUCKDUCKGO_HOST, YAHOO_HOST, get_session, rate_limited
+
 # ------------------------------------------------------------
-# Web Search Tool (SerpAPI + DuckDuckGo fallback)
+# Web Search Tool (SerpAPI + DuckDuckGo, hedged)
 # ------------------------------------------------------------
 
-def create_search_tool(api_key: str | None):
-    """Create a web search tool that prefers SerpAPI and falls back to DuckDuckGo.
-    
+# DuckDuckGo startas om SerpAPI inte svarat inom så här många sekunder (0 = direkt)
+SEARCH_HEDGE_DELAY = float(os.getenv("SEARCH_HEDGE_DELAY", "0.5"))
+SEARCH_TIMEOUT = 15.0  # sekunder totalt per fråga
+SERPAPI_TIMEOUT = (3.05, SEARCH_TIMEOUT)  # (connect, read) per HTTP-försök mot SerpAPI
+SERPAPI_URL = "https://serpapi.com/search"
+SEARCH_WORKERS = 8
+SEARCH_FAILED = "Search failed with both SerpAPI and DuckDuckGo."
+
+_search_pool: ThreadPoolExecutor | None = None
+_search_pool_lock = threading.Lock()
+_stuck: set = set()  # avbrutna anrop som fortfarande kör i den delade poolen
+
+
+def _get_search_pool() -> ThreadPoolExecutor:
+    """Long-lived pool shared by all search tools; a hung backend call never blocks the caller."""
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            _search_pool = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="web-search")
+        return _search_pool
+
+
+def _abandon(fut, pool: ThreadPoolExecutor) -> None:
+    """A backend call the search gave up on. Once half of the shared pool is stuck on such calls,
+    later searches get a fresh pool; the old one's threads finish their calls and exit."""
+    global _search_pool
+    if fut.cancel() or fut.done():
+        return
+    with _search_pool_lock:
+        if pool is not _search_pool:
+            return
+        _stuck.add(fut)
+        fut.add_done_callback(_stuck.discard)
+        if len(_stuck) >= SEARCH_WORKERS // 2:
+            print(f"[SearchTool] {len(_stuck)} backend calls still hanging; starting a new search pool")
+            _search_pool.shutdown(wait=False)
+            _search_pool = None
+            _stuck.clear()
+
+
+class _SerpAPISession:
+    """search_engine for SerpAPIWrapper: the SerpAPI call through the shared session.
+
+    The serpapi client's own requests.get has no usable timeout (60,000 s), so a
+    hung call kept a search worker forever. Through get_session() the call has a
+    (connect, read) timeout and takes its rate-limit tokens, retries included.
+    """
+
+    def __init__(self, params: dict):
+        self.params = params
+
+    def get_dict(self) -> dict:
+        params = {"engine": "google", **self.params, "source": "python", "output": "json"}
+        return get_session().get(SERPAPI_URL, params=params, timeout=SERPAPI_TIMEOUT).json()
+
+
+def _good_result(result) -> bool:
+    # DuckDuckGo-wrappern returnerar en text i stället för att kasta när inget hittas
+    return isinstance(result, str) and bool(result.strip()) and not result.startswith("No good")
+
+
+def create_search_tool(
+    api_key: str | None,
+    hedge_delay: float | None = None,
+    timeout: float = SEARCH_TIMEOUT,
+    executor: ThreadPoolExecutor | None = None,
+):
+    """Create a web search tool that queries SerpAPI and DuckDuckGo as a hedged pair.
+
+    SerpAPI is asked first; DuckDuckGo starts after `hedge_delay` seconds
+    (default SEARCH_HEDGE_DELAY, 0 = both at once) or as soon as SerpAPI fails.
+    The first good answer wins and the other call is cancelled (or, if it is
+    already running, left to finish in the background and ignored). Backend
+    calls time out on their own (SERPAPI_TIMEOUT; ddgs' client timeout), and
+    the shared pool is replaced if abandoned calls pile up in it anyway.
+
     Returns a dictionary format compatible with CrewAI.
     """
+    delay = SEARCH_HEDGE_DELAY if hedge_delay is None else hedge_delay
     serpapi_search = None
     if api_key:
         try:
             serpapi_search = SerpAPIWrapper(serpapi_api_key=api_key)
+            serpapi_search.search_engine = _SerpAPISession
         except Exception as e:
             print(f"[SearchTool] Could not initialize SerpAPI: {e}. Falling back to DuckDuckGo only.")
 
@@ -24,41 +104,109 @@ def create_search_tool(api_key: str | None):
     def try_serpapi(query: str) -> str:
         if serpapi_search is None:
             raise RuntimeError("SerpAPI is unavailable")
-        return serpapi_search.run(query)
+        return serpapi_search.run(query)  # rate limit + timeout i get_session()
+
+    def try_duckduckgo(query: str) -> str:
+        rate_limited(DUCKDUCKGO_HOST)
+        return duckduckgo_search.run(query)
 
     def web_search(query: str) -> str:
         """Search the web for up-to-date information using SerpAPI with DuckDuckGo fallback."""
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(try_serpapi, query)
-            try:
-                print(f"[SearchTool] Trying SerpAPI for query: {query}")
-                return future.result(timeout=5)
-            except (TimeoutError, Exception) as e:
-                print(f"[SearchTool] SerpAPI failed with error: {e}. Falling back to DuckDuckGo...")
-                try:
-                    return duckduckgo_search.run(query)
-                except Exception as e2:
-                    print(f"[SearchTool] DuckDuckGo also failed: {e2}")
-                    return "Search failed with both SerpAPI and DuckDuckGo."
+        pool = executor or _get_search_pool()
+        start = time.monotonic()
+        deadline = start + timeout
+        pending = {}
+        if serpapi_search is not None:
+            print(f"[SearchTool] Trying SerpAPI for query: {query}")
+            pending[pool.submit(try_serpapi, query)] = "SerpAPI"
+        ddg_at = start + delay if pending else start
+        ddg_started = False
+        fallback = None  # svar som inte räknas som bra, används om inget bättre kommer
+
+        try:
+            while pending or not ddg_started:
+                now = time.monotonic()
+                if now >= deadline:
+                    print(f"[SearchTool] No answer within {timeout:.0f}s for query: {query}")
+                    break
+                if not ddg_started and now >= ddg_at:
+                    pending[pool.submit(try_duckduckgo, query)] = "DuckDuckGo"
+                    ddg_started = True
+                wake = deadline if ddg_started else min(ddg_at, deadline)
+                done, _ = wait(pending, timeout=max(0.0, wake - now), return_when=FIRST_COMPLETED)
+                for fut in done:
+                    name = pending.pop(fut)
+                    try:
+                        result = fut.result()
+                    except Exception as e:
+                        print(f"[SearchTool] {name} failed with error: {e}")
+                        ddg_at = 0.0  # vänta inte ut fördröjningen när SerpAPI redan fallerat
+                        continue
+                    if _good_result(result):
+                        if name != "SerpAPI" and serpapi_search is not None:
+                            print(f"[SearchTool] DuckDuckGo answered first ({time.monotonic() - start:.2f}s)")
+                        return result
+                    fallback = fallback or result
+                    ddg_at = 0.0
+            return fallback or SEARCH_FAILED
+        finally:
+            for fut in pending:
+                # förloraren: avbryts om den inte hunnit starta, annars ignoreras svaret
+                if executor is None:
+                    _abandon(fut, pool)
+                else:
+                    fut.cancel()
+
+    async def aweb_search(query: str) -> str:
+        """Async wrapper: runs the blocking search in a worker thread."""
+        return await asyncio.to_thread(web_search, query)
 
     # Return in dictionary format as suggested by CrewAI error
     return {
         "name": "web_search",
         "description": "Search the web for up-to-date information using SerpAPI with DuckDuckGo fallback.",
-        "function": web_search
+        "function": web_search,
+        "coroutine": aweb_search,
     }
 
 
 # ------------------------------------------------------------
 # Smart Financial Data Tool (Company name → Ticker → Financial data)
 # ------------------------------------------------------------
-import yfinance as yf
+YAHOO_SEARCH_URL = "https://query1.finance.yahoo.com/v1/finance/search"
+from .cache import DatasetCache, get_default_cache
+from .price_history import PriceHistory
+from .snapshot import TickerSnapshot
+from .ticker_index import TickerIndex, default_index
+from .warehouse import FundamentalsWarehouse, warehouse_for
+from quarters import quarter_label, quarter_sort_key
+
+def create_financial_data_tool(
+    cache: DatasetCache | None = None,
+    warehouse: FundamentalsWarehouse | None = None,
+    ticker_index: TickerIndex | None = None,
+    session=None,
+):
+    """Tool for fetching recent financial data by company name using Yahoo Finance.
 
-def create_financial_data_tool():
-    """Tool for fetching recent financial data by company name using Yahoo Finance."""
+    Results are cached on disk per ticker and dataset (see `tools.cache`); pass a
+    `DatasetCache` to use a specific store, or set FINANCIAL_DATA_CACHE=off.
+    Statements and price history go to a Parquet warehouse next to the cache
+    (see `tools.warehouse`) when pyarrow is installed. Company names are
+    resolved through the local `tools.ticker_index` first; only exact ticker,
+    name or alias hits skip Yahoo, everything else is looked up there through
+    `session` (default: the shared pooled session in `tools.http_client`).
+    """
     import yfinance as yf
     import pandas as pd
-    import requests
+
+    http = session or get_session()
+    if cache is None:
+        cache = get_default_cache()
+    if warehouse is None:
+        warehouse = warehouse_for(cache)
+    if ticker_index is None:
+        ticker_index = default_index()
 
     # --- små helpers för normalisering ---
     METRIC_MAP = {
@@ -74,15 +222,8 @@ def create_financial_data_tool():
         "adjusted ebitda": "ebitda",
     }
 
-    def _q_label(x) -> str:
-        if isinstance(x, pd.Timestamp):
-            p = pd.Period(x, freq="Q")
-            return f"Q{p.quarter} {p.year}"
-        try:
-            p = pd.Period(pd.to_datetime(str(x)), freq="Q")
-            return f"Q{p.quarter} {p.year}"
-        except Exception:
-            return str(x)
+    # prisfält i price_history_2y (utdelning/split-kolumnerna är nästan alltid 0)
+    PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
 
     def _norm_metric(name: str) -> str | None:
         return METRIC_MAP.get(str(name).strip().lower())
@@ -100,7 +241,7 @@ def create_financial_data_tool():
         if df is None or df.empty:
             return {}, []
         cols = list(df.columns)
-        labels = [_q_label(c) for c in cols]
+        labels = [quarter_label(c) for c in cols]
 
         # 1) Series per metrik (behåll originalnamn så agenten kan citera)
         wanted = ["Total Revenue", "Revenue", "Net Income", "EBITDA", "Operating Income", "Gross Profit"]
@@ -131,70 +272,109 @@ def create_financial_data_tool():
                 rows.append(row)
 
         # sortera äldst→nyast
-        def _q_sort_key(qs: str):
-            try:
-                p = pd.Period(qs.replace("-", " "), freq="Q")
-                return (p.year, p.quarter)
-            except Exception:
-                return (0, 0)
-        rows = sorted(rows, key=lambda r: _q_sort_key(r["quarter"]))
+        rows = sorted(rows, key=lambda r: quarter_sort_key(r["quarter"]))
         return series_dict, rows
 
+    def _resolve_symbol(company_name: str, snap_info: dict) -> tuple[str | None, int]:
+        """Gissa ticker direkt, annars Yahoo-sök. Returnerar (symbol|None, antal nätverksanrop).
+
+        Om gissningen lyckas läggs dess `info` i `snap_info` så att den inte hämtas igen.
+        """
+        rate_limited(YAHOO_HOST)
+        info = getattr(yf.Ticker(company_name), "info", None)
+        if info and info.get("regularMarketPrice") is not None:
+            snap_info.update(info)
+            return company_name.upper(), 1
+        resp = http.get(YAHOO_SEARCH_URL, params={"q": company_name}, timeout=5)
+        resp.raise_for_status()
+        data = resp.json()
+        if data.get("quotes"):
+            return data["quotes"][0]["symbol"], 2
+        return None, 2
+
     def get_financial_data(company_name: str) -> dict:
         try:
-            # 1) hitta/gissa ticker
-            ticker_symbol = company_name.upper()
-            t = yf.Ticker(company_name)
-            if not getattr(t, "info", None) or t.info.get("regularMarketPrice") is None:
-                url = f"https://query1.finance.yahoo.com/v1/finance/search?q={company_name}"
-                resp = requests.get(url, timeout=5)
-                data = resp.json()
-                if data.get("quotes"):
-                    ticker_symbol = data["quotes"][0]["symbol"]
-                    t = yf.Ticker(ticker_symbol)
+            # 1) hitta ticker: lokalt index först, annars gissa/sök hos Yahoo (cachas per företagsnamn)
+            guessed_info: dict = {}
+            resolve_fetches = 0
+
+            def _resolve():
+                nonlocal resolve_fetches
+                symbol, resolve_fetches = _resolve_symbol(company_name, guessed_info)
+                return symbol
+
+            # bara exakta träffar (ticker, namn, alias) litar vi på; prefix/stavfel kan vara ett annat
+            # bolag ("Volvo Penta" ≠ Volvo) och går därför via Yahoo-sökningen
+            ticker_symbol = ticker_index.resolve(company_name)
+            if ticker_symbol is None:
+                if cache is None:
+                    ticker_symbol = _resolve()
                 else:
-                    return {"error": f"No ticker found for company: {company_name}"}
+                    ticker_symbol = cache.get_or_fetch(company_name, "symbol", _resolve).value
+                if not ticker_symbol:
+                    if cache is not None:
+                        cache.invalidate(company_name, "symbol")
+                    error = f"No ticker found for company: {company_name}"
+                    suggestions = ticker_index.lookup(company_name, limit=3)
+                    if suggestions:
+                        error += " (did you mean: " + ", ".join(f"{e.name} ({e.symbol})" for e in suggestions) + "?)"
+                    return {"error": error}
+                ticker_index.add(ticker_symbol, company_name)  # resten av processen slipper slå upp igen
+            if guessed_info and cache is not None:
+                cache.put(ticker_symbol, "info", guessed_info)
 
-            # 2) hämta data
-            qf_df = t.quarterly_financials  # index=metrics, columns=Timestamps (kan vara tom)
+            # 2) hämta allt för tickern en gång – alla fält nedan läser från snapshot
+            snap = TickerSnapshot(
+                ticker_symbol, cache=cache, warehouse=warehouse, columns={"history": PRICE_COLUMNS}
+            ).fetch(info=guessed_info or None)
+            info = snap.info
+            qf_df = snap.statements.get("quarterly_financials")  # index=metrics, columns=Timestamps (kan vara tom)
             series_dict, rows = _normalize_quarterly_financials(qf_df)
 
-            # prisdata → str-nycklar (slipper Streamlit-varning)
-            hist = t.history(period="2y")
-            price_history = {k: {str(idx): v for idx, v in hist[k].dropna().items()} for k in hist.columns} if not hist.empty else {}
+            # prisdata → kompakt PriceHistory; ph["Close"] ger fortfarande {str(tidpunkt): värde}
+            price_history = PriceHistory.from_frame(snap.history, PRICE_COLUMNS)
+
+            def _as_dict(df):
+                return df.to_dict() if df is not None and not df.empty else {}
 
             # 3) bygg resultat — behåll dina gamla fält orörda
             data = {
                 "ticker": ticker_symbol,
                 "company_info": {
-                    "shortName": t.info.get("shortName"),
-                    "longName": t.info.get("longName"),
-                    "sector": t.info.get("sector"),
-                    "industry": t.info.get("industry"),
-                    "country": t.info.get("country"),
-                    "website": t.info.get("website"),
-                    "marketCap": t.info.get("marketCap"),
-                    "regularMarketPrice": t.info.get("regularMarketPrice"),
+                    "shortName": info.get("shortName"),
+                    "longName": info.get("longName"),
+                    "sector": info.get("sector"),
+                    "industry": info.get("industry"),
+                    "country": info.get("country"),
+                    "website": info.get("website"),
+                    "marketCap": info.get("marketCap"),
+                    "regularMarketPrice": info.get("regularMarketPrice"),
                 },
                 # originalfälten (kan innehålla Timestamps i nycklar – vi låter dem vara för bakåtkompat)
-                "quarterly_financials": (qf_df.to_dict() if qf_df is not None and not qf_df.empty else {}),
-                "financials": (t.financials.to_dict() if t.financials is not None and not t.financials.empty else {}),
-                "quarterly_balance_sheet": (t.quarterly_balance_sheet.to_dict() if t.quarterly_balance_sheet is not None and not t.quarterly_balance_sheet.empty else {}),
-                "balance_sheet": (t.balance_sheet.to_dict() if t.balance_sheet is not None and not t.balance_sheet.empty else {}),
-                "quarterly_cashflow": (t.quarterly_cashflow.to_dict() if t.quarterly_cashflow is not None and not t.quarterly_cashflow.empty else {}),
-                "cashflow": (t.cashflow.to_dict() if t.cashflow is not None and not t.cashflow.empty else {}),
+                **{name: _as_dict(df) for name, df in snap.statements.items()},
                 "price_history_2y": price_history,
                 # nya fält för UI/agent
                 "quarters": rows,                         # ← det här behöver din chart
                 "quarterly_financials_norm": series_dict, # ← valfritt för analys-agenten
+                # cache-status: stale=True betyder att någon datamängd inte kunde uppdateras
+                "stale": bool(snap.stale_datasets),
+                "stale_datasets": snap.stale_datasets,
+                "as_of": snap.as_of,
+                "missing_datasets": snap.missing_datasets,
+                "remote_fetches": resolve_fetches + snap.remote_fetches,
             }
             return data
         except Exception as e:
             return {"error": f"Failed to fetch financial data: {e}"}
 
+    async def aget_financial_data(company_name: str) -> dict:
+        """Async wrapper: yfinance/requests är blockerande, kör i en worker-tråd."""
+        return await asyncio.to_thread(get_financial_data, company_name)
+
     # CrewAI förväntar sig dict/BaseTool. Vi returnerar dict (som innan).
     return {
         "name": "financial_data",
         "description": "Fetch structured quarterly financials and price history.",
         "function": get_financial_data,
+        "coroutine": aget_financial_data,
     }
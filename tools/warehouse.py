@@ -0,0 +1,301 @@
+import datetime
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from .cache import DEFAULT_TTL, DEFAULT_TTLS, CacheEntry, DatasetCache
+
+# ------------------------------------------------------------
+# Local Parquet warehouse for statements and price history
+# ------------------------------------------------------------
+#
+# One file per (ticker, dataset):  <root>/<TICKER>/<dataset>.parquet
+# with one row per period. Statements are stored transposed (period + one
+# column per line item) so reads can project just the line items they need;
+# history keeps its OHLCV columns. The file's mtime is the last refresh.
+#
+# A refresh fetches when the TTL has run out, unless nothing can have changed:
+# the latest stored period is past its revision window and the next one is not
+# due yet. Fetched periods are upserted: the ones in Yahoo's window replace the
+# stored rows (restatements, late-filled fields), and older quarters stay in
+# the warehouse after they have dropped out of Yahoo's ~5-period window.
+
+PERIOD = "period"
+WAREHOUSE_DATASETS = (
+    "quarterly_financials",
+    "financials",
+    "quarterly_balance_sheet",
+    "balance_sheet",
+    "quarterly_cashflow",
+    "cashflow",
+    "history",
+)
+# nästa rapport väntas tidigast så här långt efter periodens slut
+REPORT_LAG_DAYS = 20
+# så länge efter periodens slut kan Yahoo fortfarande fylla i/ändra den (10-Q/10-K lämnas sent)
+REVISION_DAYS = {"quarterly": 75, "annual": 120}
+
+
+def _parquet():
+    """pyarrow is optional – imported on first use."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    return pa, pq
+
+
+def pyarrow_available() -> bool:
+    try:
+        _parquet()
+    except ImportError:
+        return False
+    return True
+
+
+def _period_due(dataset: str, watermark: pd.Timestamp | None, now: pd.Timestamp) -> bool:
+    """Can a fetch change anything: a period newer than `watermark`, or revisions of it?
+
+    Only used to skip a fetch; whatever is fetched is always stored.
+    """
+    if watermark is None or dataset == "history":
+        return True
+    quarterly = dataset.startswith("quarterly_")
+    last_end = watermark.tz_localize(None)
+    if now < last_end + pd.Timedelta(days=REVISION_DAYS["quarterly" if quarterly else "annual"]):
+        return True
+    step = pd.DateOffset(months=3) if quarterly else pd.DateOffset(years=1)
+    return now >= last_end + step + pd.Timedelta(days=REPORT_LAG_DAYS)
+
+
+def _to_rows(dataset: str, df: pd.DataFrame) -> pd.DataFrame:
+    """yfinance shape → one row per period, sorted oldest → newest."""
+    if dataset == "history":
+        rows = df.copy()
+    else:
+        rows = df.T
+        rows.columns = [str(c) for c in rows.columns]
+        rows = rows.apply(pd.to_numeric, errors="coerce")
+    rows.index = pd.to_datetime(rows.index)
+    rows.index.name = PERIOD
+    return rows[~rows.index.duplicated(keep="last")].sort_index()
+
+
+def _changed(old: pd.DataFrame, new: pd.DataFrame) -> int:
+    """Number of periods in both frames whose values differ (NaN == NaN)."""
+    both = new.index.intersection(old.index)
+    if both.empty:
+        return 0
+    cols = old.columns.union(new.columns)
+    a, b = old.loc[both].reindex(columns=cols), new.loc[both].reindex(columns=cols)
+    same = (a == b) | (a.isna() & b.isna())
+    return int((~same.all(axis=1)).sum())
+
+
+def _from_rows(dataset: str, rows: pd.DataFrame) -> pd.DataFrame:
+    """Inverse of _to_rows: statements back to index=line items, columns=periods (newest first)."""
+    rows = rows.set_index(PERIOD)
+    if dataset == "history":
+        rows.index.name = "Date"
+        return rows
+    out = rows.sort_index(ascending=False).T
+    out.columns.name = None
+    return out
+
+
+class FundamentalsWarehouse:
+    """Parquet files per ticker and dataset, refreshed incrementally."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+
+    def path(self, symbol: str, dataset: str) -> str:
+        return os.path.join(self.root, symbol.upper(), f"{dataset}.parquet")
+
+    def refreshed_at(self, symbol: str, dataset: str) -> float | None:
+        try:
+            return os.path.getmtime(self.path(symbol, dataset))
+        except OSError:
+            return None
+
+    def columns(self, symbol: str, dataset: str) -> list[str]:
+        """Stored columns (line items for statements), read from the file footer."""
+        _, pq = _parquet()
+        path = self.path(symbol, dataset)
+        if not os.path.exists(path):
+            return []
+        return [n for n in pq.read_schema(path).names if n != PERIOD]
+
+    def watermark(self, symbol: str, dataset: str) -> pd.Timestamp | None:
+        """Newest stored period, or None when nothing is stored."""
+        _, pq = _parquet()
+        path = self.path(symbol, dataset)
+        if not os.path.exists(path):
+            return None
+        periods = pq.read_table(path, columns=[PERIOD]).column(PERIOD)
+        if len(periods) == 0:
+            return None
+        return pd.Timestamp(periods[len(periods) - 1].as_py())  # raderna är sorterade
+
+    def read(
+        self,
+        symbol: str,
+        dataset: str,
+        columns: list[str] | None = None,
+        since: pd.Timestamp | None = None,
+    ) -> pd.DataFrame | None:
+        """Stored data in yfinance shape, or None. `columns` projects line items / price columns."""
+        _, pq = _parquet()
+        path = self.path(symbol, dataset)
+        if not os.path.exists(path):
+            return None
+        if columns is not None:
+            stored = set(pq.read_schema(path).names)
+            columns = [PERIOD] + [c for c in columns if c in stored and c != PERIOD]
+        rows = pq.read_table(path, columns=columns, memory_map=True).to_pandas()
+        if since is not None:
+            period = rows[PERIOD]
+            since = pd.Timestamp(since)
+            if period.dt.tz is not None and since.tzinfo is None:
+                since = since.tz_localize(period.dt.tz)
+            rows = rows[period >= since]
+        return _from_rows(dataset, rows)
+
+    def append(self, symbol: str, dataset: str, df: pd.DataFrame | None) -> int:
+        """Upsert the periods of `df`. Returns how many were added or changed.
+
+        Statements: every fetched period replaces the stored row for it;
+        stored periods outside `df` are kept. History is fetched from the
+        watermark, so only the last stored day is replaced (the current day's
+        bar keeps changing until the close).
+        """
+        pa, pq = _parquet()
+        if df is None or df.empty:
+            return 0
+        path = self.path(symbol, dataset)
+        with self._lock:
+            new = _to_rows(dataset, df)
+            old = pq.read_table(path).to_pandas().set_index(PERIOD) if os.path.exists(path) else None
+            if old is not None and len(old):
+                watermark = old.index[-1]
+                if dataset == "history":
+                    new = new[new.index >= watermark]
+                    old = old[old.index < watermark]
+                    added = int((new.index > watermark).sum())
+                    unchanged = new.empty
+                else:
+                    added = int((~new.index.isin(old.index)).sum()) + _changed(old, new)
+                    old = old[~old.index.isin(new.index)]
+                    unchanged = not added
+                if unchanged:
+                    os.utime(path)  # inget nytt, men kontrollerat nu
+                    return 0
+                new = pd.concat([old, new]).sort_index()
+            else:
+                added = len(new)
+            self._write(path, pa.Table.from_pandas(new.reset_index(), preserve_index=False))
+            return added
+
+    def _write(self, path: str, table) -> None:
+        _, pq = _parquet()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        os.close(fd)
+        try:
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)  # atomiskt: läsare ser aldrig en halvskriven fil
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def _mark_empty(self, symbol: str, dataset: str) -> None:
+        """Remember that Yahoo has nothing for this dataset, so it is not asked again until the TTL runs out."""
+        pa, _ = _parquet()
+        path = self.path(symbol, dataset)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                self._write(path, pa.table({PERIOD: pa.array([], pa.timestamp("ns"))}))
+
+    def refresh(
+        self,
+        symbol: str,
+        dataset: str,
+        fetch,
+        ttl: float,
+        columns: list[str] | None = None,
+        since: pd.Timestamp | None = None,
+    ) -> CacheEntry:
+        """Bring one dataset up to date and read it back.
+
+        `fetch(watermark)` gets the newest stored period (None when empty) and
+        returns a yfinance-shaped frame. It is only called when the TTL has
+        expired and the data can have changed (_period_due). If it raises or comes back empty
+        while data is stored, the stored data is returned with `stale=True`.
+        """
+        refreshed_at = self.refreshed_at(symbol, dataset)
+        watermark = self.watermark(symbol, dataset) if refreshed_at is not None else None
+        now = time.time()
+        stale = False
+        expired = refreshed_at is None or now - refreshed_at > ttl
+        if expired and _period_due(dataset, watermark, pd.Timestamp(now, unit="s")):
+            try:
+                fetched = fetch(watermark)
+            except Exception:
+                if refreshed_at is None:
+                    raise
+                stale = True
+            else:
+                if fetched is None or fetched.empty:
+                    if watermark is not None:
+                        stale = True  # hade data, Yahoo gav inget – behåll det lagrade
+                    else:
+                        self._mark_empty(symbol, dataset)
+                else:
+                    self.append(symbol, dataset, fetched)
+                refreshed_at = self.refreshed_at(symbol, dataset) if not stale else refreshed_at
+        value = self.read(symbol, dataset, columns=columns, since=since)
+        return CacheEntry(value, refreshed_at or now, stale)
+
+    def stored(self, symbol: str, dataset: str, columns: list[str] | None = None, since=None) -> CacheEntry | None:
+        """Whatever is stored, marked stale – for when a refresh could not run at all."""
+        refreshed_at = self.refreshed_at(symbol, dataset)
+        if refreshed_at is None:
+            return None
+        return CacheEntry(self.read(symbol, dataset, columns=columns, since=since), refreshed_at, True)
+
+
+def ttl_for(cache: DatasetCache | None, dataset: str) -> float:
+    return cache.ttl(dataset) if cache is not None else DEFAULT_TTLS.get(dataset, DEFAULT_TTL)
+
+
+_warehouses: dict[str, FundamentalsWarehouse] = {}
+_warehouses_lock = threading.Lock()
+
+
+def warehouse_for(cache: DatasetCache | None) -> FundamentalsWarehouse | None:
+    """Warehouse stored next to `cache`'s SQLite file.
+
+    None when there is no on-disk cache, pyarrow is not installed or
+    FINANCIAL_DATA_WAREHOUSE=off.
+    """
+    if cache is None or cache.path == ":memory:":
+        return None
+    if os.getenv("FINANCIAL_DATA_WAREHOUSE", "").lower() in ("0", "off", "false", "no"):
+        return None
+    if not pyarrow_available():
+        return None
+    root = os.path.join(os.path.dirname(os.path.abspath(cache.path)), "warehouse")
+    with _warehouses_lock:
+        if root not in _warehouses:
+            _warehouses[root] = FundamentalsWarehouse(root)
+        return _warehouses[root]
+
+
+def history_window(years: int = 2) -> pd.Timestamp:
+    """Start of the price window get_financial_data returns (same span as period="2y")."""
+    return pd.Timestamp(datetime.date.today()) - pd.DateOffset(years=years)